@@ -0,0 +1,129 @@
+"""
+WSGI 與 ASGI 部署在相同工作行程數下的併發能力比較。
+
+以 gunicorn.conf.py 分別啟動同步 (LIBMANAGE_SERVER=wsgi) 與 uvicorn (LIBMANAGE_SERVER=asgi) 工作行程，
+同時製造慢速用戶端 (例如行動網路上的掃描頁面，逐位元組送出請求) 與一般用戶端，
+回報一般用戶端在書籍列表、書籍詳細資料與用戶首頁上的吞吐量與延遲：
+
+    python -m benchmarks.bench_asgi --workers 2 --slow-clients 4 --clients 8 --duration 10
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_db_load import PROFILES
+from benchmarks.common import BACKEND_DIR, base_parser, free_port, percentile, request, wait_for
+
+SERVERS = ('wsgi', 'asgi')
+
+
+def slow_client(port, deadline, byte_delay):
+    """逐位元組送出請求標頭，模擬網路緩慢的用戶端；回傳完成的請求數。"""
+    done = 0
+    head = f'GET /api/books/?limit=50 HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n\r\n'.encode()
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=30) as sock:
+                for i in range(len(head)):
+                    sock.sendall(head[i:i + 1])
+                    time.sleep(byte_delay)
+                while sock.recv(65536):
+                    pass
+            done += 1
+        except OSError:
+            time.sleep(0.1)
+    return done
+
+
+def fast_clients(base, deadline, clients, book_ids, user_tokens):
+    results = {'list': [], 'detail': [], 'user_home': []}
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        i = index
+        while time.monotonic() < deadline:
+            book_id = book_ids[i % len(book_ids)]
+            token = user_tokens[i % len(user_tokens)]
+            i += clients
+            for name, path in (('list', '/api/books/?limit=50'),
+                               ('detail', f'/api/books/{book_id}/'),
+                               ('user_home', '/api/user_home/')):
+                elapsed, error = request(base, 'GET', path, token=token)
+                with lock:
+                    results[name].append(elapsed)
+                    if error:
+                        errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def run_server(server, args, info):
+    port = free_port()
+    env = dict(os.environ, **PROFILES['sqlite-tuned'], DJANGO_SETTINGS_MODULE='libmanagesystem.settings',
+               LIBMANAGE_DB_NAME=info['name'], LIBMANAGE_CACHE='locmem', LIBMANAGE_SCAN_WORKERS='0',
+               LIBMANAGE_RATE_LIMIT='0', LIBMANAGE_SERVER=server, LIBMANAGE_WORKERS=str(args.workers),
+               LIBMANAGE_BIND=f'127.0.0.1:{port}')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--log-level', 'warning'], cwd=BACKEND_DIR, env=env)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_for(base + '/api/books/?limit=1')
+        deadline = time.monotonic() + args.duration
+        slow_done = []
+        slow = [threading.Thread(target=lambda: slow_done.append(slow_client(port, deadline, args.byte_delay)))
+                for _ in range(args.slow_clients)]
+        for thread in slow:
+            thread.start()
+        results, errors = fast_clients(base, deadline, args.clients, info['books'], info['tokens'])
+        for thread in slow:
+            thread.join()
+    finally:
+        process.terminate()
+        process.wait()
+
+    total = sum(len(values) for values in results.values())
+    print(f'\n== {server} ({args.workers} workers，{args.slow_clients} 個慢速用戶端，{args.clients} 個一般用戶端) ==')
+    print(f'  一般用戶端 {total / args.duration:8.1f} 請求/秒，錯誤 {len(errors)} 次；慢速用戶端完成 {sum(slow_done)} 次')
+    for endpoint, values in results.items():
+        if values:
+            print(f'  {endpoint:<9} p50 {percentile(values, 50):7.1f} ms  p95 {percentile(values, 95):7.1f} ms  '
+                  f'({len(values)} 次)')
+    return total / args.duration
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--servers', default=','.join(SERVERS), help='逗號分隔：wsgi、asgi')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn 工作行程數 (兩種部署相同)')
+    parser.add_argument('--clients', type=int, default=8, help='一般用戶端數')
+    parser.add_argument('--slow-clients', type=int, default=4, help='慢速用戶端數')
+    parser.add_argument('--byte-delay', type=float, default=0.02, help='慢速用戶端每送出一個位元組的間隔 (秒)')
+    parser.add_argument('--duration', type=float, default=10, help='每種部署的量測秒數')
+    parser.set_defaults(books=20_000, users=1_000, records=20_000)
+    args = parser.parse_args()
+
+    env = dict(os.environ, **PROFILES['sqlite-tuned'], DJANGO_SETTINGS_MODULE='libmanagesystem.settings')
+    prepare_cmd = [sys.executable, '-m', 'benchmarks.bench_db_load', '--prepare', '--db', args.db,
+                   '--books', str(args.books), '--users', str(args.users), '--records', str(args.records),
+                   '--concurrency', str(args.clients), '--seed', str(args.seed)]
+    if args.keepdb:
+        prepare_cmd.append('--keepdb')
+    info = json.loads(subprocess.run(prepare_cmd, cwd=BACKEND_DIR, env=env, capture_output=True,
+                                     text=True, check=True).stdout.strip().splitlines()[-1])
+
+    rates = {server: run_server(server.strip(), args, info) for server in args.servers.split(',')}
+    if set(SERVERS) <= set(rates) and rates['wsgi']:
+        print(f'\nASGI 一般用戶端吞吐量為 WSGI 的 {rates["asgi"] / rates["wsgi"]:.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
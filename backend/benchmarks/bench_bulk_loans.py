@@ -0,0 +1,83 @@
+"""
+批次借還與逐本借還的吞吐量比較。
+
+每一輪選出 --cart 本可借閱的書，分別以逐本 API (borrow / return_by_book_and_user)
+與批次 API (/api/loans/bulk_borrow/、/api/loans/bulk_return/) 借出再歸還，
+回報每秒處理的書籍數與每本書的查詢數：
+
+    python -m benchmarks.bench_bulk_loans --books 100000 --records 100000 --cart 15 --rounds 20
+"""
+import json
+import time
+
+from benchmarks.common import base_parser, benchmark_database, seed_catalog, setup_django
+
+
+def post(client, path, payload):
+    response = client.post(path, json.dumps(payload), content_type='application/json')
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} 回傳 {response.status_code}：{response.content[:200]!r}')
+    return response
+
+
+def per_item(client, book_ids):
+    for book_id in book_ids:
+        post(client, f'/api/books/borrow/{book_id}/', {})
+    for book_id in book_ids:
+        post(client, '/api/books/return_by_book_and_user/', {'book_id': book_id})
+
+
+def bulk(client, book_ids):
+    post(client, '/api/loans/bulk_borrow/', {'book_ids': book_ids})
+    post(client, '/api/loans/bulk_return/', {'book_ids': book_ids})
+
+
+def run(name, func, client, carts):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    items = sum(len(cart) for cart in carts)
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        for cart in carts:
+            func(client, cart)
+        elapsed = time.perf_counter() - started
+    print(f'{name:<6} {items / elapsed:10.1f} 本/秒  {len(queries) / items:6.1f} 查詢/本  '
+          f'(借出並歸還 {items} 本，{elapsed * 1000:.0f} ms)')
+    return items / elapsed
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--cart', type=int, default=15, help='每次借還的書籍數')
+    parser.add_argument('--rounds', type=int, default=20, help='量測輪數')
+    args = parser.parse_args()
+    setup_django()
+
+    from django.test import Client
+    from libmanage import tokens
+    from libmanage.models import Book, BorrowRecord
+
+    with benchmark_database(args.db, keepdb=args.keepdb):
+        if not BorrowRecord.objects.exists():
+            seed_catalog(args.books, args.users, args.records, seed=args.seed)
+        record = BorrowRecord.objects.select_related('user').order_by('id').first()
+        available = list(
+            Book.objects.filter(available_count__gt=0, status='AVAILABLE')
+            .order_by('id').values_list('id', flat=True)[:args.cart * args.rounds]
+        )
+        carts = [available[i:i + args.cart] for i in range(0, len(available), args.cart)]
+        # 以該用戶的登入權杖借還
+        client = Client(headers={'Authorization': f'Bearer {tokens.issue(record.user)[0]}'})
+
+        # 先各執行一輪暖機 (建立連線、載入 URLconf)
+        per_item(client, carts[0])
+        bulk(client, carts[0])
+
+        single = run('逐本', per_item, client, carts)
+        batched = run('批次', bulk, client, carts)
+        print(f'批次 API 吞吐量為逐本的 {batched / single:.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
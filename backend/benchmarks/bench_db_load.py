@@ -0,0 +1,145 @@
+"""
+資料庫設定的負載測試：以多個 gunicorn 工作行程比較不同資料庫設定。
+
+每個設定 (profile) 先以子行程建立並填充效能測試資料庫，再啟動 gunicorn，
+以多個執行緒同時呼叫書籍列表與借閱/歸還 API，回報吞吐量、延遲百分位數與錯誤數
+(例如 SQLite 的 "database is locked")：
+
+    python -m benchmarks.bench_db_load --profiles sqlite-default,sqlite-tuned --workers 4 --concurrency 16
+
+postgres 設定沿用 LIBMANAGE_DB_HOST / USER / PASSWORD 等環境變數，並在該伺服器上建立 test_ 開頭的資料庫：
+
+    LIBMANAGE_DB_PASSWORD=... python -m benchmarks.bench_db_load --profiles sqlite-tuned,postgres,postgres-pool
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import (
+    BACKEND_DIR, base_parser, benchmark_database, free_port, percentile, request, seed_catalog, setup_django,
+    wait_for,
+)
+
+PROFILES = {
+    'sqlite-default': {'LIBMANAGE_DB': 'sqlite', 'LIBMANAGE_SQLITE_TUNING': '0'},
+    'sqlite-tuned': {'LIBMANAGE_DB': 'sqlite', 'LIBMANAGE_SQLITE_TUNING': '1'},
+    'postgres': {'LIBMANAGE_DB': 'postgres', 'LIBMANAGE_DB_POOL_SIZE': '0'},
+    'postgres-pool': {'LIBMANAGE_DB': 'postgres', 'LIBMANAGE_DB_POOL_SIZE': '8'},
+}
+
+
+def prepare(args):
+    """在目前的資料庫設定下建立並填充測試資料庫，印出資料庫名稱、可借閱的書籍 id 與用戶的登入權杖。"""
+    setup_django()
+    from django.contrib.auth.models import User
+    from libmanage import tokens
+    from libmanage.models import Book
+
+    with benchmark_database(args.db, keepdb=args.keepdb) as connection:
+        if not Book.objects.exists():
+            seed_catalog(args.books, args.users, args.records, seed=args.seed, log=lambda *a: None)
+        books = list(
+            Book.objects.filter(available_count__gt=0, status='AVAILABLE').order_by('id')
+            .values_list('id', flat=True)[:args.concurrency * 20]
+        )
+        user_tokens = [tokens.issue(user)[0] for user in User.objects.order_by('id')[:args.concurrency]]
+        print(json.dumps({'name': str(connection.settings_dict['NAME']), 'books': books, 'tokens': user_tokens}))
+
+
+def load(base, duration, user_tokens, book_ids):
+    """每個執行緒以一位用戶的登入權杖輪流：取一頁書籍列表、借出一本書、歸還該書。"""
+    results = {'list': [], 'borrow': [], 'return': []}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    per_thread = len(book_ids) // len(user_tokens)
+
+    def worker(index, token):
+        books = book_ids[index * per_thread:(index + 1) * per_thread]
+        i = 0
+        while time.monotonic() < deadline:
+            book_id = books[i % len(books)]
+            i += 1
+            steps = [
+                ('list', 'GET', '/api/books/?limit=50', None),
+                ('borrow', 'POST', f'/api/books/borrow/{book_id}/', {}),
+                ('return', 'POST', '/api/books/return_by_book_and_user/', {'book_id': book_id}),
+            ]
+            for name, method, path, payload in steps:
+                elapsed, error = request(base, method, path, payload, token)
+                with lock:
+                    results[name].append(elapsed)
+                    if error:
+                        errors.append(error)
+
+    threads = [threading.Thread(target=worker, args=(i, token)) for i, token in enumerate(user_tokens)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def run_profile(name, args):
+    env = dict(os.environ, **PROFILES[name], DJANGO_SETTINGS_MODULE='libmanagesystem.settings',
+               LIBMANAGE_CACHE='locmem', LIBMANAGE_SCAN_WORKERS='0', LIBMANAGE_RATE_LIMIT='0')
+    # PostgreSQL 的測試資料庫以名稱指定，SQLite 則為檔案路徑
+    db_path = f'{args.db}.{name}' if PROFILES[name]['LIBMANAGE_DB'] == 'sqlite' else 'libmanage_benchmark'
+    prepare_cmd = [sys.executable, '-m', 'benchmarks.bench_db_load', '--prepare', '--db', db_path,
+                   '--books', str(args.books), '--users', str(args.users), '--records', str(args.records),
+                   '--concurrency', str(args.concurrency), '--seed', str(args.seed)]
+    if args.keepdb:
+        prepare_cmd.append('--keepdb')
+    info = json.loads(subprocess.run(prepare_cmd, cwd=BACKEND_DIR, env=env, capture_output=True,
+                                     text=True, check=True).stdout.strip().splitlines()[-1])
+
+    port = free_port()
+    env['LIBMANAGE_DB_NAME'] = info['name']
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'libmanagesystem.wsgi:application', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(args.workers), '--threads', str(args.threads), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env,
+    )
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_for(base + '/api/books/?limit=1')
+        results, errors = load(base, args.duration, info['tokens'], info['books'])
+    finally:
+        server.terminate()
+        server.wait()
+
+    total = sum(len(values) for values in results.values())
+    print(f'\n== {name} ({args.workers} workers × {args.threads} threads, {args.concurrency} 併發) ==')
+    print(f'  {total / args.duration:8.1f} 請求/秒，錯誤 {len(errors)} 次')
+    for endpoint, values in results.items():
+        if values:
+            print(f'  {endpoint:<7} p50 {percentile(values, 50):7.1f} ms  p95 {percentile(values, 95):7.1f} ms  '
+                  f'p99 {percentile(values, 99):7.1f} ms  ({len(values)} 次)')
+    for error in sorted(set(errors))[:3]:
+        print(f'  錯誤範例：{error}')
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--profiles', default='sqlite-default,sqlite-tuned', help=f'逗號分隔：{", ".join(PROFILES)}')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn 工作行程數')
+    parser.add_argument('--threads', type=int, default=1, help='每個工作行程的執行緒數')
+    parser.add_argument('--concurrency', type=int, default=16, help='同時發出請求的用戶數')
+    parser.add_argument('--duration', type=float, default=10, help='每個設定的量測秒數')
+    parser.add_argument('--prepare', action='store_true', help=argparse.SUPPRESS)
+    parser.set_defaults(books=20_000, users=1_000, records=20_000)
+    args = parser.parse_args()
+
+    if args.prepare:
+        prepare(args)
+        return
+    for name in args.profiles.split(','):
+        run_profile(name.strip(), args)
+
+
+if __name__ == '__main__':
+    main()
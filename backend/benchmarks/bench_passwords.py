@@ -0,0 +1,120 @@
+"""
+密碼雜湊成本與登入吞吐量：每核心每秒可處理的登入數。
+
+每個雜湊設定 (演算法[:成本]，成本為 PBKDF2 迭代次數、scrypt 的 N 或 Argon2 的 time_cost) 依序量測：
+1. 單執行緒驗證一次密碼的耗時，換算為每核心每秒登入數 (登入的成本幾乎都在雜湊)；
+2. 以 --concurrency 個執行緒同時呼叫 login_api (同一行程內以 django.test.Client 呼叫)，
+   雜湊在 --workers 條執行緒中計算，回報每秒登入數、每核心每秒登入數與因排隊已滿而回傳 503 的次數。
+
+    python -m benchmarks.bench_passwords --hashers pbkdf2,pbkdf2:600000,scrypt --logins 200 --workers 4
+"""
+import json
+import os
+import statistics
+import threading
+import time
+
+from benchmarks.common import base_parser, benchmark_database, setup_django
+
+COST_SETTINGS = {
+    'pbkdf2': 'PASSWORD_PBKDF2_ITERATIONS',
+    'scrypt': 'PASSWORD_SCRYPT_WORK_FACTOR',
+    'argon2': 'PASSWORD_ARGON2_TIME_COST',
+}
+PASSWORD = 'benchmark-password'
+
+
+def hasher_settings(spec, args):
+    from django.conf import settings
+
+    name, _, cost = spec.partition(':')
+    choices = settings.PASSWORD_HASHER_CHOICES
+    return {
+        'PASSWORD_HASHERS': [choices[name]] + [path for other, path in choices.items() if other != name],
+        COST_SETTINGS[name]: int(cost) if cost else None,
+        'PASSWORD_WORKERS': args.workers,
+        'PASSWORD_MAX_PENDING': args.max_pending or args.concurrency,
+    }
+
+
+def login_burst(users, logins, concurrency):
+    """concurrency 個執行緒共同完成 logins 次登入，回傳 (耗時秒數, {狀態碼: 次數})。"""
+    from django.db import connection
+    from django.test import Client
+
+    statuses = {}
+    lock = threading.Lock()
+    per_thread = logins // concurrency
+
+    def worker(index):
+        client = Client()
+        try:
+            for i in range(per_thread):
+                response = client.post('/api/login/', json.dumps({
+                    'username': users[(index + i * concurrency) % len(users)], 'password': PASSWORD,
+                }), content_type='application/json')
+                with lock:
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, statuses
+
+
+def run(spec, args):
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from libmanage import passwords
+
+    with override_settings(**hasher_settings(spec, args)):
+        try:
+            encoded = passwords._hash(PASSWORD)
+        except ValueError as e:
+            # 例如未安裝 argon2-cffi
+            print(f'{spec:<18} 略過：{e}')
+            return
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            passwords._verify(PASSWORD, encoded)
+            timings.append(time.perf_counter() - started)
+        single = statistics.median(timings)
+
+        User.objects.filter(username__startswith='bench_login_').delete()
+        users = [f'bench_login_{i}' for i in range(args.concurrency)]
+        User.objects.bulk_create([User(username=username, password=encoded) for username in users])
+        login_burst(users, args.concurrency, args.concurrency)  # 暖機
+        elapsed, statuses = login_burst(users, args.logins, args.concurrency)
+
+    succeeded = statuses.get(200, 0)
+    cores = min(args.workers or 1, os.cpu_count() or 1)
+    print(f'{spec:<18} 驗證 {single * 1000:7.1f} ms  單核 {1 / single:7.1f} 次/秒  |  '
+          f'API {succeeded / elapsed:7.1f} 次/秒 ({succeeded / elapsed / cores:7.1f} 次/秒/核)  '
+          f'503 {statuses.get(503, 0)} 次  其他錯誤 {sum(statuses.values()) - succeeded - statuses.get(503, 0)} 次')
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--hashers', default='pbkdf2,scrypt', help='逗號分隔的 演算法[:成本]：pbkdf2、scrypt、argon2')
+    parser.add_argument('--logins', type=int, default=100, help='每個設定的登入次數')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時登入的用戶數')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='雜湊執行緒數 (PASSWORD_WORKERS)')
+    parser.add_argument('--max-pending', type=int, help='排隊上限 (PASSWORD_MAX_PENDING)，預設為 --concurrency')
+    parser.add_argument('--repeat', type=int, default=10, help='單執行緒量測次數')
+    args = parser.parse_args()
+    setup_django()
+
+    print(f'{os.cpu_count()} 核心，{args.workers} 條雜湊執行緒，{args.concurrency} 個同時登入')
+    with benchmark_database(args.db, keepdb=args.keepdb):
+        for spec in args.hashers.split(','):
+            run(spec.strip(), args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+比較加入索引前後熱門查詢的執行計畫與耗時。
+
+先在目前的資料表結構上量測，再將 libmanage 遷移回 0007 (移除標準化 ISBN 與借閱紀錄索引)
+量測一次，最後遷移回最新版本。例如以一百萬筆資料執行：
+
+    python -m benchmarks.bench_query_plans --books 1000000 --records 1000000
+"""
+from benchmarks.common import base_parser, benchmark_database, measure, seed_catalog, setup_django
+
+BEFORE_INDEXES = '0007_book_updated_at_borrowrecord_updated_at'
+
+
+def hot_queries(indexed, sample):
+    from libmanage.models import Book, BorrowRecord
+
+    isbn_lookup = {'isbn_normalized': sample['isbn']} if indexed else {'isbn': sample['isbn']}
+    return {
+        'ISBN 查詢': Book.objects.filter(**isbn_lookup).values_list('id'),
+        '用戶目前借閱': BorrowRecord.objects.filter(user_id=sample['user_id'], returned=False).values_list('id'),
+        '用戶借閱歷史': BorrowRecord.objects.filter(user_id=sample['user_id']).order_by('-borrow_date').values_list('id')[:50],
+        '依書籍與用戶歸還': BorrowRecord.objects.filter(
+            book_id=sample['book_id'], user_id=sample['user_id'], returned=False,
+        ).order_by('-borrow_date').values_list('id')[:1],
+    }
+
+
+def report(title, indexed, sample):
+    print(f'\n== {title} ==')
+    for name, queryset in hot_queries(indexed, sample).items():
+        plan = queryset.explain().replace('\n', ' | ')
+        elapsed = measure(lambda: list(queryset.all()))
+        print(f'{elapsed:8.3f} ms  {name}\t{plan}')
+
+
+def main():
+    parser = base_parser(__doc__)
+    args = parser.parse_args()
+    setup_django()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from libmanage.models import BorrowRecord
+
+    with benchmark_database(args.db, keepdb=args.keepdb):
+        if not BorrowRecord.objects.exists():
+            seed_catalog(args.books, args.users, args.records, seed=args.seed)
+        record = BorrowRecord.objects.filter(returned=False).select_related('book').first()
+        sample = {'isbn': record.book.isbn, 'user_id': record.user_id, 'book_id': record.book_id}
+
+        report('有索引 (目前結構)', True, sample)
+        call_command('migrate', 'libmanage', BEFORE_INDEXES, verbosity=0)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            report('無索引 (0007)', False, sample)
+        finally:
+            call_command('migrate', 'libmanage', verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+API 工作行程的啟動時間與常駐記憶體。
+
+在全新的子行程中執行 django.setup() 並載入 URLconf (等同 WSGI/ASGI 工作行程處理第一個請求前的準備)，
+以 ``python -X importtime`` 統計累計匯入時間，並讀取 /proc/self/status 的 VmRSS。
+接著呼叫條碼辨識 API 所需的 libmanage.scanning，量測延遲載入影像處理套件的額外成本：
+
+    python -m benchmarks.bench_startup --runs 5 --max-ms 800 --max-rss-mb 80
+
+超過 --max-ms 或 --max-rss-mb，或 JSON API 啟動時已載入 cv2 / numpy / pyzbar 時以非零狀態結束，
+可直接放進 CI。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import BACKEND_DIR
+
+HEAVY_MODULES = ('cv2', 'numpy', 'pyzbar')
+
+PROBE = '''
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'libmanagesystem.settings')
+start = time.perf_counter()
+import django
+django.setup()
+import libmanagesystem.urls
+elapsed = time.perf_counter() - start
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+result = {
+    'wall_ms': elapsed * 1000,
+    'rss_kb': rss_kb(),
+    'heavy': sorted(name for name in %(heavy)r if name in sys.modules),
+}
+if %(scan)r:
+    start = time.perf_counter()
+    try:
+        import libmanage.scanning
+    except ImportError as e:
+        result['scan_error'] = str(e)
+    result['scan_ms'] = (time.perf_counter() - start) * 1000
+    result['scan_rss_kb'] = rss_kb()
+print(json.dumps(result))
+'''
+
+
+def run_probe(scan):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE % {'heavy': HEAVY_MODULES, 'scan': scan}],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['imports'] = top_level_imports(proc.stderr)
+    return result
+
+
+def top_level_imports(stderr):
+    """回傳 -X importtime 輸出中頂層 (未縮排) 模組的累計匯入時間 (毫秒)。"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        if name.startswith('  '):
+            continue
+        top = name.strip().split('.', 1)[0]
+        totals[top] = totals.get(top, 0) + int(fields[1]) / 1000
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='量測次數 (取中位數)')
+    parser.add_argument('--top', type=int, default=10, help='列出匯入時間最長的頂層模組數量')
+    parser.add_argument('--max-ms', type=float, help='啟動時間上限 (毫秒)')
+    parser.add_argument('--max-rss-mb', type=float, help='常駐記憶體上限 (MiB)')
+    parser.add_argument('--no-scan', action='store_true', help='不量測載入條碼辨識模組的成本')
+    args = parser.parse_args()
+
+    results = [run_probe(scan=not args.no_scan) for _ in range(args.runs)]
+    wall_ms = statistics.median(r['wall_ms'] for r in results)
+    rss_mb = statistics.median(r['rss_kb'] for r in results) / 1024
+
+    print(f'API 工作行程啟動 (django.setup + URLconf)：{wall_ms:.1f} ms，RSS {rss_mb:.1f} MiB')
+    imports = results[-1]['imports']
+    for name, ms in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {name:<24} {ms:8.1f} ms')
+
+    if not args.no_scan:
+        last = results[-1]
+        if 'scan_error' in last:
+            print(f'條碼辨識模組無法載入：{last["scan_error"]}')
+        else:
+            scan_ms = statistics.median(r['scan_ms'] for r in results)
+            scan_mb = statistics.median(r['scan_rss_kb'] - r['rss_kb'] for r in results) / 1024
+            print(f'第一次條碼辨識請求的額外載入：{scan_ms:.1f} ms，RSS +{scan_mb:.1f} MiB')
+
+    failures = []
+    heavy = sorted({name for r in results for name in r['heavy']})
+    if heavy:
+        failures.append(f'啟動時已載入影像處理套件：{", ".join(heavy)}')
+    if args.max_ms is not None and wall_ms > args.max_ms:
+        failures.append(f'啟動時間 {wall_ms:.1f} ms 超過上限 {args.max_ms} ms')
+    if args.max_rss_mb is not None and rss_mb > args.max_rss_mb:
+        failures.append(f'常駐記憶體 {rss_mb:.1f} MiB 超過上限 {args.max_rss_mb} MiB')
+    for failure in failures:
+        print(f'失敗：{failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
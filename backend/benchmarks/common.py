@@ -0,0 +1,313 @@
+"""
+效能測試共用工具。
+
+每個效能測試都在獨立的 SQLite 資料庫上執行 (不會動到 db.sqlite3)，
+以 Django 的測試資料庫機制建立並套用所有遷移；加上 --keepdb 可重複使用已填充的資料。
+效能測試從同一個 IP 大量呼叫 API，預設關閉限流 (LIBMANAGE_RATE_LIMIT=0)。
+請在 backend 目錄下以 ``python -m benchmarks.<名稱>`` 執行。
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_DB_PATH = Path(tempfile.gettempdir()) / 'libmanage_benchmark.sqlite3'
+
+
+def setup_django():
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'libmanagesystem.settings')
+    # 設定 LIBMANAGE_RATE_LIMIT=1 可量測含限流的情況
+    os.environ.setdefault('LIBMANAGE_RATE_LIMIT', '0')
+    import django
+    django.setup()
+
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--db', default=str(DEFAULT_DB_PATH), help='效能測試用的 SQLite 檔案路徑')
+    parser.add_argument('--keepdb', action='store_true', help='沿用既有的效能測試資料庫，不重新建立與填充')
+    parser.add_argument('--books', type=int, default=100_000, help='書籍數量')
+    parser.add_argument('--users', type=int, default=10_000, help='用戶數量')
+    parser.add_argument('--records', type=int, default=100_000, help='借閱紀錄數量')
+    parser.add_argument('--seed', type=int, default=42, help='亂數種子')
+    return parser
+
+
+@contextlib.contextmanager
+def benchmark_database(db_path, keepdb=False):
+    """建立 (或沿用) 效能測試資料庫，結束時保留檔案以便 --keepdb 重複使用。"""
+    from django.conf import settings
+    from django.db import connection
+
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = str(db_path)
+    # serialize=False：效能測試不需要在測試之間還原資料，序列化整個資料庫在大量資料時要數十分鐘
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.close()
+        settings.DATABASES['default']['NAME'] = old_name
+
+
+@contextlib.contextmanager
+def _without_auto_dates(*models):
+    """暫時關閉 auto_now / auto_now_add，讓填充資料可以指定任意日期。"""
+    fields = [f for model in models for f in model._meta.fields
+              if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def seed_catalog(books, users, records, seed=42, batch_size=10_000, history_days=3 * 365, log=print):
+    """
+    填充書籍 (每本一冊複本)、用戶與借閱紀錄。SQLite 以 _seed_sqlite 在資料庫內產生資料，
+    其他資料庫以 bulk_create 批次寫入 (約一成的借閱紀錄尚未歸還)。
+    """
+    from django.db import connection
+
+    if connection.vendor == 'sqlite':
+        _seed_sqlite(books, users, records, seed, history_days, log)
+    else:
+        _seed_orm(books, users, records, seed, batch_size, history_days, log)
+    # 更新統計資訊，讓查詢規劃器依實際資料分佈選擇索引
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def _seed_orm(books, users, records, seed, batch_size, history_days, log):
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+    from libmanage.models import Book, BorrowRecord, Copy
+
+    rng = random.Random(seed)
+    categories = [code for code, _ in Book.CATEGORY_CHOICES]
+    now = timezone.now()
+    today = date.today()
+
+    def batches(total, make):
+        for start in range(0, total, batch_size):
+            yield [make(i) for i in range(start, min(start + batch_size, total))]
+
+    started = time.perf_counter()
+    with _without_auto_dates(Book, Copy, BorrowRecord):
+        for batch in batches(users, lambda i: User(username=f'bench{i}', password='!')):
+            User.objects.bulk_create(batch)
+        for batch in batches(books, lambda i: Book(
+                title=f'Benchmark Book {i}', author=f'Author {i % 5000}',
+                isbn=f'978{i:010d}', isbn_normalized=f'978{i:010d}',
+                category=rng.choice(categories), total_count=1, available_count=1, updated_at=now)):
+            Book.objects.bulk_create(batch)
+        book_ids = list(Book.objects.order_by('id').values_list('id', flat=True))
+        for batch in batches(books, lambda i: Copy(book_id=book_ids[i], barcode=f'{book_ids[i]}-1', updated_at=now)):
+            Copy.objects.bulk_create(batch)
+        log(f'  books/users: {time.perf_counter() - started:.1f}s')
+
+        user_ids = list(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+        copy_ids = dict(Copy.objects.values_list('book_id', 'id'))
+        book_categories = dict(Book.objects.values_list('id', 'category'))
+        open_book_ids = set()
+
+        def make_record(i):
+            borrow_date = today - timedelta(days=rng.randrange(history_days))
+            due_date = borrow_date + timedelta(days=60)
+            book_id = rng.choice(book_ids)
+            returned = rng.random() >= 0.1 or book_id in open_book_ids
+            if not returned:
+                open_book_ids.add(book_id)
+            return BorrowRecord(
+                user_id=rng.choice(user_ids), book_id=book_id, copy_id=copy_ids[book_id],
+                category=book_categories[book_id], borrow_date=borrow_date, due_date=due_date, returned=returned,
+                return_date=borrow_date + timedelta(days=rng.randrange(1, 90)) if returned else None,
+                updated_at=now,
+            )
+
+        for batch in batches(records, make_record):
+            with transaction.atomic():
+                BorrowRecord.objects.bulk_create(batch)
+        Book.objects.filter(id__in=open_book_ids).update(available_count=0)
+        Copy.objects.filter(book_id__in=open_book_ids).update(is_borrowed=True)
+    log(f'  seeded {books} books, {users} users, {records} borrow records in {time.perf_counter() - started:.1f}s')
+
+
+# 以乘法雜湊代替亂數，讓 SQL 產生的資料只由 (列號, 種子) 決定；每個欄位使用不同的乘數以免彼此相關，
+# 並取高位元避免低位元的週期性。產生的 SQL 會與參數一起執行，因此取餘數寫成 %%
+_MULTIPLIERS = (2654435761, 2246822519, 3266489917, 668265263, 374761393)
+
+
+def _mix(expr, seed, stream):
+    return f'((({expr}) + {seed}) * {_MULTIPLIERS[stream]} %% 4294967296 / 65536)'
+
+
+def _seed_sqlite(books, users, records, seed, history_days, log, chunk=1_000_000):
+    """
+    以遞迴 CTE 在 SQLite 內產生資料，不經過 Python 物件，千萬筆借閱紀錄約數分鐘。
+    每本書一冊複本，依書籍 id 順序寫入，因此複本 id 與書籍 id 的差為定值。
+    填充借閱紀錄前先移除該表的索引，寫入後再重建 (含「每個複本只能有一筆未歸還借閱」等唯一索引)。
+    前 min(records, books) 筆中每十筆有一筆尚未歸還，且各自對應不同的書；借閱日期在最近 history_days 天內，
+    未歸還的借閱在最近 120 天內 (約一半已逾期)。
+    """
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from libmanage.models import Book, BorrowRecord, Copy
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    today = date.today().isoformat()
+    categories = [code for code, _ in Book.CATEGORY_CHOICES]
+    category = 'CASE {} {} END'.format(
+        _mix('i', seed, 0) + f' %% {len(categories)}',
+        ' '.join(f"WHEN {n} THEN '{code}'" for n, code in enumerate(categories)),
+    )
+    book_table, copy_table, record_table = Book._meta.db_table, Copy._meta.db_table, BorrowRecord._meta.db_table
+
+    def insert(total, sql, params):
+        for start in range(0, total, chunk):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    'WITH RECURSIVE seq(i) AS (SELECT %s UNION ALL SELECT i + 1 FROM seq WHERE i + 1 < %s) ' + sql,
+                    [start, min(start + chunk, total), *params],
+                )
+
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous = OFF')
+        cursor.execute('PRAGMA cache_size = -262144')
+    insert(users, (
+        'INSERT INTO auth_user (username, password, first_name, last_name, email, '
+        'is_superuser, is_staff, is_active, date_joined) '
+        "SELECT 'bench' || i, %s, '', '', '', 0, 0, 1, %s FROM seq"
+    ), [make_password(None), now])
+    insert(books, (
+        f'INSERT INTO {book_table} (title, author, isbn, isbn_normalized, total_count, available_count, hold_count, '
+        'category, status, updated_at, catalog_version) '
+        f"SELECT 'Benchmark Book ' || i, 'Author ' || (i %% 5000), printf('978%%010d', i), printf('978%%010d', i), "
+        f"1, 1, 0, {category}, 'AVAILABLE', %s, 0 FROM seq"
+    ), [now])
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {copy_table} (book_id, barcode, status, is_borrowed, is_held, updated_at) '
+            f"SELECT id, id || '-1', 'AVAILABLE', 0, 0, %s FROM {book_table} ORDER BY id", [now],
+        )
+    log(f'  books/users/copies: {time.perf_counter() - started:.1f}s')
+
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(id) FROM auth_user WHERE username LIKE %s', ['bench%'])
+        first_user = cursor.fetchone()[0]
+        cursor.execute(f'SELECT MIN(id) FROM {book_table}')
+        first_book = cursor.fetchone()[0]
+        cursor.execute(f'SELECT MIN(id) FROM {copy_table}')
+        copy_offset = cursor.fetchone()[0] - first_book
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s "
+                       'AND sql IS NOT NULL', [record_table])
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+    open_limit = min(records, books)
+    insert(records, (
+        f'INSERT INTO {record_table} (user_id, book_id, copy_id, borrow_date, due_date, return_date, returned, '
+        'updated_at) '
+        "SELECT user_id, book_id, book_id + %s, date(%s, '-' || age || ' days'), date(%s, '-' || age || ' days', '+60 days'), "
+        "CASE WHEN is_open THEN NULL ELSE min(date(%s, '-' || age || ' days', '+' || keep || ' days'), %s) END, "
+        'NOT is_open, %s FROM ('
+        f'  SELECT %s + {_mix("i", seed, 1)} %% %s AS user_id, '
+        f'    %s + CASE WHEN is_open THEN i ELSE {_mix("i", seed, 2)} %% %s END AS book_id, '
+        f'    CASE WHEN is_open THEN {_mix("i", seed, 3)} %% 120 ELSE {_mix("i", seed, 3)} %% %s END AS age, '
+        f'    1 + {_mix("i", seed, 4)} %% 89 AS keep, is_open '
+        '  FROM (SELECT i, (i %% 10 = 0 AND i < %s) AS is_open FROM seq)'
+        ')'
+    ), [copy_offset, today, today, today, today, now, first_user, users, first_book, books, history_days, open_limit])
+    log(f'  borrow records: {time.perf_counter() - started:.1f}s')
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _, sql in indexes:
+            cursor.execute(sql)
+        cursor.execute(f'UPDATE {book_table} SET available_count = 0 WHERE id IN '
+                       f'(SELECT book_id FROM {record_table} WHERE NOT returned)')
+        cursor.execute(f'UPDATE {copy_table} SET is_borrowed = 1 WHERE id IN '
+                       f'(SELECT copy_id FROM {record_table} WHERE NOT returned)')
+    log(f'  seeded {books} books, {users} users, {records} borrow records in {time.perf_counter() - started:.1f}s')
+
+
+def rebuild_derived(log=print):
+    """重建由書籍與借閱紀錄衍生的資料：全文檢索索引與借閱統計彙總表。"""
+    from libmanage import search, stats
+
+    started = time.perf_counter()
+    search.rebuild_index()
+    stats.backfill()
+    log(f'  search index and circulation stats: {time.perf_counter() - started:.1f}s')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'伺服器未在 {timeout} 秒內啟動')
+
+
+def fetch(base, method, path, payload=None, token=None):
+    """送出 HTTP 請求 (token 為登入權杖)，回傳 (耗時毫秒, 狀態碼, 回應本文)。"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    req = urllib.request.Request(base + path, data=data, method=method, headers=headers)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, body = e.code, e.read()
+    return (time.perf_counter() - started) * 1000, status, body
+
+
+def request(base, method, path, payload=None, token=None):
+    elapsed, status, body = fetch(base, method, path, payload, token)
+    # 4xx 為正常的業務錯誤 (例如書已被借出)，只計入 5xx
+    error = f'HTTP {status}: {body[:120].decode(errors="replace")}' if status >= 500 else None
+    return elapsed, error
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else (values[0] if values else 0)
+
+
+def measure(func, repeat=20):
+    """回傳多次執行 func 的耗時中位數 (毫秒)。"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
@@ -0,0 +1,382 @@
+"""
+效能回歸測試套件：填充資料、逐一量測各 API、執行負載情境，並與儲存的基準比較。
+
+1. 以 common.seed_catalog 填充指定規模的資料 (SQLite 在資料庫內產生，百萬本書、千萬筆借閱紀錄可行)，
+   並重建全文檢索索引與借閱統計；加上 --keepdb 沿用已填充的資料庫。
+2. 微基準 (micro)：在同一行程內以 django.test.Client 逐一呼叫各 view，
+   回報 p50/p95/p99 延遲、每秒次數與每次請求的查詢數 (取自 Server-Timing 標頭)。
+3. 負載情境 (load)：啟動 gunicorn (或 runserver，或以 --url 指定已在執行、使用同一個資料庫的伺服器)，
+   以多個執行緒同時執行下列情境，回報吞吐量與各步驟的延遲百分位數：
+   - catalog_browse：書籍列表、連續翻頁、書籍詳細資料、全文檢索
+   - scan_and_borrow：掃描一車書 (批次解析 ISBN)、批次借出、批次歸還
+   - return_rush：大量借出的書在同一時間逐本歸還 (還書箱清空)，直到全部還完
+4. 以 --save-baseline 保存結果為 JSON；之後以 --compare 比較，p95 延遲或吞吐量
+   退步超過 --tolerance 時列出並以結束碼 1 結束，可放進 CI。
+
+基準與機器相關，請在同一台機器、同樣的資料規模下比較：
+
+    python -m benchmarks.suite --books 1000000 --records 10000000 --users 100000 --save-baseline baseline.json
+    python -m benchmarks.suite --keepdb --compare baseline.json
+    python -m benchmarks.suite --keepdb --only micro --cases book_list,book_search
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from benchmarks.common import (
+    BACKEND_DIR, base_parser, benchmark_database, fetch, free_port, percentile, rebuild_derived, seed_catalog,
+    setup_django, wait_for,
+)
+
+SCENARIOS = ('catalog_browse', 'scan_and_borrow', 'return_rush')
+SERVERS = ('gunicorn', 'gunicorn-asgi', 'runserver')
+SEARCH_TERMS = ('Benchmark Book 12', 'Author 42', 'Book 99', '978000001')
+CART_SIZE = 5
+QUERIES_PATTERN = re.compile(r'(\d+) queries')
+
+
+def search_path(i):
+    return '/api/books/search/?' + urllib.parse.urlencode({'q': SEARCH_TERMS[i % len(SEARCH_TERMS)]})
+
+
+def summarize(values):
+    return {
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'count': len(values),
+    }
+
+
+class Fixtures:
+    """從資料庫挑選量測用的書籍與用戶，各情境使用互不重疊的可借閱書籍。"""
+
+    def __init__(self, args):
+        from django.contrib.auth.models import User
+        from django.db.models import Count
+        from django.db.models.functions import Mod
+        from libmanage import tokens
+        from libmanage.models import Book, BorrowRecord, CatalogVersion
+
+        # 平均分佈在整個目錄中的 1000 本書
+        step = max(1, Book.objects.order_by('-id').values_list('id', flat=True)[0] // 1000)
+        self.books = list(Book.objects.alias(bucket=Mod('id', step)).filter(bucket=0)
+                          .order_by('id').values('id', 'isbn')[:1000])
+        self.last_book_id = self.books[-1]['id']
+        self.users = list(
+            BorrowRecord.objects.filter(user_id__in=User.objects.order_by('id').values('id')[:1000])
+            .values('user_id').annotate(n=Count('id')).order_by('-n').values_list('user_id', flat=True)[:200]
+        ) or list(User.objects.order_by('id').values_list('id', flat=True)[:200])
+        # 需要登入的 API 以預先簽發的權杖呼叫
+        self.tokens = {user.id: tokens.issue(user)[0] for user in User.objects.filter(id__in=self.users)}
+        self.catalog_version = CatalogVersion.current()
+
+        wanted = args.iterations * CART_SIZE + args.concurrency * (args.pool + args.rush)
+        available = list(
+            Book.objects.filter(available_count__gt=0, status='AVAILABLE')
+            .order_by('-id').values('id', 'isbn')[:wanted]
+        )
+        if len(available) < wanted:
+            raise SystemExit(f'可借閱的書籍不足：需要 {wanted} 本，只有 {len(available)} 本')
+        micro, rest = available[:args.iterations * CART_SIZE], available[args.iterations * CART_SIZE:]
+        self.micro_carts = [[book['id'] for book in micro[i:i + CART_SIZE]] for i in range(0, len(micro), CART_SIZE)]
+        per_worker = args.pool + args.rush
+        self.worker_pools = [rest[i * per_worker:i * per_worker + args.pool] for i in range(args.concurrency)]
+        self.rush_pools = [[book['id'] for book in rest[i * per_worker + args.pool:(i + 1) * per_worker]]
+                           for i in range(args.concurrency)]
+
+
+def micro_cases(fx):
+    """每個量測項目為 (名稱, 依迭代次數 i 產生 [(method, path, payload[, 登入權杖]), ...] 的函式)。"""
+    from libmanage.views.common import encode_cursor
+
+    def book(i):
+        return fx.books[i % len(fx.books)]
+
+    def token(i):
+        return fx.tokens[fx.users[i % len(fx.users)]]
+
+    deep_cursor = encode_cursor(fx.last_book_id - 500)
+    return [
+        ('book_list', lambda i: [('GET', '/api/books/?limit=50', None)]),
+        ('book_list_filtered', lambda i: [('GET', '/api/books/?limit=50&category=HISTORY&available=true', None)]),
+        ('book_list_deep_page', lambda i: [('GET', f'/api/books/?limit=50&cursor={deep_cursor}', None)]),
+        ('book_detail', lambda i: [('GET', f'/api/books/{book(i)["id"]}/', None)]),
+        ('book_by_isbn', lambda i: [('GET', f'/api/books/isbn/{book(i)["isbn"]}/', None)]),
+        ('book_search', lambda i: [('GET', search_path(i), None)]),
+        ('book_resolve', lambda i: [('POST', '/api/books/resolve/',
+                                     {'items': [book(i * 40 + n)['isbn'] for n in range(40)]})]),
+        ('book_changes', lambda i: [('GET', f'/api/books/changes/?since={max(fx.catalog_version - 100, 0)}', None)]),
+        ('user_home', lambda i: [('GET', '/api/user_home/', None, token(i))]),
+        ('borrow_and_return', lambda i: [
+            ('POST', f'/api/books/borrow/{fx.micro_carts[i][0]}/', {}, token(i)),
+            ('POST', '/api/books/return_by_book_and_user/', {'book_id': fx.micro_carts[i][0]}, token(i)),
+        ]),
+        ('bulk_borrow_and_return', lambda i: [
+            ('POST', '/api/loans/bulk_borrow/', {'book_ids': fx.micro_carts[i]}, token(i)),
+            ('POST', '/api/loans/bulk_return/', {'book_ids': fx.micro_carts[i]}, token(i)),
+        ]),
+        ('stats_summary', lambda i: [('GET', '/api/stats/', None)]),
+        ('stats_daily', lambda i: [('GET', '/api/stats/daily/', None)]),
+        ('stats_top_books', lambda i: [('GET', '/api/stats/books/?limit=50', None)]),
+        ('stats_overdue', lambda i: [('GET', '/api/stats/overdue/?limit=50', None)]),
+    ]
+
+
+def run_micro(args, fx):
+    from django.core.cache import cache
+    from django.test import Client
+
+    client = Client()
+    selected = set(args.cases.split(',')) if args.cases else None
+    results = {}
+    print('\n== micro ==')
+    for name, make in micro_cases(fx):
+        if selected and name not in selected:
+            continue
+        cache.clear()
+        timings, queries = [], 0
+        for i in range(-args.warmup, args.iterations):
+            # 暖機重複使用最後幾組資料；借出的書都會在同一次迭代中歸還
+            steps = make(i % args.iterations)
+            started = time.perf_counter()
+            for method, path, payload, *token in steps:
+                headers = {'Authorization': f'Bearer {token[0]}'} if token else None
+                if method == 'GET':
+                    response = client.get(path, headers=headers)
+                else:
+                    response = client.post(path, json.dumps(payload), content_type='application/json', headers=headers)
+                if response.status_code >= 400:
+                    raise RuntimeError(f'{name}: {method} {path} 回傳 {response.status_code}：{response.content[:200]!r}')
+                if i >= 0:
+                    match = QUERIES_PATTERN.search(response.get('Server-Timing', ''))
+                    queries += int(match.group(1)) if match else 0
+            if i >= 0:
+                timings.append((time.perf_counter() - started) * 1000)
+        result = summarize(timings)
+        result['ops'] = round(len(timings) / (sum(timings) / 1000), 1)
+        result['queries'] = round(queries / len(timings), 1)
+        results[name] = result
+        print(f'  {name:<24} p50 {result["p50"]:7.2f} ms  p95 {result["p95"]:7.2f} ms  '
+              f'p99 {result["p99"]:7.2f} ms  {result["ops"]:8.1f} 次/秒  {result["queries"]:5.1f} 查詢')
+    return results
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = {}
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def call(self, base, step, method, path, payload=None, token=None):
+        elapsed, status, body = fetch(base, method, path, payload, token)
+        with self.lock:
+            self.timings.setdefault(step, []).append(elapsed)
+            if status >= 400:
+                self.errors.append(f'{step}: HTTP {status}: {body[:120].decode(errors="replace")}')
+        return body if status < 400 else None
+
+
+def catalog_browse(base, recorder, index, deadline, fx, args):
+    i = index
+    while time.monotonic() < deadline:
+        i += args.concurrency
+        body = recorder.call(base, 'list', 'GET', '/api/books/?limit=50')
+        for _ in range(2):
+            cursor = body and json.loads(body).get('next_cursor')
+            if not cursor:
+                break
+            body = recorder.call(base, 'next_page', 'GET', f'/api/books/?limit=50&cursor={cursor}')
+        recorder.call(base, 'detail', 'GET', f'/api/books/{fx.books[i % len(fx.books)]["id"]}/')
+        recorder.call(base, 'search', 'GET', search_path(i))
+
+
+def scan_and_borrow(base, recorder, index, deadline, fx, args):
+    pool = fx.worker_pools[index]
+    token = fx.tokens[fx.users[index % len(fx.users)]]
+    i = 0
+    while time.monotonic() < deadline:
+        cart = [pool[(i + n) % len(pool)] for n in range(CART_SIZE)]
+        i += CART_SIZE
+        recorder.call(base, 'resolve', 'POST', '/api/books/resolve/', {'items': [book['isbn'] for book in cart]})
+        book_ids = [book['id'] for book in cart]
+        recorder.call(base, 'bulk_borrow', 'POST', '/api/loans/bulk_borrow/', {'book_ids': book_ids}, token)
+        recorder.call(base, 'bulk_return', 'POST', '/api/loans/bulk_return/', {'book_ids': book_ids}, token)
+
+
+def return_rush(base, recorder, index, deadline, fx, args):
+    token = fx.tokens[fx.users[index % len(fx.users)]]
+    for book_id in fx.rush_pools[index]:
+        if time.monotonic() >= deadline:
+            break
+        recorder.call(base, 'return', 'POST', '/api/books/return_by_book_and_user/', {'book_id': book_id}, token)
+
+
+def prepare_rush(fx):
+    """借出還書潮情境要歸還的書 (不計時)。"""
+    from libmanage import loans
+
+    for index, book_ids in enumerate(fx.rush_pools):
+        for start in range(0, len(book_ids), loans.MAX_BULK_ITEMS):
+            loans.borrow_books(fx.users[index % len(fx.users)], book_ids[start:start + loans.MAX_BULK_ITEMS])
+
+
+def start_server(args, db_name):
+    port = free_port()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='libmanagesystem.settings', LIBMANAGE_DB_NAME=str(db_name),
+               LIBMANAGE_CACHE='locmem', LIBMANAGE_SCAN_WORKERS='0', LIBMANAGE_RATE_LIMIT='0',
+               LIBMANAGE_WORKERS=str(args.workers), LIBMANAGE_BIND=f'127.0.0.1:{port}',
+               LIBMANAGE_SERVER='asgi' if args.server == 'gunicorn-asgi' else 'wsgi')
+    if args.server == 'runserver':
+        command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '--log-level', 'warning']
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=None if args.server != 'runserver' else subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        wait_for(base + '/api/books/?limit=1')
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process, base
+
+
+def run_scenario(name, base, fx, args):
+    if name == 'return_rush':
+        prepare_rush(fx)
+    recorder = Recorder()
+    scenario = globals()[name]
+    started = time.monotonic()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=scenario, args=(base, recorder, i, deadline, fx, args))
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    all_timings = [value for values in recorder.timings.values() for value in values]
+    result = summarize(all_timings)
+    result['throughput'] = round(len(all_timings) / elapsed, 1)
+    result['errors'] = len(recorder.errors)
+    result['steps'] = {step: summarize(values) for step, values in recorder.timings.items()}
+    print(f'  {name:<16} {result["throughput"]:8.1f} 請求/秒  p50 {result["p50"]:7.1f} ms  '
+          f'p95 {result["p95"]:7.1f} ms  p99 {result["p99"]:7.1f} ms  錯誤 {result["errors"]} 次')
+    for step, summary in result['steps'].items():
+        print(f'    {step:<14} p50 {summary["p50"]:7.1f} ms  p95 {summary["p95"]:7.1f} ms  '
+              f'p99 {summary["p99"]:7.1f} ms  ({summary["count"]} 次)')
+    for error in sorted(set(recorder.errors))[:3]:
+        print(f'    錯誤範例：{error}')
+    return result
+
+
+def run_load(args, fx, db_name):
+    print(f'\n== load ({args.url or args.server}，{args.concurrency} 併發) ==')
+    process, base = (None, args.url.rstrip('/')) if args.url else start_server(args, db_name)
+    try:
+        return {name: run_scenario(name, base, fx, args) for name in args.scenarios.split(',')}
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """列出 p95 延遲變慢或吞吐量下降超過 tolerance 的項目；延遲差距小於 min_delta_ms 視為雜訊。"""
+    regressions = []
+    # 借閱紀錄數會因借還而增加，只比較書籍與用戶數
+    data, base_data = results['meta']['data'], baseline.get('meta', {}).get('data', {})
+    if any(data[key] != base_data.get(key) for key in ('books', 'users')):
+        print(f'\n注意：資料規模與基準不同 (基準 {base_data})')
+
+    def check(label, current, base):
+        if current['p95'] > base['p95'] * (1 + tolerance) and current['p95'] - base['p95'] >= min_delta_ms:
+            regressions.append(f'{label} p95 {base["p95"]:.2f} → {current["p95"]:.2f} ms')
+        if 'throughput' in base and current['throughput'] < base['throughput'] * (1 - tolerance):
+            regressions.append(f'{label} 吞吐量 {base["throughput"]:.1f} → {current["throughput"]:.1f} 請求/秒')
+
+    for kind in ('micro', 'load'):
+        for name, current in results.get(kind, {}).items():
+            base = baseline.get(kind, {}).get(name)
+            if base is not None:
+                check(f'{kind}/{name}', current, base)
+    print(f'\n== 與基準比較 (容許 {tolerance:.0%}) ==')
+    for line in regressions:
+        print(f'  退步：{line}')
+    if not regressions:
+        print('  沒有退步')
+    return regressions
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.formatter_class = argparse.RawDescriptionHelpFormatter
+    parser.add_argument('--only', choices=('micro', 'load'), help='只執行微基準或負載情境')
+    parser.add_argument('--cases', help='逗號分隔的微基準項目 (預設全部)')
+    parser.add_argument('--iterations', type=int, default=200, help='每個微基準項目的量測次數')
+    parser.add_argument('--warmup', type=int, default=10, help='每個微基準項目的暖機次數')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'逗號分隔：{", ".join(SCENARIOS)}')
+    parser.add_argument('--server', choices=SERVERS, default='gunicorn', help='負載情境使用的伺服器')
+    parser.add_argument('--url', help='改為對已在執行的伺服器施加負載 (須使用同一個效能測試資料庫)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn 工作行程數')
+    parser.add_argument('--concurrency', type=int, default=8, help='負載情境的併發用戶數')
+    parser.add_argument('--duration', type=float, default=10, help='每個負載情境的最長秒數')
+    parser.add_argument('--pool', type=int, default=50, help='scan_and_borrow 每個用戶輪流借還的書籍數')
+    parser.add_argument('--rush', type=int, default=200, help='return_rush 每個用戶要歸還的書籍數')
+    parser.add_argument('--output', help='將結果寫入 JSON 檔')
+    parser.add_argument('--save-baseline', metavar='PATH', help='將結果保存為基準')
+    parser.add_argument('--compare', metavar='PATH', help='與基準比較，有退步時結束碼為 1')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='容許的退步比例')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='小於此差距的延遲變化視為雜訊')
+    args = parser.parse_args()
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from libmanage.models import Book, BorrowRecord
+
+    with benchmark_database(args.db, keepdb=args.keepdb) as connection:
+        if not Book.objects.exists():
+            print('填充資料：')
+            seed_catalog(args.books, args.users, args.records, seed=args.seed)
+            rebuild_derived()
+        fx = Fixtures(args)
+        results = {'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': f'{connection.vendor} {connection.Database.sqlite_version}'
+                        if connection.vendor == 'sqlite' else connection.vendor,
+            'cpus': os.cpu_count(),
+            'data': {'books': Book.objects.count(), 'records': BorrowRecord.objects.count(),
+                     'users': User.objects.count()},
+            'server': None if args.only == 'micro' else (args.url or args.server),
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+        }}
+        if args.only != 'load':
+            results['micro'] = run_micro(args, fx)
+        if args.only != 'micro':
+            results['load'] = run_load(args, fx, connection.settings_dict['NAME'])
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'\n結果已寫入 {path}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance, args.min_delta_ms):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
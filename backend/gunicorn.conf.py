@@ -0,0 +1,27 @@
+"""
+gunicorn 設定，在 backend 目錄執行 ``gunicorn`` 時自動載入。
+
+LIBMANAGE_SERVER=wsgi (預設)：同步工作行程，每個行程一次處理 LIBMANAGE_THREADS 個請求。
+LIBMANAGE_SERVER=asgi：uvicorn 工作行程，書籍列表、書籍詳細資料、ISBN 查詢與用戶首頁為 async views，
+等待慢速用戶端上傳或下載時不會佔住整個工作行程。
+
+多個工作行程時快取需跨行程共用 (LIBMANAGE_CACHE=redis)，否則寫入後的快取失效只清除單一行程，
+見 settings.BOOK_CACHE_TIMEOUT。
+"""
+import os
+
+bind = os.environ.get('LIBMANAGE_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('LIBMANAGE_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+
+if os.environ.get('LIBMANAGE_SERVER', 'wsgi') == 'asgi':
+    wsgi_app = 'libmanagesystem.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'libmanagesystem.wsgi:application'
+    threads = int(os.environ.get('LIBMANAGE_THREADS', 1))
+
+
+def on_starting(server):
+    if workers > 1 and os.environ.get('LIBMANAGE_CACHE', 'locmem') == 'locmem':
+        server.log.warning('%d 個工作行程使用各自的 locmem 快取，書籍資料只快取數秒；'
+                           '請設定 LIBMANAGE_CACHE=redis 共用快取', workers)
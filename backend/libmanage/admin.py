@@ -1,7 +1,10 @@
 from django.contrib import admin
-from .models import Book, BorrowRecord
+from .models import AuthToken, Book, BorrowRecord, Copy, Hold
 
 # Register your models here.
 
 admin.site.register(Book)
-admin.site.register(BorrowRecord)
\ No newline at end of file
+admin.site.register(Copy)
+admin.site.register(BorrowRecord)
+admin.site.register(Hold)
+admin.site.register(AuthToken)
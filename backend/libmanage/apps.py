@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LibmanageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'libmanage'
+
+    def ready(self):
+        # 在任何資料庫連線建立前註冊查詢計時 (libmanage.metrics 連接 connection_created 訊號)
+        from . import metrics  # noqa: F401
@@ -0,0 +1,95 @@
+"""
+快取鍵與失效處理。
+
+使用 Django 的快取框架 (settings.CACHES)，未設定時為行程內的 LocMemCache。
+所有寫入路徑在交易提交後才使快取失效。清除只作用在目前行程看得到的快取：
+LocMemCache 時其他工作行程的舊資料要等到期，快取時間見 settings.BOOK_CACHE_TIMEOUT / USER_HOME_CACHE_TIMEOUT。
+
+書籍資料附帶「世代」：讀取資料庫之前先取得該書的世代值，快取時一併存入；書籍寫入提交後
+將世代換成新的亂數 (invalidate_book)，讀取時世代不符即視為未命中。在寫入提交前就讀取資料庫的請求，
+即使在失效之後才寫回快取，存入的也是舊世代，不會被當成有效資料；只清除快取鍵則無法排除這種情況。
+"""
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Book
+
+BOOK_CACHE_FIELDS = [
+    'id', 'title', 'author', 'isbn', 'isbn_normalized', 'total_count', 'available_count', 'category', 'status',
+    'updated_at', 'catalog_version',
+]
+
+
+def user_home_key(user_id, day=None):
+    # 逾期狀態依日期而定，鍵中包含日期，跨日後自然失效
+    day = day or timezone.now().date()
+    return f'libmanage:user_home:{user_id}:{day.isoformat()}'
+
+
+def invalidate_user_home(user_id):
+    transaction.on_commit(lambda: cache.delete(user_home_key(user_id)))
+
+
+def book_key(book_id):
+    # 鍵中的 v3 對應快取內容的格式 ((世代, BOOK_CACHE_FIELDS))，格式變更時遞增，避免讀到舊格式的快取
+    return f'libmanage:book:v3:{book_id}'
+
+
+def generation_key(book_id):
+    return f'libmanage:book_generation:{book_id}'
+
+
+def isbn_key(isbn_normalized):
+    # ISBN 只對應到書籍 id，書籍資料只存一份，失效時不需知道舊的 ISBN
+    return f'libmanage:isbn:{isbn_normalized}'
+
+
+async def aget_book(book_id=None, isbn_normalized=None):
+    """
+    依 id 或標準化 ISBN 讀取書籍資料 (read-through)，不存在時回傳 None。
+    回傳的 dict 包含 BOOK_CACHE_FIELDS 中的欄位。供 async views 使用，快取與資料庫皆以非同步 API 存取。
+    """
+    if isbn_normalized is not None:
+        book_id = await cache.aget(isbn_key(isbn_normalized))
+    generation = None
+    if book_id is not None:
+        cached = await cache.aget_many([book_key(book_id), generation_key(book_id)])
+        generation = cached.get(generation_key(book_id))
+        entry = cached.get(book_key(book_id))
+        # ISBN 對應可能在書籍修改 ISBN 後過期，需確認仍然相符
+        if entry is not None and entry[0] == generation and (
+            isbn_normalized is None or entry[1]['isbn_normalized'] == isbn_normalized
+        ):
+            return entry[1]
+
+    lookup = {'id': book_id} if isbn_normalized is None else {'isbn_normalized': isbn_normalized}
+    data = await Book.objects.filter(**lookup).values(*BOOK_CACHE_FIELDS).afirst()
+    if data is None:
+        return None
+    entries = {}
+    if data['isbn_normalized']:
+        entries[isbn_key(data['isbn_normalized'])] = data['id']
+    # 只有在讀取資料庫前取得的世代屬於這本書時才快取書籍資料；以 ISBN 首次查到的書只快取對應的 id，
+    # 下次查詢改走 id 的路徑
+    if data['id'] == book_id:
+        entries[book_key(book_id)] = (generation, data)
+    await cache.aset_many(entries, settings.BOOK_CACHE_TIMEOUT)
+    return data
+
+
+def _new_generations(book_ids):
+    # 世代不設期限；被淘汰時讀到的世代為 None，與先前存入的亂數不符，仍視為未命中
+    cache.set_many({generation_key(book_id): secrets.randbits(62) for book_id in book_ids}, None)
+
+
+def invalidate_book(book_id):
+    transaction.on_commit(lambda: _new_generations([book_id]))
+
+
+def invalidate_books(book_ids):
+    book_ids = list(book_ids)
+    transaction.on_commit(lambda: _new_generations(book_ids))
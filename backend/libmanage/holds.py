@@ -0,0 +1,209 @@
+"""
+預約隊列。
+
+書籍沒有可借的複本時讀者可以預約 (place_hold)，預約依 (priority 大者優先, id) 排成隊列。
+任何讓複本變為可借的寫入 (歸還、新增複本、複本狀態恢復、取消或逾期的預約釋出保留的複本)
+都在同一個交易中呼叫 allocate：複本先照常計入可借冊數，再依序分配給隊首的預約，
+分配到的複本標記為 is_held、預約轉為 READY，並扣回可借冊數與 Book.hold_count。
+
+隊首以部分索引 hold_queue_idx 查詢 (每本書一次索引查詢，LIMIT 為釋出的冊數)，
+成本與隊列長度無關；Book.hold_count 為零時不查詢預約。
+鎖定順序與借還相同：Book → Hold → Copy，所有改變隊列的寫入都先以 UPDATE 寫入 Book。
+"""
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import caching
+from .models import Book, BorrowRecord, CatalogVersion, Copy, Hold, counter_delta
+
+# 可取書的預約保留複本的期限
+PICKUP_PERIOD = timedelta(days=7)
+# 等候中的預約的期限
+MAX_WAIT = timedelta(days=180)
+DEFAULT_BATCH_SIZE = 1000
+
+
+class HoldError(Exception):
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@dataclass
+class SweepResult:
+    expired: int = 0
+    batches: int = 0
+    finished: bool = False
+
+    def as_dict(self):
+        return {'expired': self.expired, 'batches': self.batches, 'finished': self.finished}
+
+
+def place_hold(user_id, book_id, priority=0):
+    """預約目前沒有可借複本的書，回傳新建立的 Hold；無法預約時拋出 HoldError。"""
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            queued = Book.objects.filter(id=book_id, status='AVAILABLE', total_count__gt=0, available_count=0).update(
+                hold_count=F('hold_count') + 1,
+            )
+            if not queued:
+                raise _place_failure(book_id)
+            if BorrowRecord.objects.filter(user_id=user_id, book_id=book_id, returned=False).exists():
+                raise HoldError('您已借閱此書且尚未歸還')
+            return Hold.objects.create(user_id=user_id, book_id=book_id, priority=priority, expires_at=now + MAX_WAIT)
+    except IntegrityError:
+        raise HoldError('您已預約此書')
+
+
+def queue_position(hold):
+    """等候中的預約在隊列中的名次 (1 為隊首)，以隊列索引 hold_queue_idx 計數。"""
+    ahead = Hold.objects.filter(book_id=hold.book_id, status='WAITING').filter(
+        Q(priority__gt=hold.priority) | Q(priority=hold.priority, id__lt=hold.id)
+    ).count()
+    return ahead + 1
+
+
+def _place_failure(book_id):
+    book = Book.objects.filter(id=book_id).only('status', 'total_count', 'available_count').first()
+    if book is None:
+        return HoldError('書籍不存在', status=404)
+    if book.status != 'AVAILABLE':
+        return HoldError(f'此書狀態為 "{book.get_status_display()}"，無法預約。')
+    if not book.total_count:
+        return HoldError('此書尚無館藏複本')
+    return HoldError('此書目前可借閱，請直接借閱')
+
+
+def cancel_hold(hold_id, user_id=None):
+    """
+    取消預約，回傳該 Hold；可取書的預約會釋出保留的複本並分配給下一位。
+    指定 user_id 時只能取消該用戶自己的預約。
+    """
+    hold = Hold.objects.filter(id=hold_id).only('id', 'book_id', 'user_id', 'status', 'copy_id').first()
+    if hold is None:
+        raise HoldError('預約不存在', status=404)
+    if user_id is not None and hold.user_id != user_id:
+        raise HoldError('無權取消此預約', status=403)
+    if hold.status not in Hold.ACTIVE_STATUSES:
+        raise HoldError('此預約已結束')
+    with transaction.atomic():
+        _close([hold], 'CANCELLED', timezone.now())
+    hold.status = 'CANCELLED'
+    return hold
+
+
+def _close(holds, status, now):
+    """
+    結束一批有效的預約 (取消或逾期)：等候中的扣除預約人數，可取書的釋出保留的複本，
+    釋出的複本在同一個交易中分配給下一位。預約狀態在讀取後被變更時拋出 HoldError。
+    """
+    waiting = [hold for hold in holds if hold.status == 'WAITING']
+    ready = [hold for hold in holds if hold.status == 'READY']
+    updates = {}
+    if waiting:
+        updates['hold_count'] = counter_delta('hold_count', {k: -n for k, n in Counter(h.book_id for h in waiting).items()})
+    if ready:
+        updates['available_count'] = counter_delta('available_count', Counter(h.book_id for h in ready))
+        updates['updated_at'] = now
+        updates['catalog_version'] = CatalogVersion.bump()
+    Book.objects.filter(id__in={hold.book_id for hold in holds}).update(**updates)
+
+    closed = Hold.objects.filter(
+        Q(id__in=[h.id for h in waiting], status='WAITING') | Q(id__in=[h.id for h in ready], status='READY'),
+    ).update(status=status, updated_at=now)
+    if closed != len(holds):
+        raise HoldError('預約狀態已變更，請重新操作')
+    if ready:
+        Copy.objects.filter(id__in=[hold.copy_id for hold in ready]).update(is_held=False, updated_at=now)
+        released = defaultdict(list)
+        for hold in ready:
+            released[hold.book_id].append(hold.copy_id)
+        allocate(released, now)
+        caching.invalidate_books(list(released))
+
+
+def allocate(copies_by_book, now):
+    """
+    將剛變為可借的複本 ({book_id: [copy_id, ...]}，須已計入可借冊數) 依隊列順序分配給等候中的預約，
+    回傳分配的冊數。呼叫前須已在同一個交易中寫入這些書籍 (持有書籍資料列的鎖)。
+    """
+    copies_by_book = {book_id: copy_ids for book_id, copy_ids in copies_by_book.items() if copy_ids}
+    if not copies_by_book:
+        return 0
+    queued = list(Book.objects.filter(id__in=list(copies_by_book), hold_count__gt=0).values_list('id', flat=True))
+    allocated = Counter()
+    held = []
+    for book_id in queued:
+        copy_ids = copies_by_book[book_id]
+        hold_ids = Hold.objects.filter(book_id=book_id, status='WAITING').order_by('-priority', 'id').values_list(
+            'id', flat=True,
+        )[:len(copy_ids)]
+        for hold_id, copy_id in zip(list(hold_ids), copy_ids):
+            Hold.objects.filter(id=hold_id).update(
+                status='READY', copy_id=copy_id, ready_at=now, expires_at=now + PICKUP_PERIOD, updated_at=now,
+            )
+            held.append(copy_id)
+            allocated[book_id] += 1
+    if not held:
+        return 0
+    taken = {book_id: -n for book_id, n in allocated.items()}
+    Book.objects.filter(id__in=list(allocated)).update(
+        available_count=counter_delta('available_count', taken),
+        hold_count=counter_delta('hold_count', taken),
+    )
+    Copy.objects.filter(id__in=held).update(is_held=True, updated_at=now)
+    return len(held)
+
+
+def requeue(book_id, copy_id, now):
+    """
+    保留中的複本不再可借 (例如損壞) 時，將其預約放回隊列並保留原本的順位，
+    若該書仍有其他可借的複本則立即改分配該複本。呼叫前須已寫入該書籍。
+    """
+    requeued = Hold.objects.filter(copy_id=copy_id, status='READY').update(
+        status='WAITING', copy=None, ready_at=None, expires_at=now + MAX_WAIT, updated_at=now,
+    )
+    Copy.objects.filter(id=copy_id).update(is_held=False, updated_at=now)
+    if not requeued:
+        return
+    Book.objects.filter(id=book_id).update(hold_count=F('hold_count') + 1)
+    available = list(Copy.objects.filter(
+        book_id=book_id, is_borrowed=False, is_held=False, status='AVAILABLE',
+    ).exclude(id=copy_id).order_by('id').values_list('id', flat=True)[:1])
+    allocate({book_id: available}, now)
+
+
+def sweep(now=None, batch_size=DEFAULT_BATCH_SIZE, max_seconds=None):
+    """
+    將過期的預約標記為 EXPIRED，回傳 SweepResult。依 (期限, id) 順序分批處理，與部分索引
+    hold_expiry_idx 的順序一致；每批一個短交易，釋出的複本在同一個交易中分配給下一位。
+    max_seconds 為時間預算，用完後在批次之間停止 (finished 為 False，下次執行會接續)。
+    """
+    now = now or timezone.now()
+    started = time.monotonic()
+    result = SweepResult()
+    while True:
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            return result
+        try:
+            with transaction.atomic():
+                # 處理過的預約不再符合條件，每批都從索引起點開始即可
+                holds = list(Hold.objects.filter(status__in=Hold.ACTIVE_STATUSES, expires_at__lt=now)
+                             .order_by('expires_at', 'id').only('id', 'book_id', 'status', 'copy_id')[:batch_size])
+                if not holds:
+                    result.finished = True
+                    return result
+                _close(holds, 'EXPIRED', now)
+        except HoldError:
+            # 讀取後有預約被借出或取消，重新讀取這一批
+            continue
+        result.expired += len(holds)
+        result.batches += 1
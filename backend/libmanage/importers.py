@@ -0,0 +1,221 @@
+"""
+書籍批次匯入。
+
+支援三種輸入格式，皆以逐行讀取的方式處理，不會一次載入整個檔案：
+
+- csv：第一列為欄位名稱 (title, author, isbn, category, status, copies)
+- ndjson：每行一個 JSON 物件，欄位同上
+- marc：簡化的 MARC 文字格式，每筆紀錄以空行分隔，每行為「欄位碼 內容」，
+  例如 ``245 三體``。亦接受 MarcEdit 助記格式 ``=245  10$a三體``，取 $a 子欄位。
+  使用的欄位碼：020 ISBN、100 作者、245 書名、900 分類、901 狀態、902 冊數 (後三者為館內自訂欄位)。
+
+copies 為館藏冊數，未填時為 1，複本使用預設條碼。
+每批資料先驗證、以一次 ``isbn_normalized__in`` 查詢排除資料庫中已存在的 ISBN，
+再於同一個交易中 ``bulk_create`` 書籍與複本。單筆資料錯誤只記錄在結果中，不會中斷整個匯入。
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+
+from .models import Book, CatalogVersion, Copy, normalize_isbn
+from . import inventory, search
+
+FORMATS = ('csv', 'ndjson', 'marc')
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+MARC_TAGS = {
+    '020': 'isbn',
+    '100': 'author',
+    '245': 'title',
+    '900': 'category',
+    '901': 'status',
+    '902': 'copies',
+}
+
+_CATEGORY_CODES = {code: code for code, _ in Book.CATEGORY_CHOICES}
+_CATEGORY_CODES.update({label: code for code, label in Book.CATEGORY_CHOICES})
+_STATUS_CODES = {code: code for code, _ in Book.STATUS_CHOICES}
+_STATUS_CODES.update({label: code for code, label in Book.STATUS_CHOICES})
+_MAX_LENGTHS = {name: Book._meta.get_field(name).max_length for name in ('title', 'author', 'isbn')}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    duplicates: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+
+# 讀取器：逐筆產生 (行號, 欄位 dict)
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(lines):
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        if not isinstance(row, dict):
+            yield line_no, ValueError('無效的 JSON 資料列')
+            continue
+        yield line_no, row
+
+
+def _marc_value(name, body):
+    if '$a' in body:
+        body = body.split('$a', 1)[1].split('$', 1)[0]
+    body = body.strip()
+    if name == 'isbn':
+        # 020 常帶有裝訂說明，例如「9787536692930 (平裝)」
+        return body.split(' ', 1)[0] if body else body
+    # 去除 ISBD 標點
+    return body.rstrip(' /:;,.')
+
+
+def read_marc(lines):
+    record, start = {}, None
+    for line_no, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            if record:
+                yield start, record
+            record, start = {}, None
+            continue
+        line = line.lstrip('=')
+        tag, body = line[:3], line[3:]
+        if tag in MARC_TAGS:
+            if start is None:
+                start = line_no
+            name = MARC_TAGS[tag]
+            record.setdefault(name, _marc_value(name, body))
+    if record:
+        yield start, record
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson, 'marc': read_marc}
+
+
+def clean_row(row):
+    """驗證並整理單筆資料，回傳可建立 Book 的欄位 dict 與冊數 (copies)；資料有誤時拋出 ValueError。"""
+    if isinstance(row, Exception):
+        raise row
+    data = {name: str(row.get(name) or '').strip() for name in ('title', 'author', 'isbn', 'category', 'status')}
+    if not data['title'] or not data['author'] or not data['isbn']:
+        raise ValueError('缺少必填欄位 (書名、作者、ISBN)')
+    for name, max_length in _MAX_LENGTHS.items():
+        if len(data[name]) > max_length:
+            raise ValueError(f'{name} 長度超過 {max_length} 個字元')
+    category = _CATEGORY_CODES.get(data['category'] or 'OTHER')
+    if category is None:
+        raise ValueError(f'無效的書籍分類：{data["category"]}')
+    status = _STATUS_CODES.get(data['status'] or 'AVAILABLE')
+    if status is None:
+        raise ValueError(f'無效的書籍狀態：{data["status"]}')
+    try:
+        copies = int(str(row.get('copies') or '1').strip())
+    except ValueError:
+        copies = -1
+    if not 0 <= copies <= inventory.MAX_NEW_COPIES:
+        raise ValueError(f'冊數必須為 0 到 {inventory.MAX_NEW_COPIES} 的整數')
+    data['category'] = category
+    data['status'] = status
+    data['copies'] = copies
+    return data
+
+
+def import_books(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    匯入 (行號, 欄位 dict) 序列，回傳 ImportResult。
+    每批最多 batch_size 筆，各自在一個交易中寫入。
+    """
+    result = ImportResult()
+    batch = []
+    for line_no, row in rows:
+        batch.append((line_no, row))
+        if len(batch) >= batch_size:
+            _import_batch(batch, result)
+            batch = []
+    if batch:
+        _import_batch(batch, result)
+    return result
+
+
+def _import_batch(batch, result):
+    pending = {}
+    for line_no, row in batch:
+        try:
+            data = clean_row(row)
+        except ValueError as e:
+            result.add_error(line_no, str(e))
+            continue
+        key = normalize_isbn(data['isbn'])
+        if key in pending:
+            result.duplicates += 1
+            continue
+        pending[key] = (line_no, data)
+
+    if not pending:
+        return
+
+    # 一次查詢排除資料庫中已存在的 ISBN
+    for isbn in Book.objects.filter(isbn_normalized__in=list(pending)).values_list('isbn_normalized', flat=True):
+        if pending.pop(isbn, None) is not None:
+            result.duplicates += 1
+
+    # bulk_create 不會呼叫 save()，需自行填入標準化 ISBN 與冊數
+    books = [
+        Book(isbn_normalized=key, total_count=data['copies'], available_count=data['copies'], **_book_fields(data))
+        for key, (_, data) in pending.items()
+    ]
+    if not books:
+        return
+    try:
+        with transaction.atomic():
+            version = CatalogVersion.bump()
+            for book in books:
+                book.catalog_version = version
+            created = Book.objects.bulk_create(books)
+            Copy.objects.bulk_create([
+                Copy(book_id=book.id, barcode=inventory.default_barcode(book.id, number))
+                for book in created for number in range(1, book.total_count + 1)
+            ])
+            search.index_books(created)
+        result.created += len(created)
+    except IntegrityError:
+        # 批次中有資料違反限制 (例如同時有其他匯入)，改為逐筆寫入以找出問題資料
+        for line_no, data in pending.values():
+            try:
+                with transaction.atomic():
+                    book = Book.objects.create(**_book_fields(data))
+                    inventory.add_copies(book.id, data['copies'])
+                    search.index_book(book)
+                result.created += 1
+            except IntegrityError as e:
+                result.add_error(line_no, f'寫入失敗：{e}')
+
+
+def _book_fields(data):
+    return {name: value for name, value in data.items() if name != 'copies'}
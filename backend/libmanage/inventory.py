@@ -0,0 +1,123 @@
+"""
+館藏複本與冊數統計。
+
+Book.total_count / available_count 是由 Copy 推導的計數，列表與借閱只讀這兩個欄位。
+所有改變複本的寫入 (新增複本、變更複本狀態、借出、歸還) 都在同一個交易中以
+``F('available_count') + n`` 的 UPDATE 調整計數，並先寫入 Book 再寫入 Copy，
+同一本書的寫入因此依 Book 資料列的鎖排序。新增或恢復可借的複本會先分配給預約隊列 (holds.allocate)。
+計數若因直接修改資料庫而不一致，可用 ``manage.py recount_copies`` (recount) 由複本與預約重新計算。
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching, holds
+from .models import Book, CatalogVersion, Copy, Hold
+
+# 單次新增的複本數上限
+MAX_NEW_COPIES = 500
+
+
+class InventoryError(Exception):
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def default_barcode(book_id, number):
+    """未指定條碼時的預設條碼：書籍 id 與該書的第幾冊。"""
+    return f'{book_id}-{number}'
+
+
+def add_copies(book_id, count=1, barcodes=None):
+    """
+    為書籍新增複本並增加冊數，回傳新建立的 Copy 串列。
+    barcodes 為條碼串列 (此時忽略 count)；未指定時依序產生預設條碼。
+    條碼重複時拋出 IntegrityError。
+    """
+    if barcodes is not None:
+        count = len(barcodes)
+    if count < 0 or count > MAX_NEW_COPIES:
+        raise InventoryError(f'一次最多新增 {MAX_NEW_COPIES} 冊', status=400)
+    if not count:
+        return []
+    with transaction.atomic():
+        # 鎖住書籍資料列，預設條碼的冊次才不會與同時新增的複本重複
+        total = Book.objects.select_for_update().filter(id=book_id).values_list('total_count', flat=True).first()
+        if total is None:
+            raise InventoryError('書籍不存在', status=404)
+        if barcodes is None:
+            barcodes = [default_barcode(book_id, total + i) for i in range(1, count + 1)]
+        now = timezone.now()
+        copies = Copy.objects.bulk_create([Copy(book_id=book_id, barcode=barcode) for barcode in barcodes])
+        Book.objects.filter(id=book_id).update(
+            total_count=F('total_count') + count,
+            available_count=F('available_count') + count,
+            updated_at=now,
+            catalog_version=CatalogVersion.bump(),
+        )
+        holds.allocate({book_id: [copy.id for copy in copies]}, now)
+        caching.invalidate_book(book_id)
+    return copies
+
+
+def set_copy_status(barcode, status):
+    """
+    變更複本狀態 (例如損壞、維修、遺失)，並依複本是否因此變為可借或不可借調整可借冊數。
+    保留給預約的複本不再可借時，該預約放回隊列；複本恢復可借時先分配給預約隊列。
+    """
+    book_id = Copy.objects.filter(barcode=barcode).values_list('book_id', flat=True).first()
+    if book_id is None:
+        raise InventoryError('複本不存在', status=404)
+    now = timezone.now()
+    with transaction.atomic():
+        # 與借還相同，先鎖書籍再鎖複本
+        Book.objects.select_for_update().filter(id=book_id).values_list('id', flat=True).first()
+        copy = Copy.objects.select_for_update().get(barcode=barcode)
+        was_available = copy.is_available
+        copy.status = status
+        Copy.objects.filter(id=copy.id).update(status=status, updated_at=now)
+        delta = int(copy.is_available) - int(was_available)
+        Book.objects.filter(id=book_id).update(
+            available_count=F('available_count') + delta,
+            updated_at=now,
+            catalog_version=CatalogVersion.bump(),
+        )
+        if copy.is_held and status != 'AVAILABLE':
+            holds.requeue(book_id, copy.id, now)
+            copy.is_held = False
+        elif delta > 0:
+            holds.allocate({book_id: [copy.id]}, now)
+        caching.invalidate_book(book_id)
+    return copy
+
+
+def _count(model, condition=Q()):
+    counts = (model.objects.filter(condition, book=OuterRef('pk')).order_by()
+              .values('book').annotate(n=Count('id')).values('n'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def recount(book_ids=None):
+    """由複本與預約重新計算冊數、可借冊數與預約人數，回傳計數有誤而被修正的書籍數。"""
+    books = Book.objects.all() if book_ids is None else Book.objects.filter(id__in=book_ids)
+    with transaction.atomic():
+        books = books.annotate(
+            actual_total=_count(Copy),
+            actual_available=_count(Copy, Q(is_borrowed=False, is_held=False, status='AVAILABLE')),
+            actual_holds=_count(Hold, Q(status='WAITING')),
+        ).exclude(total_count=F('actual_total'), available_count=F('actual_available'), hold_count=F('actual_holds'))
+        fixed = list(books.values_list('id', 'actual_total', 'actual_available', 'actual_holds'))
+        if not fixed:
+            return 0
+        version = CatalogVersion.bump()
+        now = timezone.now()
+        for book_id, total, available, waiting in fixed:
+            Book.objects.filter(id=book_id).update(
+                total_count=total, available_count=available, hold_count=waiting, updated_at=now,
+                catalog_version=version,
+            )
+        caching.invalidate_books([book_id for book_id, *_ in fixed])
+    return len(fixed)
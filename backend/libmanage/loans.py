@@ -0,0 +1,329 @@
+"""
+借閱與歸還的狀態轉換。
+
+所有狀態變更都在 transaction.atomic 中以條件式 UPDATE 完成
+(``UPDATE ... WHERE available_count > 0`` / ``WHERE returned = false``)，
+只有一個請求能成功改變同一本書或同一筆紀錄的狀態，不需依賴 SELECT FOR UPDATE
+(SQLite 不支援)。借出先扣書籍的可借冊數 (同時鎖住書籍資料列)，再標記該書第一本可借的複本；
+歸還時將複本標記為未借出，複本狀態仍可借閱時加回可借冊數，並在同一個交易中分配給
+預約隊列的下一位 (見 holds.allocate)；讀者借出為其保留的複本時不經過可借冊數。
+資料庫另有「每個複本最多一筆」與「每位用戶每本書最多一筆」未歸還借閱的部分唯一限制作為最後防線。
+
+批次借還 (borrow_books / return_books) 在單一交易中以固定數量的查詢處理整批書籍：
+一次讀取、一次 ``UPDATE ... WHERE id IN (...)``、一次 bulk_create，預設全部成功才寫入。
+"""
+from collections import defaultdict
+from datetime import timedelta
+from operator import attrgetter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Min, Value, When
+from django.utils import timezone
+
+from . import caching, holds, stats
+from .models import Book, BorrowRecord, CatalogVersion, Copy, Hold, counter_delta
+
+LOAN_PERIOD = timedelta(days=60)
+# 歸還時不會被改回「可借閱」的複本狀態
+KEEP_STATUS_ON_RETURN = ['DAMAGED', 'LOST']
+# 單次批次借還的項目上限
+MAX_BULK_ITEMS = 100
+
+
+class LoanError(Exception):
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def borrow_book(user_id, book_id):
+    """
+    借出一本書，回傳新建立的 BorrowRecord；無法借閱時拋出 LoanError。
+    讀者有可取書的預約時借出為其保留的複本，否則借出任一可借的複本 (並結束其等候中的預約)。
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            hold = _active_holds(user_id, [book_id]).get(book_id)
+            if hold is not None and hold.status == 'READY':
+                claimed = Book.objects.filter(id=book_id, status='AVAILABLE').update(
+                    updated_at=now, catalog_version=CatalogVersion.bump(),
+                )
+                if not claimed:
+                    raise _borrow_failure(user_id, book_id)
+                copy_ids = _claim_held([hold], now)
+            else:
+                claimed = Book.objects.filter(id=book_id, status='AVAILABLE', available_count__gt=0).update(
+                    available_count=F('available_count') - 1, updated_at=now, catalog_version=CatalogVersion.bump(),
+                    **({'hold_count': F('hold_count') - 1} if hold is not None else {}),
+                )
+                if not claimed:
+                    raise _borrow_failure(user_id, book_id)
+                copy_ids = _claim_copies([book_id], now)
+                if hold is not None:
+                    _fulfill_waiting([hold], now)
+            record = BorrowRecord.objects.create(
+                user_id=user_id,
+                book_id=book_id,
+                copy_id=copy_ids[book_id],
+                category=Book.objects.filter(id=book_id).values_list('category', flat=True).get(),
+                due_date=(now + LOAN_PERIOD).date(),
+            )
+            stats.record_loans([record])
+            caching.invalidate_user_home(user_id)
+            caching.invalidate_book(book_id)
+            return record
+    except IntegrityError:
+        # 已借閱同一本書，或複本狀態與借閱紀錄不一致時由唯一限制擋下
+        raise _borrow_failure(user_id, book_id, borrowed=True)
+
+
+def _claim_copies(book_ids, now):
+    """
+    為每本書標記一本可借的複本為借出，回傳 {book_id: copy_id}。
+    呼叫前須已在同一個交易中扣除這些書的可借冊數 (持有書籍資料列的鎖)。
+    """
+    available = Copy.objects.filter(is_borrowed=False, is_held=False, status='AVAILABLE')
+    copy_ids = dict(
+        available.filter(book_id__in=book_ids).order_by()
+        .values('book_id').annotate(copy_id=Min('id')).values_list('book_id', 'copy_id')
+    )
+    claimed = available.filter(id__in=copy_ids.values()).update(is_borrowed=True, updated_at=now) if copy_ids else 0
+    if len(copy_ids) != len(book_ids) or claimed != len(book_ids):
+        # 可借冊數與複本不一致 (可用 recount_copies 修正)
+        raise LoanError('館藏複本狀態已變更，請重新操作')
+    return copy_ids
+
+
+def _active_holds(user_id, book_ids):
+    """用戶對這些書的有效預約 {book_id: Hold}，以唯一部分索引 one_active_hold_per_user_book 查詢。"""
+    return {hold.book_id: hold for hold in Hold.objects.filter(
+        user_id=user_id, book_id__in=book_ids, status__in=Hold.ACTIVE_STATUSES,
+    ).only('id', 'book_id', 'status', 'copy_id')}
+
+
+def _claim_held(ready, now):
+    """借出為讀者保留的複本，預約轉為 FULFILLED，回傳 {book_id: copy_id}。呼叫前須已寫入這些書籍。"""
+    fulfilled = Hold.objects.filter(id__in=[hold.id for hold in ready], status='READY').update(
+        status='FULFILLED', updated_at=now,
+    )
+    claimed = Copy.objects.filter(id__in=[hold.copy_id for hold in ready], is_held=True, is_borrowed=False).update(
+        is_held=False, is_borrowed=True, updated_at=now,
+    )
+    if fulfilled != len(ready) or claimed != len(ready):
+        raise LoanError('預約狀態已變更，請重新操作')
+    return {hold.book_id: hold.copy_id for hold in ready}
+
+
+def _fulfill_waiting(waiting, now):
+    """讀者直接借到可借的複本時結束其等候中的預約 (預約人數已由呼叫端扣除)。"""
+    fulfilled = Hold.objects.filter(id__in=[hold.id for hold in waiting], status='WAITING').update(
+        status='FULFILLED', updated_at=now,
+    )
+    if fulfilled != len(waiting):
+        raise LoanError('預約狀態已變更，請重新操作')
+
+
+def _borrow_failure(user_id, book_id, borrowed=False):
+    book = Book.objects.filter(id=book_id).first()
+    if book is None:
+        return LoanError('書籍不存在', status=404)
+    if borrowed and BorrowRecord.objects.filter(user_id=user_id, book_id=book_id, returned=False).exists():
+        return LoanError('您已借閱此書且尚未歸還')
+    if borrowed:
+        return LoanError('此書已被借出')
+    return _unavailable(book)
+
+
+def _unavailable(book):
+    if book.status != 'AVAILABLE':
+        return LoanError(f'此書狀態為 "{book.get_status_display()}"，無法借閱。')
+    if not book.total_count:
+        return LoanError('此書尚無館藏複本')
+    return LoanError('此書已被借出')
+
+
+def _restored_copies(closing):
+    """歸還後重新變為可借的複本 {book_id: [copy_id, ...]} (損壞或遺失的複本不計)。"""
+    restored = defaultdict(list)
+    for record in closing:
+        if record.copy.status not in KEEP_STATUS_ON_RETURN:
+            restored[record.book_id].append(record.copy_id)
+    return restored
+
+
+def _unique(ids):
+    return list(dict.fromkeys(ids))
+
+
+def borrow_books(user_id, book_ids, partial=False):
+    """
+    一次借出多本書 (每本書一冊，有可取書的預約時借出保留的複本)，回傳 (results, committed)。
+    results 依輸入順序為 (book_id, BorrowRecord 或 LoanError)；預設任一本無法借閱時整批不寫入
+    (committed 為 False，可借的項目回傳未儲存的 BorrowRecord)，partial=True 時只借出可借的書。
+    """
+    book_ids = _unique(book_ids)
+    now = timezone.now()
+    due_date = (now + LOAN_PERIOD).date()
+    try:
+        with transaction.atomic():
+            books = Book.objects.select_for_update().only(
+                'id', 'status', 'category', 'total_count', 'available_count',
+            ).in_bulk(book_ids)
+            active = _active_holds(user_id, book_ids)
+            ready = {book_id: hold for book_id, hold in active.items() if hold.status == 'READY'}
+            # 已借閱且未歸還的書逐項回報，不讓整批在唯一限制上失敗
+            borrowed = set(BorrowRecord.objects.filter(
+                user_id=user_id, book_id__in=book_ids, returned=False,
+            ).values_list('book_id', flat=True))
+            results = []
+            for book_id in book_ids:
+                book = books.get(book_id)
+                if book is None:
+                    results.append((book_id, LoanError('書籍不存在', status=404)))
+                elif book_id in borrowed:
+                    results.append((book_id, LoanError('您已借閱此書且尚未歸還')))
+                elif book.status != 'AVAILABLE' or not (book.available_count or book_id in ready):
+                    results.append((book_id, _unavailable(book)))
+                else:
+                    results.append((book_id, BorrowRecord(
+                        user_id=user_id, book_id=book_id, category=book.category, due_date=due_date,
+                    )))
+            claim = [book_id for book_id, result in results if isinstance(result, BorrowRecord)]
+            if not claim or (len(claim) < len(results) and not partial):
+                return results, False
+
+            version = CatalogVersion.bump()
+            held = [book_id for book_id in claim if book_id in ready]
+            free = [book_id for book_id in claim if book_id not in ready]
+            waiting = [active[book_id] for book_id in free if book_id in active]
+            claimed = 0
+            if held:
+                claimed += Book.objects.filter(id__in=held, status='AVAILABLE').update(
+                    updated_at=now, catalog_version=version,
+                )
+            if free:
+                claimed += Book.objects.filter(id__in=free, status='AVAILABLE', available_count__gt=0).update(
+                    available_count=F('available_count') - 1, updated_at=now, catalog_version=version,
+                    **({'hold_count': counter_delta('hold_count', {h.book_id: -1 for h in waiting})} if waiting else {}),
+                )
+            if claimed != len(claim):
+                # 讀取後有其他交易借出了其中的書籍 (未支援資料列鎖定的 SQLite)
+                raise LoanError('部分書籍狀態已變更，請重新操作')
+            copy_ids = _claim_held([ready[book_id] for book_id in held], now) if held else {}
+            if free:
+                copy_ids.update(_claim_copies(free, now))
+            if waiting:
+                _fulfill_waiting(waiting, now)
+            pending = [result for _, result in results if isinstance(result, BorrowRecord)]
+            for record in pending:
+                record.copy_id = copy_ids[record.book_id]
+            records = BorrowRecord.objects.bulk_create(pending)
+            stats.record_loans(records)
+            caching.invalidate_user_home(user_id)
+            caching.invalidate_books(claim)
+            return results, True
+    except IntegrityError:
+        raise LoanError('部分書籍已被借出或您已借閱，請重新操作')
+
+
+def return_books(record_ids=None, book_ids=None, barcodes=None, user_id=None, partial=False):
+    """
+    一次歸還多筆借閱，依 record_ids、barcodes (複本條碼) 或 book_ids (該書目前未歸還的借閱) 指定，
+    回傳 (results, committed)。同一本書有多冊借出時 book_ids 無法判斷是哪一筆，該項回傳 409，
+    需改以條碼或借閱紀錄指定。results 依輸入順序為 (輸入值, BorrowRecord 或 LoanError)；
+    全部成功才寫入的規則同 borrow_books。
+    """
+    if record_ids is not None:
+        keys = _unique(record_ids)
+        records = BorrowRecord.objects.select_for_update().filter(id__in=keys)
+        key_of = attrgetter('id')
+        missing = '借閱紀錄不存在'
+    elif barcodes is not None:
+        keys = _unique(barcodes)
+        records = BorrowRecord.objects.select_for_update().filter(copy__barcode__in=keys, returned=False)
+        key_of = attrgetter('copy.barcode')
+        missing = '未找到此條碼的未歸還記錄'
+    else:
+        keys = _unique(book_ids)
+        records = BorrowRecord.objects.select_for_update().filter(book_id__in=keys, returned=False)
+        key_of = attrgetter('book_id')
+        missing = '未找到此書籍的未歸還記錄'
+    if user_id is not None:
+        records = records.filter(user_id=user_id)
+    now = timezone.now()
+    with transaction.atomic():
+        by_key = defaultdict(list)
+        for record in records.select_related('copy').only(
+            'id', 'user_id', 'book_id', 'copy_id', 'category', 'returned', 'copy__status', 'copy__barcode',
+        ):
+            by_key[key_of(record)].append(record)
+        results = []
+        for key in keys:
+            matched = by_key.get(key, [])
+            if not matched:
+                results.append((key, LoanError(missing, status=404)))
+            elif len(matched) > 1:
+                results.append((key, LoanError('此書有多冊借出，請以條碼或借閱紀錄指定歸還')))
+            elif matched[0].returned:
+                results.append((key, LoanError('此書已歸還')))
+            else:
+                results.append((key, matched[0]))
+        closing = [result for _, result in results if isinstance(result, BorrowRecord)]
+        if not closing or (len(closing) < len(results) and not partial):
+            return results, False
+
+        closed = BorrowRecord.objects.filter(id__in=[r.id for r in closing], returned=False).update(
+            returned=True, return_date=now.date(), updated_at=now,
+        )
+        if closed != len(closing):
+            raise LoanError('部分借閱紀錄已被歸還，請重新操作')
+        book_ids = _unique(record.book_id for record in closing)
+        restored = _restored_copies(closing)
+        Book.objects.filter(id__in=book_ids).update(
+            available_count=counter_delta('available_count', {k: len(v) for k, v in restored.items()}),
+            updated_at=now,
+            catalog_version=CatalogVersion.bump(),
+        )
+        Copy.objects.filter(id__in=[record.copy_id for record in closing]).update(
+            is_borrowed=False,
+            status=Case(When(status__in=KEEP_STATUS_ON_RETURN, then=F('status')), default=Value('AVAILABLE')),
+            updated_at=now,
+        )
+        holds.allocate(restored, now)
+        for record in closing:
+            record.returned = True
+            record.return_date = now.date()
+        stats.record_returns(closing)
+        for user in {record.user_id for record in closing}:
+            caching.invalidate_user_home(user)
+        caching.invalidate_books(book_ids)
+    return results, True
+
+
+def return_record(record):
+    """歸還一筆借閱紀錄；紀錄已被歸還 (包含同時有其他請求歸還) 時拋出 LoanError。"""
+    now = timezone.now()
+    with transaction.atomic():
+        closed = BorrowRecord.objects.filter(id=record.id, returned=False).update(
+            returned=True, return_date=now.date(), updated_at=now,
+        )
+        if not closed:
+            raise LoanError('此書已歸還')
+        # 先鎖住書籍再改複本 (與借出相同的順序)；複本歸還後設為 AVAILABLE，除非原本是損壞或遺失
+        Book.objects.filter(id=record.book_id).update(updated_at=now, catalog_version=CatalogVersion.bump())
+        restored = Copy.objects.filter(id=record.copy_id).exclude(status__in=KEEP_STATUS_ON_RETURN).update(
+            is_borrowed=False, status='AVAILABLE', updated_at=now,
+        )
+        if restored:
+            Book.objects.filter(id=record.book_id).update(available_count=F('available_count') + 1)
+            holds.allocate({record.book_id: [record.copy_id]}, now)
+        else:
+            Copy.objects.filter(id=record.copy_id).update(is_borrowed=False, updated_at=now)
+        record.returned = True
+        record.return_date = now.date()
+        stats.record_returns([record])
+        caching.invalidate_user_home(record.user_id)
+        caching.invalidate_book(record.book_id)
+    return record
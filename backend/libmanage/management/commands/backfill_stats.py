@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from libmanage import stats
+
+
+class Command(BaseCommand):
+    help = '以借閱紀錄重建每日借還統計 (依借閱當時的分類) 與書籍借出次數彙總表'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批寫入的彙總筆數')
+
+    def handle(self, *args, **options):
+        days, books = stats.backfill(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重建統計，共 {days} 筆每日分類彙總、{books} 本書籍。'))
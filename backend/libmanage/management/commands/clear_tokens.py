@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from libmanage import tokens
+
+
+class Command(BaseCommand):
+    help = '刪除已過期的登入權杖記錄 (可定期執行)'
+
+    def handle(self, *args, **options):
+        deleted = tokens.clear_expired()
+        self.stdout.write(self.style.SUCCESS(f'已刪除 {deleted} 筆過期的權杖記錄。'))
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from libmanage import importers
+
+EXTENSION_FORMATS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.mrk': 'marc',
+    '.marc': 'marc',
+    '.txt': 'marc',
+}
+
+
+class Command(BaseCommand):
+    help = '自 CSV、NDJSON 或 MARC 文字檔批次匯入書籍'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='匯入檔案路徑')
+        parser.add_argument('--format', choices=importers.FORMATS, help='檔案格式，預設依副檔名判斷')
+        parser.add_argument('--batch-size', type=int, default=importers.DEFAULT_BATCH_SIZE,
+                            help='每個交易寫入的書籍數量')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        import_format = options['format'] or EXTENSION_FORMATS.get(path.suffix.lower())
+        if import_format is None:
+            raise CommandError('無法由副檔名判斷格式，請使用 --format 指定')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必須為正整數')
+
+        with path.open(encoding='utf-8-sig', newline='') as f:
+            result = importers.import_books(importers.READERS[import_format](f), batch_size=options['batch_size'])
+
+        for error in result.errors:
+            self.stderr.write(f'第 {error["line"]} 行：{error["message"]}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... 另有 {result.error_count - len(result.errors)} 筆錯誤未列出')
+        self.stdout.write(self.style.SUCCESS(
+            f'匯入完成：新增 {result.created} 本，重複 {result.duplicates} 本，錯誤 {result.error_count} 筆。'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from libmanage import search
+
+
+class Command(BaseCommand):
+    help = '以 Book 資料表重建書籍全文檢索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='每批寫入索引的書籍數量')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            self.stdout.write(self.style.WARNING('目前的資料庫後端不支援 FTS5，搜尋將使用一般查詢。'))
+            return
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重建索引，共 {total} 本書籍。'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from libmanage import inventory
+
+
+class Command(BaseCommand):
+    help = '由館藏複本與預約重新計算書籍的冊數、可借冊數與預約人數'
+
+    def add_arguments(self, parser):
+        parser.add_argument('book_ids', nargs='*', type=int, help='只重新計算指定的書籍 id')
+
+    def handle(self, *args, **options):
+        fixed = inventory.recount(options['book_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'已重新計算冊數，修正 {fixed} 本書籍。'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from libmanage import holds
+
+
+class Command(BaseCommand):
+    help = '將過期的預約標記為已逾期，保留的複本分配給下一位 (可重複執行，中斷後再次執行會接續處理)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=holds.DEFAULT_BATCH_SIZE, help='每個交易處理的預約筆數')
+        parser.add_argument('--max-seconds', type=float, help='時間預算 (秒)，用完後於批次之間停止')
+
+    def handle(self, *args, **options):
+        result = holds.sweep(batch_size=options['batch_size'], max_seconds=options['max_seconds'])
+        message = f'已將 {result.expired} 筆預約標記為逾期 ({result.batches} 批)。'
+        if result.finished:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(message + '時間預算已用完，請再次執行以繼續處理。'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from libmanage import overdue
+
+
+class Command(BaseCommand):
+    help = '為逾期未還的借閱建立逾期通知 (可重複執行，中斷後再次執行會接續處理)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=overdue.DEFAULT_BATCH_SIZE, help='每個交易處理的借閱筆數')
+        parser.add_argument('--max-seconds', type=float, help='時間預算 (秒)，用完後於批次之間停止')
+        parser.add_argument('--pause', type=float, default=0, help='每批之間的休息秒數，讓出資料庫寫入鎖')
+        parser.add_argument('--outbox', help='將新通知以 NDJSON 附加寫入此檔案，並標記為已寄送')
+
+    def handle(self, *args, **options):
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'max_seconds': options['max_seconds'],
+            'pause': options['pause'],
+        }
+        if options['outbox']:
+            with open(options['outbox'], 'a', encoding='utf-8') as outbox:
+                result = overdue.sweep(outbox=outbox, **kwargs)
+        else:
+            result = overdue.sweep(**kwargs)
+
+        message = f'已建立 {result.created} 筆逾期通知 ({result.batches} 批)。'
+        if result.finished:
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(message + '時間預算已用完，請再次執行以繼續處理。'))
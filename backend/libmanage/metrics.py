@@ -0,0 +1,156 @@
+"""
+請求層級的效能統計。
+
+RequestMetricsMiddleware 為每個請求記錄總耗時、資料庫耗時、查詢數與回應大小，
+依解析後的 URL 名稱 (未命名時為路由樣式) 彙總成直方圖，並以 Prometheus 文字格式由
+/api/_metrics 輸出。查詢耗時由安裝在每條資料庫連線上的 execute wrapper 量測，
+以 contextvar 對應到目前的請求，因此 async views 經由 sync_to_async 執行的查詢也會被計入。
+
+統計資料保存在各工作行程的記憶體中，多個 gunicorn 工作行程時每次抓取只會看到其中一個行程；
+行程重啟後歸零 (Prometheus 的 rate() 可正確處理計數器歸零)。
+"""
+import contextvars
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('libmanage.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+HISTOGRAMS = {
+    'libmanage_request_duration_seconds': ('請求總耗時 (秒)', DURATION_BUCKETS),
+    'libmanage_request_db_seconds': ('請求中資料庫查詢的總耗時 (秒)', DURATION_BUCKETS),
+    'libmanage_request_queries': ('每個請求的 SQL 查詢數', QUERY_BUCKETS),
+    'libmanage_response_bytes': ('回應本文大小 (位元組，串流回應不計)', SIZE_BUCKETS),
+}
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    endpoint: str = ''
+
+
+_current = contextvars.ContextVar('libmanage_request_stats', default=None)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current_request():
+    return _current.get()
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        threshold = getattr(settings, 'METRICS_SLOW_QUERY_MS', None)
+        if threshold is not None and elapsed * 1000 >= threshold:
+            logger.warning('slow query (%.1f ms) in %s: %s', elapsed * 1000, stats.endpoint or '-', sql[:2000])
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+connection_created.connect(_install_wrapper, dispatch_uid='libmanage.metrics')
+
+
+class Registry:
+    """以 (指標名稱, 標籤) 彙總直方圖與計數器，執行緒安全。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self._requests = {}
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        with self._lock:
+            series = self._histograms.setdefault((name, labels), [[0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count_request(self, labels):
+        with self._lock:
+            self._requests[labels] = self._requests.get(labels, 0) + 1
+
+    def render(self):
+        """輸出 Prometheus text exposition format (0.0.4)。"""
+        with self._lock:
+            histograms = {key: (list(counts), total, n) for key, (counts, total, n) in self._histograms.items()}
+            requests = dict(self._requests)
+
+        lines = [
+            '# HELP libmanage_requests_total 依端點、方法與狀態碼統計的請求數',
+            '# TYPE libmanage_requests_total counter',
+        ]
+        for labels, n in sorted(requests.items()):
+            lines.append(f'libmanage_requests_total{{{_labels(labels)}}} {n}')
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (series_name, labels), (counts, total, n) in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                base = _labels(labels)
+                for bound, count in zip(buckets, counts):
+                    lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{base},le="+Inf"}} {n}')
+                lines.append(f'{name}_sum{{{base}}} {total:.6f}')
+                lines.append(f'{name}_count{{{base}}} {n}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    return ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels)
+
+
+registry = Registry()
+
+
+def record(stats, method, status, duration, size):
+    endpoint = (('endpoint', stats.endpoint),)
+    registry.count_request((('endpoint', stats.endpoint), ('method', method), ('status', str(status))))
+    registry.observe('libmanage_request_duration_seconds', endpoint + (('method', method),), duration)
+    registry.observe('libmanage_request_db_seconds', endpoint, stats.db_seconds)
+    registry.observe('libmanage_request_queries', endpoint, stats.queries)
+    if size is not None:
+        registry.observe('libmanage_response_bytes', endpoint, size)
+
+
+def server_timing(stats, duration):
+    return (
+        f'total;dur={duration * 1000:.1f}, '
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+    )
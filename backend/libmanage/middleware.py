@@ -0,0 +1,159 @@
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.urls import Resolver404, get_resolver
+
+from . import metrics, ratelimit
+
+
+class RequestMetricsMiddleware:
+    """
+    記錄每個請求的總耗時、資料庫耗時、查詢數與回應大小 (見 libmanage.metrics)，
+    並加上 Server-Timing 標頭，瀏覽器開發者工具的 Timing 分頁可直接顯示。
+    同時支援同步與 async views，放在 MIDDLEWARE 的最前面以涵蓋其他 middleware 的耗時。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        return self._finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(token)
+        return self._finish(request, response, stats, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # 在 view 執行前標記端點，慢查詢紀錄才能對應到端點
+        stats = metrics.current_request()
+        if stats is not None:
+            stats.endpoint = endpoint_name(request)
+
+    def _finish(self, request, response, stats, started):
+        duration = time.perf_counter() - started
+        stats.endpoint = endpoint_name(request)
+        size = None if response.streaming else len(response.content)
+        metrics.record(stats, request.method, response.status_code, duration, size)
+        response['Server-Timing'] = metrics.server_timing(stats, duration)
+        return response
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route
+
+
+class RateLimitMiddleware:
+    """
+    依 URL 名稱套用限流 (settings.RATE_LIMITS，超過時回傳 429) 與同時處理數上限
+    (settings.CONCURRENCY_LIMITS，超過時回傳 503)，見 libmanage.ratelimit。
+    在 view 執行前判斷，被拒絕的請求不查詢資料庫。同時支援同步與 async views，
+    自行解析 URL，不使用 process_view，ASGI 下不需要額外切換到同步執行緒。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.RATE_LIMIT_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rules = ratelimit.parse_rules(settings.RATE_LIMITS)
+        self.slots = {name: threading.BoundedSemaphore(limit) for name, limit in settings.CONCURRENCY_LIMITS.items()}
+        self.buckets = ratelimit.get_buckets()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        rejected, slot = self._admit(request)
+        if rejected is not None:
+            return rejected
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self._release(slot)
+            raise
+        return self._finish(response, slot)
+
+    async def __acall__(self, request):
+        rejected, slot = self._admit(request)
+        if rejected is not None:
+            return rejected
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self._release(slot)
+            raise
+        return self._finish(response, slot)
+
+    def _admit(self, request):
+        """回傳 (拒絕的回應或 None, 取得的同時處理名額或 None)。"""
+        try:
+            name = get_resolver(getattr(request, 'urlconf', None)).resolve(request.path_info).url_name
+        except Resolver404:
+            return None, None
+        rules = self.rules.get(name)
+        if rules:
+            wait = ratelimit.check(self.buckets, request, name, rules)
+            if wait:
+                response = JsonResponse({'message': '請求過於頻繁，請稍後再試'}, status=429)
+                response['Retry-After'] = str(math.ceil(wait))
+                return response, None
+        slot = self.slots.get(name)
+        if slot is not None and not slot.acquire(blocking=False):
+            response = JsonResponse({'message': '伺服器忙碌中，請稍後再試'}, status=503)
+            response['Retry-After'] = '1'
+            return response, None
+        return None, slot
+
+    def _release(self, slot):
+        if slot is not None:
+            slot.release()
+
+    def _finish(self, response, slot):
+        if slot is not None and response.streaming:
+            # 串流回應 (例如匯出) 在傳送完畢、伺服器關閉回應時才釋放名額
+            release_on_close(response, slot)
+        else:
+            self._release(slot)
+        return response
+
+
+def release_on_close(response, slot):
+    """在 response.close() (WSGI 與 ASGI 伺服器傳送完畢或中斷時呼叫) 之後釋放名額，只釋放一次。"""
+    close = response.close
+    released = threading.Lock()
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if released.acquire(blocking=False):
+                slot.release()
+
+    response.close = close_and_release
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# 與 libmanage.search 中的定義一致；遷移檔不直接引用應用程式碼
+FTS_TABLE = 'libmanage_book_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        "USING fts5(title, author, isbn, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, author, isbn) "
+        "SELECT id, title, author, upper(replace(replace(isbn, '-', ''), ' ', '')) FROM libmanage_book"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0005_book_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
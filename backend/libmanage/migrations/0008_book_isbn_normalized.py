@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def normalize_isbn(isbn):
+    return (isbn or '').replace('-', '').replace(' ', '').upper()
+
+
+def populate_isbn_normalized(apps, schema_editor):
+    Book = apps.get_model('libmanage', 'Book')
+    seen = {}
+    duplicates = []
+    batch = []
+    for book in Book.objects.only('id', 'isbn').order_by('id').iterator(chunk_size=2000):
+        book.isbn_normalized = normalize_isbn(book.isbn) or None
+        if book.isbn_normalized:
+            if book.isbn_normalized in seen:
+                duplicates.append(f'{book.isbn_normalized} (id {seen[book.isbn_normalized]}, {book.id})')
+            seen[book.isbn_normalized] = book.id
+        batch.append(book)
+        if len(batch) >= 2000:
+            Book.objects.bulk_update(batch, ['isbn_normalized'])
+            batch = []
+    if batch:
+        Book.objects.bulk_update(batch, ['isbn_normalized'])
+    if duplicates:
+        raise RuntimeError('以下 ISBN 重複，請先修正後再執行遷移：' + ', '.join(duplicates[:20]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0007_book_updated_at_borrowrecord_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=17, null=True, verbose_name='標準化 ISBN'),
+        ),
+        migrations.RunPython(populate_isbn_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0008_book_isbn_normalized'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='isbn_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=17, null=True, unique=True, verbose_name='標準化 ISBN'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(fields=['user', '-borrow_date'], name='borrow_user_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['book', 'user', '-borrow_date'], name='borrow_open_book_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['user', 'due_date'], name='borrow_open_user_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:30
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def reconcile_open_loans(apps, schema_editor):
+    Book = apps.get_model('libmanage', 'Book')
+    BorrowRecord = apps.get_model('libmanage', 'BorrowRecord')
+    duplicates = list(
+        BorrowRecord.objects.filter(returned=False).values('book_id')
+        .annotate(open_loans=Count('id')).filter(open_loans__gt=1).values_list('book_id', flat=True)[:20]
+    )
+    if duplicates:
+        raise RuntimeError('以下書籍有多筆未歸還的借閱紀錄，請先修正後再執行遷移：' + ', '.join(map(str, duplicates)))
+    # 依未歸還紀錄校正 is_borrowed (舊版依書籍與用戶歸還時不會清除借出狀態)
+    open_book_ids = BorrowRecord.objects.filter(returned=False).values('book_id')
+    Book.objects.filter(is_borrowed=True).exclude(id__in=open_book_ids).update(is_borrowed=False)
+    Book.objects.filter(is_borrowed=False, id__in=open_book_ids).update(is_borrowed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0009_isbn_unique_borrowrecord_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(reconcile_open_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned', False)), fields=('book',), name='one_open_loan_per_book'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('libmanage', 'CatalogVersion')
+    CatalogVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0010_one_open_loan_per_book'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='catalog_version',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='目錄版本'),
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0011_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book_id', models.BigIntegerField(unique=True, verbose_name='書籍 ID')),
+                ('catalog_version', models.BigIntegerField(verbose_name='目錄版本')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='刪除時間')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['catalog_version', 'id'], name='book_catalog_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booktombstone',
+            index=models.Index(fields=['catalog_version', 'book_id'], name='tombstone_version_idx'),
+        ),
+    ]
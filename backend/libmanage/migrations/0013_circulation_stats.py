@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0012_book_changes_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCirculation',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='circulation', serialize=False, to='libmanage.book')),
+                ('loans', models.PositiveIntegerField(default=0, verbose_name='借出次數')),
+                ('last_borrowed', models.DateField(null=True, verbose_name='最後借出日期')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyCirculation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('category', models.CharField(max_length=20, verbose_name='分類')),
+                ('loans', models.PositiveIntegerField(default=0, verbose_name='借出次數')),
+                ('returns', models.PositiveIntegerField(default=0, verbose_name='歸還次數')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('returned', False)), fields=['due_date', 'id'], name='borrow_open_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcirculation',
+            index=models.Index(fields=['-loans', 'book'], name='book_circulation_loans_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycirculation',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='daily_circulation_day_category'),
+        ),
+    ]
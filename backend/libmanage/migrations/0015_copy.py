@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0014_overdue_notice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Copy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('barcode', models.CharField(max_length=32, unique=True, verbose_name='條碼')),
+                ('status', models.CharField(choices=[('AVAILABLE', '可借閱'), ('DAMAGED', '已損壞'), ('UNDER_REPAIR', '維修中'), ('LOST', '遺失')], default='AVAILABLE', max_length=20, verbose_name='複本狀態')),
+                ('is_borrowed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copies', to='libmanage.book')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_borrowed', False), ('status', 'AVAILABLE')), fields=['book', 'id'], name='copy_available_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='available_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='可借冊數'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='館藏冊數'),
+        ),
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='copy',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='borrow_records', to='libmanage.copy'),
+        ),
+    ]
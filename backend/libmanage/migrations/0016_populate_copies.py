@@ -0,0 +1,43 @@
+from django.db import migrations
+from django.db.models import Case, OuterRef, Q, Subquery, Value, When
+
+BATCH_SIZE = 2000
+
+
+def create_copies(apps, schema_editor):
+    """每本既有的書建立一冊複本 (條碼為 <書籍 id>-1)，沿用書籍的狀態與借出狀態，並將借閱紀錄指向該複本。"""
+    Book = apps.get_model('libmanage', 'Book')
+    Copy = apps.get_model('libmanage', 'Copy')
+    BorrowRecord = apps.get_model('libmanage', 'BorrowRecord')
+    batch = []
+    for book_id, status, is_borrowed in Book.objects.order_by('id').values_list('id', 'status', 'is_borrowed').iterator(chunk_size=BATCH_SIZE):
+        batch.append(Copy(book_id=book_id, barcode=f'{book_id}-1', status=status, is_borrowed=is_borrowed))
+        if len(batch) >= BATCH_SIZE:
+            Copy.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Copy.objects.bulk_create(batch)
+    Book.objects.update(
+        total_count=1,
+        available_count=Case(When(Q(status='AVAILABLE', is_borrowed=False), then=Value(1)), default=Value(0)),
+    )
+    BorrowRecord.objects.update(
+        copy_id=Subquery(Copy.objects.filter(book_id=OuterRef('book_id')).order_by('id').values('id')[:1]),
+    )
+
+
+def restore_is_borrowed(apps, schema_editor):
+    Book = apps.get_model('libmanage', 'Book')
+    BorrowRecord = apps.get_model('libmanage', 'BorrowRecord')
+    Book.objects.filter(id__in=BorrowRecord.objects.filter(returned=False).values('book_id')).update(is_borrowed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0015_copy'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_copies, restore_is_borrowed),
+    ]
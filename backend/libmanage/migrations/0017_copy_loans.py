@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0016_populate_copies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='borrowrecord',
+            name='one_open_loan_per_book',
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='copy',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='borrow_records', to='libmanage.copy'),
+        ),
+        migrations.RemoveField(
+            model_name='book',
+            name='is_borrowed',
+        ),
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned', False)), fields=('copy',), name='one_open_loan_per_copy'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned', False)), fields=('book', 'user'), name='one_open_loan_per_user_book'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0017_copy_loans'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('WAITING', '等候中'), ('READY', '可取書'), ('FULFILLED', '已借出'), ('CANCELLED', '已取消'), ('EXPIRED', '已逾期')], default='WAITING', max_length=12, verbose_name='預約狀態')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='優先順序')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='預約時間')),
+                ('ready_at', models.DateTimeField(blank=True, null=True, verbose_name='可取書時間')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='期限')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='copy',
+            name='copy_available_idx',
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='hold_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='預約人數'),
+        ),
+        migrations.AddField(
+            model_name='copy',
+            name='is_held',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='copy',
+            index=models.Index(condition=models.Q(('is_borrowed', False), ('is_held', False), ('status', 'AVAILABLE')), fields=['book', 'id'], name='copy_available_idx'),
+        ),
+        migrations.AddField(
+            model_name='hold',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='libmanage.book'),
+        ),
+        migrations.AddField(
+            model_name='hold',
+            name='copy',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='holds', to='libmanage.copy'),
+        ),
+        migrations.AddField(
+            model_name='hold',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='hold',
+            index=models.Index(condition=models.Q(('status', 'WAITING')), fields=['book', '-priority', 'id'], name='hold_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hold',
+            index=models.Index(condition=models.Q(('status__in', ['WAITING', 'READY'])), fields=['expires_at', 'id'], name='hold_expiry_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='hold',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['WAITING', 'READY'])), fields=('book', 'user'), name='one_active_hold_per_user_book'),
+        ),
+        migrations.AddConstraint(
+            model_name='hold',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'READY')), fields=('copy',), name='one_ready_hold_per_copy'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:06
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_category(apps, schema_editor):
+    # 既有紀錄沒有借閱當時的分類，以書籍目前的分類代替
+    Book = apps.get_model('libmanage', 'Book')
+    BorrowRecord = apps.get_model('libmanage', 'BorrowRecord')
+    BorrowRecord.objects.update(category=Subquery(Book.objects.filter(id=OuterRef('book_id')).values('category')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('libmanage', '0019_auth_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrecord',
+            name='category',
+            field=models.CharField(blank=True, default='', max_length=20, verbose_name='借閱時的分類'),
+        ),
+        migrations.RunPython(populate_category, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,52 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.models import User
 
 
+def normalize_isbn(isbn):
+    """去除 ISBN 中的連字號與空白並轉為大寫，作為比對用的標準形式。"""
+    return (isbn or '').replace('-', '').replace(' ', '').upper()
+
+
+def isbn10_to_isbn13(isbn10):
+    """將標準化的 ISBN-10 轉為 978 開頭的 ISBN-13；格式不符時回傳 None。"""
+    if len(isbn10) != 10 or not isbn10[:9].isdigit():
+        return None
+    body = '978' + isbn10[:9]
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+def isbn13_to_isbn10(isbn13):
+    """將 978 開頭的標準化 ISBN-13 轉為 ISBN-10；無對應的 ISBN-10 時回傳 None。"""
+    if len(isbn13) != 13 or not isbn13.isdigit() or not isbn13.startswith('978'):
+        return None
+    body = isbn13[3:12]
+    check = (11 - sum(int(d) * (10 - i) for i, d in enumerate(body)) % 11) % 11
+    return body + ('X' if check == 10 else str(check))
+
+
+def isbn_variants(isbn):
+    """回傳 ISBN 的所有標準形式 (原樣與 ISBN-10 / ISBN-13 互轉的結果)，用於比對館藏中任一寫法。"""
+    key = normalize_isbn(isbn)
+    variants = [key] if key else []
+    converted = isbn10_to_isbn13(key) if len(key) == 10 else isbn13_to_isbn10(key)
+    if converted:
+        variants.append(converted)
+    return variants
+
+
+def counter_delta(field, counts):
+    """計數欄位的批次增量：{book_id: n} 轉為依書籍 id 選擇增量的 Case 運算式，供一次 UPDATE 多本書使用。"""
+    by_amount = {}
+    for book_id, n in counts.items():
+        by_amount.setdefault(n, []).append(book_id)
+    return models.F(field) + models.Case(
+        *[models.When(id__in=ids, then=models.Value(n)) for n, ids in by_amount.items()], default=models.Value(0),
+    )
+
+
 # Create your models here.
 class Book(models.Model):
      # 定義書籍分類的選項 
@@ -27,7 +70,8 @@ class Book(models.Model):
    title = models.CharField('書名', max_length=100)
    author = models.CharField('作者', max_length=50)
    isbn  = models.CharField('ISBN', max_length=17, blank=True)
-   is_borrowed = models.BooleanField(default=False)
+   # 去除連字號後的 ISBN，供查詢與唯一性檢查使用，由 save() 自動維護
+   isbn_normalized = models.CharField('標準化 ISBN', max_length=17, null=True, blank=True, unique=True, editable=False)
    category = models.CharField(
         max_length=50,
         choices=CATEGORY_CHOICES,
@@ -41,21 +85,273 @@ class Book(models.Model):
        default='AVAILABLE', # 預設狀態為「可借閱」
        verbose_name='書籍狀態'
    )
+   # 最後更新時間，供匯出等增量同步使用
+   updated_at = models.DateTimeField('更新時間', auto_now=True, db_index=True)
+   # 最後一次寫入時的目錄版本號 (見 CatalogVersion)
+   catalog_version = models.BigIntegerField('目錄版本', default=0, editable=False)
+   # 複本冊數與可借冊數 (見 Copy)，列表與借閱檢查只讀這兩個欄位，不需計算複本或借閱紀錄
+   total_count = models.PositiveIntegerField('館藏冊數', default=0, editable=False)
+   available_count = models.PositiveIntegerField('可借冊數', default=0, editable=False)
+   # 等候中的預約數 (見 Hold)，為零時歸還不需查詢預約隊列
+   hold_count = models.PositiveIntegerField('預約人數', default=0, editable=False)
+
+   # 只由 libmanage.inventory、libmanage.loans 與 libmanage.holds 以條件式 UPDATE 維護，save() 不寫入
+   COUNTER_FIELDS = ('total_count', 'available_count', 'hold_count')
+
+   class Meta:
+       indexes = [
+           # 異動同步：依 (catalog_version, id) 分頁
+           models.Index(fields=['catalog_version', 'id'], name='book_catalog_version_idx'),
+       ]
    def __str__(self):
        return self.title
+
+   def save(self, *args, **kwargs):
+       self.isbn_normalized = normalize_isbn(self.isbn) or None
+       update_fields = kwargs.get('update_fields')
+       if update_fields is None and not self._state.adding:
+           # 編輯書目時不可用讀取時的舊冊數覆蓋期間發生的借還
+           update_fields = [f.name for f in self._meta.concrete_fields
+                            if not f.primary_key and f.name not in self.COUNTER_FIELDS]
+       if update_fields is not None:
+           kwargs['update_fields'] = set(update_fields) | {'isbn_normalized', 'catalog_version', 'updated_at'}
+       with transaction.atomic():
+           self.catalog_version = CatalogVersion.bump()
+           super().save(*args, **kwargs)
+
+   def delete(self, *args, **kwargs):
+       # 留下刪除紀錄，讓增量同步的用戶端得知此書已刪除
+       with transaction.atomic():
+           BookTombstone.objects.create(book_id=self.id, catalog_version=CatalogVersion.bump())
+           return super().delete(*args, **kwargs)
    
     
+class CatalogVersion(models.Model):
+    """
+    全館目錄版本號，只有一列。任何書籍寫入都在同一個交易中遞增版本，
+    書籍列表的 ETag 與書籍的 catalog_version 皆由此而來。
+    遞增會鎖住這一列直到交易結束，因此版本順序與提交順序一致。
+    """
+    SINGLETON_ID = 1
+
+    version = models.BigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    async def acurrent(cls):
+        return await cls.objects.filter(pk=cls.SINGLETON_ID).values_list('version', flat=True).afirst() or 0
+
+    @classmethod
+    def bump(cls):
+        """遞增並回傳新版本號；必須在寫入書籍的交易中呼叫。"""
+        with transaction.atomic():
+            if not cls.objects.filter(pk=cls.SINGLETON_ID).update(version=models.F('version') + 1):
+                # 資料列不存在 (例如測試清空資料表後)
+                cls.objects.get_or_create(pk=cls.SINGLETON_ID)
+                cls.objects.filter(pk=cls.SINGLETON_ID).update(version=models.F('version') + 1)
+            return cls.objects.values_list('version', flat=True).get(pk=cls.SINGLETON_ID)
+
+
+class BookTombstone(models.Model):
+    """已刪除書籍的紀錄，供 /api/books/changes/ 回報刪除；只由 Book.delete() 建立。"""
+    book_id = models.BigIntegerField('書籍 ID', unique=True)
+    catalog_version = models.BigIntegerField('目錄版本')
+    deleted_at = models.DateTimeField('刪除時間', auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['catalog_version', 'book_id'], name='tombstone_version_idx'),
+        ]
+
+    def __str__(self):
+        return f'deleted book {self.book_id}'
+
+
+class Copy(models.Model):
+    """
+    館藏複本 (一冊實體書)，以條碼識別。借閱以複本為單位；Book 為書目，
+    其 total_count / available_count 為複本冊數與可借冊數 (狀態為可借閱、未借出且未保留給預約)。
+    複本不刪除，遺失或報廢時將狀態設為 LOST。
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='copies')
+    barcode = models.CharField('條碼', max_length=32, unique=True)
+    status = models.CharField('複本狀態', max_length=20, choices=Book.STATUS_CHOICES, default='AVAILABLE')
+    is_borrowed = models.BooleanField(default=False)
+    # 已分配給可取書的預約 (Hold.status 為 READY)，只有該讀者可以借出
+    is_held = models.BooleanField(default=False)
+    updated_at = models.DateTimeField('更新時間', auto_now=True)
+
+    class Meta:
+        indexes = [
+            # 借閱時挑選該書第一本可借的複本
+            models.Index(fields=['book', 'id'], condition=models.Q(is_borrowed=False, is_held=False, status='AVAILABLE'),
+                         name='copy_available_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.barcode} ({self.book_id})'
+
+    @property
+    def is_available(self):
+        return not self.is_borrowed and not self.is_held and self.status == 'AVAILABLE'
+
+
 class BorrowRecord(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    # 借出的複本；book 為其書目，保留在紀錄上供借閱歷史與統計直接使用
+    copy = models.ForeignKey(Copy, on_delete=models.CASCADE, related_name='borrow_records')
+    # 借出當時書籍的分類，借還統計 (libmanage.stats) 與重建皆以此分類計數，之後修改書籍分類不影響歷史統計
+    category = models.CharField('借閱時的分類', max_length=20, blank=True, default='')
     borrow_date = models.DateField(auto_now_add=True)
     due_date = models.DateField()
     return_date = models.DateField(null=True, blank=True)
     returned = models.BooleanField(default=False)
+    updated_at = models.DateTimeField('更新時間', auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # 借閱歷史：依用戶篩選並依借閱日期排序
+            models.Index(fields=['user', '-borrow_date'], name='borrow_user_history_idx'),
+            # 以下為未歸還借閱的部分索引：未歸還只佔少數，且 returned=False 在 SQLite 會編譯為
+            # NOT returned，無法作為一般複合索引的等值欄位
+            # 借閱/歸還流程：(book, user, returned) 或 (user, book, returned) 取最新一筆
+            models.Index(fields=['book', 'user', '-borrow_date'], condition=models.Q(returned=False), name='borrow_open_book_user_idx'),
+            # 用戶目前借閱與到期日
+            models.Index(fields=['user', 'due_date'], condition=models.Q(returned=False), name='borrow_open_user_idx'),
+            # 全館逾期清單：依到期日排序
+            models.Index(fields=['due_date', 'id'], condition=models.Q(returned=False), name='borrow_open_due_idx'),
+        ]
+        constraints = [
+            # 每個複本最多只能有一筆未歸還的借閱
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(returned=False), name='one_open_loan_per_copy'),
+            # 同一用戶同一本書 (書目) 同時只能借一冊
+            models.UniqueConstraint(fields=['book', 'user'], condition=models.Q(returned=False),
+                                    name='one_open_loan_per_user_book'),
+        ]
     
     def __str__(self):
         return f'{self.user.username} borrowed {self.book.title}' 
     
     @property  #檢查是否逾期
     def is_overdue(self):
-        return not self.returned and self.due_date < timezone.now().date()
\ No newline at end of file
+        return not self.returned and self.due_date < timezone.now().date()
+
+
+class Hold(models.Model):
+    """
+    預約。書籍沒有可借的複本時，讀者排入該書的等候隊列 (WAITING)；有複本歸還或釋出時，
+    依 priority (大者優先) 與先後順序分配給隊首，預約轉為 READY 並保留該複本，
+    讀者在 expires_at 前借出即完成 (FULFILLED)。逾時的預約由 ``manage.py sweep_holds``
+    標記為 EXPIRED，保留的複本再分配給下一位。見 libmanage.holds。
+    """
+    STATUS_CHOICES = [
+        ('WAITING', '等候中'),
+        ('READY', '可取書'),
+        ('FULFILLED', '已借出'),
+        ('CANCELLED', '已取消'),
+        ('EXPIRED', '已逾期'),
+    ]
+    ACTIVE_STATUSES = ('WAITING', 'READY')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='holds')
+    # READY 時保留的複本
+    copy = models.ForeignKey(Copy, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds')
+    status = models.CharField('預約狀態', max_length=12, choices=STATUS_CHOICES, default='WAITING')
+    # 館員指定的優先順序 (例如課程指定用書)，同一優先順序先到先得
+    priority = models.SmallIntegerField('優先順序', default=0)
+    created_at = models.DateTimeField('預約時間', auto_now_add=True)
+    ready_at = models.DateTimeField('可取書時間', null=True, blank=True)
+    # WAITING：等候期限；READY：取書期限
+    expires_at = models.DateTimeField('期限', null=True, blank=True)
+    updated_at = models.DateTimeField('更新時間', auto_now=True)
+
+    class Meta:
+        indexes = [
+            # 預約隊列：每本書依 (優先順序, id) 取隊首，只需一次索引查詢，與隊列長度無關
+            models.Index(fields=['book', '-priority', 'id'], condition=models.Q(status='WAITING'), name='hold_queue_idx'),
+            # 逾期掃描：依期限順序分批走訪仍有效的預約
+            models.Index(fields=['expires_at', 'id'], condition=models.Q(status__in=['WAITING', 'READY']),
+                         name='hold_expiry_idx'),
+        ]
+        constraints = [
+            # 每位用戶每本書同時只能有一筆有效的預約
+            models.UniqueConstraint(fields=['book', 'user'], condition=models.Q(status__in=['WAITING', 'READY']),
+                                    name='one_active_hold_per_user_book'),
+            # 每個複本只能保留給一筆預約
+            models.UniqueConstraint(fields=['copy'], condition=models.Q(status='READY'), name='one_ready_hold_per_copy'),
+        ]
+
+    def __str__(self):
+        return f'hold {self.id} on book {self.book_id} ({self.status})'
+
+
+class AuthToken(models.Model):
+    """
+    已簽發的登入權杖。權杖本身以 HMAC 簽署並帶有期限 (見 libmanage.tokens)，驗證不需查詢此表；
+    此表只記錄撤銷：登出或變更密碼時填入 revoked_at，過期的資料列由 ``manage.py clear_tokens`` 刪除。
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='auth_tokens')
+    created_at = models.DateTimeField('簽發時間', auto_now_add=True)
+    expires_at = models.DateTimeField('到期時間', db_index=True)
+    revoked_at = models.DateTimeField('撤銷時間', null=True, blank=True)
+
+    def __str__(self):
+        return f'token {self.id} for user {self.user_id}'
+
+
+class OverdueNotice(models.Model):
+    """
+    逾期通知，由 ``manage.py sweep_overdue`` 為每筆逾期未還的借閱建立一次。
+    sent_at 為空的通知即待寄送的 outbox，由寄送程式處理後填入。
+    """
+    record = models.OneToOneField(BorrowRecord, on_delete=models.CASCADE, related_name='overdue_notice')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    due_date = models.DateField('到期日')
+    created_at = models.DateTimeField('建立時間', auto_now_add=True)
+    sent_at = models.DateTimeField('寄送時間', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # 待寄送的通知
+            models.Index(fields=['id'], condition=models.Q(sent_at__isnull=True), name='overdue_notice_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f'overdue notice for record {self.record_id}'
+
+
+class DailyCirculation(models.Model):
+    """
+    每日、每個分類的借出與歸還次數，由 libmanage.stats 在借還的交易中累加，
+    並可以 ``manage.py backfill_stats`` 由借閱紀錄重建。借出與歸還皆計入借閱當時書籍的分類
+    (BorrowRecord.category)，兩種方式的結果相同。
+    """
+    day = models.DateField('日期')
+    category = models.CharField('分類', max_length=20)
+    loans = models.PositiveIntegerField('借出次數', default=0)
+    returns = models.PositiveIntegerField('歸還次數', default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='daily_circulation_day_category'),
+        ]
+
+    def __str__(self):
+        return f'{self.day} {self.category}: {self.loans} / {self.returns}'
+
+
+class BookCirculation(models.Model):
+    """每本書的累計借出次數 (週轉率)，維護方式同 DailyCirculation。"""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='circulation')
+    loans = models.PositiveIntegerField('借出次數', default=0)
+    last_borrowed = models.DateField('最後借出日期', null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-loans', 'book'], name='book_circulation_loans_idx'),
+        ]
@@ -0,0 +1,148 @@
+"""
+密碼雜湊策略。
+
+預設演算法為 settings.PASSWORD_HASHERS 的第一個 (由 LIBMANAGE_PASSWORD_HASHER 選擇)，
+其餘的演算法仍可驗證既有的雜湊。本模組的 hasher 由 settings 讀取成本參數；
+變更演算法或成本後，舊的雜湊在該用戶下次登入成功時以新設定重新計算 (verify 回傳新的雜湊)。
+
+雜湊刻意耗費 CPU (Django 預設的 PBKDF2 一次約數百毫秒)，計算交由有上限的執行緒池執行：
+hashlib 與 argon2-cffi 計算時會釋放 GIL，每個工作行程同時計算的雜湊數不超過 PASSWORD_WORKERS，
+排隊中的工作超過 PASSWORD_MAX_PENDING 時立即拋出 HasherBusy，學期初的大量登入不會佔滿所有 CPU。
+async views 以 await 等待結果，等待期間事件迴圈仍可處理其他請求。
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """迭代次數為 settings.PASSWORD_PBKDF2_ITERATIONS，未設定時沿用 Django 的預設值。"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or super().iterations
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """work factor (N) 為 settings.PASSWORD_SCRYPT_WORK_FACTOR。"""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR or super().work_factor
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """time_cost 與 memory_cost (KiB) 取自 settings，需安裝 argon2-cffi。"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST or super().time_cost
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST or super().memory_cost
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash(password):
+    return hashers.make_password(password)
+
+
+def _verify(password, encoded):
+    """回傳 (是否相符, 新的雜湊)；雜湊的演算法或成本與目前設定不同時才產生新的雜湊。"""
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        # 空值、不可用的密碼 (set_unusable_password) 或未設定的演算法
+        return False, None
+    if not hasher.verify(password, encoded):
+        return False, None
+    preferred = hashers.get_hasher('default')
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, preferred.encode(password, preferred.salt())
+    return True, None
+
+
+class HashPool:
+    """
+    有上限的雜湊執行緒池。workers 為 0 時直接在呼叫端計算 (開發與測試用)。
+    排隊與計算中的工作超過 max_pending 時拋出 HasherBusy，不讓請求無限排隊。
+    """
+
+    def __init__(self, workers, max_pending=None, timeout=10):
+        self.config = (workers, max_pending, timeout)
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password') if workers else None
+
+    def _submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('登入人數眾多，請稍後再試')
+        try:
+            return self._executor.submit(self._call, func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _call(self, func, *args):
+        # 工作完成才釋放名額，呼叫端逾時放棄等待的工作仍計入
+        try:
+            return func(*args)
+        finally:
+            self._slots.release()
+
+    def run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        return self._submit(func, *args).result(timeout=self.timeout)
+
+    async def arun(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.wait_for(asyncio.wrap_future(self._submit(func, *args)), self.timeout)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """取得本行程共用的雜湊執行緒池，第一次呼叫 (或設定改變) 時建立。"""
+    global _pool
+    config = (settings.PASSWORD_WORKERS, settings.PASSWORD_MAX_PENDING, settings.PASSWORD_TIMEOUT)
+    with _pool_lock:
+        if _pool is None or _pool.config != config:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = HashPool(*config)
+        return _pool
+
+
+def hash_password(password):
+    """以目前的預設演算法雜湊密碼。"""
+    return get_pool().run(_hash, password)
+
+
+def verify(password, encoded):
+    """驗證密碼，回傳 (是否相符, 需要寫回的新雜湊或 None)。"""
+    return get_pool().run(_verify, password, encoded)
+
+
+async def ahash_password(password):
+    return await get_pool().arun(_hash, password)
+
+
+async def averify(password, encoded):
+    return await get_pool().arun(_verify, password, encoded)
@@ -0,0 +1,185 @@
+"""
+限流與同時處理數上限，由 RateLimitMiddleware 套用。
+
+settings.RATE_LIMITS 以 URL 名稱 (libmanagesystem/urls.py 的 name) 設定 token bucket，
+額度格式為 "次數/期間" (期間為 s、m、h)，同一路由可依下列鍵各設一個 bucket：
+- ip：來源 IP
+- user：登入用戶 (只驗證權杖簽章，不查詢資料庫；沒有權杖的請求不計)
+- account：登入請求中的帳號，限制針對同一帳號的密碼嘗試
+- resource：來源 IP 加上請求路徑，例如同一台掃描機重複查詢同一個 ISBN
+任一 bucket 沒有額度時回傳 429 與 Retry-After，不執行 view。
+
+bucket 預設存放在工作行程的記憶體中 (容量有限的 LRU)，各行程分別計算，整體額度約為設定值乘以工作行程數。
+RATE_LIMIT_CACHE 指定快取別名時改存放在該快取，多個行程共用額度：以期間為視窗的計數器近似 token bucket
+(cache.add 與 incr 為原子操作，需 LIBMANAGE_CACHE=redis 等跨行程的快取才有共用的效果)。
+
+settings.CONCURRENCY_LIMITS 為耗費資源的路由在每個工作行程中同時處理的請求數上限，
+超過時立即回傳 503，在資料庫或 CPU 飽和之前拒絕多出來的請求。
+"""
+import hashlib
+import ipaddress
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import tokens
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600}
+KEY_KINDS = ('ip', 'user', 'account', 'resource')
+
+
+def parse_rate(rate):
+    """'20/m' → (20, 60)：容量與補滿所需的秒數。"""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period]
+
+
+def parse_rules(config):
+    """將 {url_name: {鍵: 額度}} 轉為 {url_name: [(鍵, 容量, 期間), ...]}，設定有誤時拋出 ValueError。"""
+    rules = {}
+    for name, limits in config.items():
+        for kind, rate in limits.items():
+            if kind not in KEY_KINDS:
+                raise ValueError(f'RATE_LIMITS[{name!r}]: unknown key {kind!r}')
+            rules.setdefault(name, []).append((kind, *parse_rate(rate)))
+    return rules
+
+
+class LocalBuckets:
+    """工作行程內的 token bucket，key → (剩餘額度, 更新時間)，容量有限的 LRU，執行緒安全。"""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def take(self, key, capacity, period):
+        """取用一個額度，回傳需要等待的秒數 (0 表示允許)。"""
+        now = time.monotonic()
+        with self._lock:
+            available, updated = self._entries.get(key, (capacity, now))
+            available = min(capacity, available + (now - updated) * capacity / period)
+            wait = 0 if available >= 1 else (1 - available) * period / capacity
+            self._entries[key] = (available - 1 if not wait else available, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                # 被淘汰的多半是閒置已久、額度早已補滿的 bucket
+                self._entries.popitem(last=False)
+            return wait
+
+    def refund(self, key, capacity, period):
+        """歸還 take 取用的一個額度。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (min(capacity, entry[0] + 1), entry[1])
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CacheBuckets:
+    """以共用快取計數的固定視窗，多個工作行程共用額度。"""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def _cache_key(self, key, window):
+        digest = hashlib.md5(key.encode()).hexdigest()
+        return f'libmanage:ratelimit:{digest}:{window}'
+
+    def take(self, key, capacity, period):
+        now = time.time()
+        window = int(now // period)
+        cache_key = self._cache_key(key, window)
+        self.cache.add(cache_key, 0, timeout=period + 1)
+        try:
+            count = self.cache.incr(cache_key)
+        except ValueError:
+            # 在 add 與 incr 之間過期
+            self.cache.set(cache_key, 1, timeout=period + 1)
+            count = 1
+        return 0 if count <= capacity else (window + 1) * period - now
+
+    def refund(self, key, capacity, period):
+        try:
+            self.cache.decr(self._cache_key(key, int(time.time() // period)))
+        except ValueError:
+            # 已進入下一個視窗，原本的計數已過期
+            pass
+
+    def reset(self):
+        pass
+
+
+local_buckets = LocalBuckets(settings.RATE_LIMIT_CACHE_SIZE)
+
+
+def get_buckets():
+    alias = settings.RATE_LIMIT_CACHE
+    return CacheBuckets(alias) if alias else local_buckets
+
+
+def _trusted(remote):
+    """remote 是否屬於 RATE_LIMIT_TRUSTED_PROXIES (位址或網段，例如 docker 網路的 172.16.0.0/12)。"""
+    try:
+        address = ipaddress.ip_address(remote)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(proxy, strict=False) for proxy in settings.RATE_LIMIT_TRUSTED_PROXIES)
+
+
+def client_ip(request):
+    """來源 IP；來自 RATE_LIMIT_TRUSTED_PROXIES 的請求取 X-Forwarded-For 中最後一個 (由該代理附加的) 位址。"""
+    remote = request.META.get('REMOTE_ADDR', '')
+    if settings.RATE_LIMIT_TRUSTED_PROXIES and _trusted(remote):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '').rsplit(',', 1)[-1].strip()
+        return forwarded or remote
+    return remote
+
+
+def _account(request):
+    if request.method != 'POST' or request.content_type != 'application/json':
+        return None
+    try:
+        account = json.loads(request.body).get('username')
+    except (ValueError, AttributeError):
+        return None
+    return str(account) if account else None
+
+
+def request_key(request, kind):
+    """回傳 bucket 的鍵值，請求不適用此鍵 (例如沒有權杖) 時回傳 None。"""
+    if kind == 'ip':
+        return client_ip(request)
+    if kind == 'user':
+        user_id = tokens.signed_user_id(request)
+        return str(user_id) if user_id is not None else None
+    if kind == 'account':
+        return _account(request)
+    return f'{client_ip(request)}{request.path_info}'
+
+
+def check(buckets, request, name, rules):
+    """
+    依序取用各 bucket 的額度，回傳需要等待的秒數 (0 表示允許)。
+    任一 bucket 拒絕時歸還已取用的額度，被拒絕的請求 (例如超過帳號額度) 不會繼續消耗 IP 的額度。
+    """
+    taken = []
+    for kind, capacity, period in rules:
+        value = request_key(request, kind)
+        if value is None:
+            continue
+        key = f'{name}:{kind}:{value}'
+        wait = buckets.take(key, capacity, period)
+        if wait:
+            for taken_key, taken_capacity, taken_period in taken:
+                buckets.refund(taken_key, taken_capacity, taken_period)
+            return wait
+        taken.append((key, capacity, period))
+    return 0
@@ -0,0 +1,121 @@
+"""
+條碼 / QR 碼辨識服務。
+
+影像解碼與 pyzbar 辨識皆為 CPU 密集工作，交由有上限的行程池執行，不佔用請求執行緒的 GIL。
+影像以灰階直接解碼，長邊超過 SCAN_MAX_SIDE 時以 INTER_AREA 縮小後再辨識，
+並只啟用書籍條碼 (EAN-13 / ISBN) 與 QR 碼的解碼器。
+
+本模組不依賴 Django，行程池的子行程只需要匯入 OpenCV、NumPy 與 pyzbar。
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from pyzbar.pyzbar import decode as pyzbar_decode, ZBarSymbol
+
+SCAN_SYMBOLS = [ZBarSymbol.EAN13, ZBarSymbol.ISBN13, ZBarSymbol.ISBN10, ZBarSymbol.QRCODE]
+SCAN_MAX_SIDE = 1280
+
+
+class ScanError(Exception):
+    pass
+
+
+class ScannerBusy(Exception):
+    pass
+
+
+def prepare_image(image_bytes, max_side=SCAN_MAX_SIDE):
+    """將影像位元組解碼為灰階陣列並等比例縮小，回傳 (影像, 縮放比例)。"""
+    buffer = np.frombuffer(image_bytes, np.uint8)
+    gray = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ScanError('無法解碼圖像')
+    scale = max_side / max(gray.shape[:2])
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        scale = 1.0
+    return gray, scale
+
+
+def decode_image(image_bytes, max_side=SCAN_MAX_SIDE):
+    """辨識影像中所有的條碼與 QR 碼，座標換算回原始影像尺寸。"""
+    gray, scale = prepare_image(image_bytes, max_side)
+    results = []
+    for symbol in pyzbar_decode(gray, symbols=SCAN_SYMBOLS):
+        rect = symbol.rect
+        results.append({
+            'type': symbol.type,
+            'data': symbol.data.decode('utf-8', errors='replace'),
+            'bounding_box': {
+                'x': round(rect.left / scale),
+                'y': round(rect.top / scale),
+                'width': round(rect.width / scale),
+                'height': round(rect.height / scale),
+            },
+        })
+    return results
+
+
+class ScanPool:
+    """
+    有上限的辨識行程池。workers 為 0 時直接在呼叫端執行 (開發與測試用)。
+    同時處理中的工作達到 max_pending 時立即拋出 ScannerBusy，不讓請求佔住工作行程排隊等待。
+    """
+
+    def __init__(self, workers, max_pending=None, timeout=10):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending or max(workers, 1) * 2)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 以 spawn 建立子行程，避免複製 Web 伺服器行程中的執行緒與連線
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def decode(self, image_bytes, max_side=SCAN_MAX_SIDE):
+        if not self._slots.acquire(blocking=False):
+            raise ScannerBusy('辨識服務忙碌中，請稍後再試')
+        if self.workers == 0:
+            try:
+                return decode_image(image_bytes, max_side)
+            finally:
+                self._slots.release()
+        try:
+            future = self._get_executor().submit(decode_image, image_bytes, max_side)
+        except BaseException:
+            self._slots.release()
+            raise
+        # 工作完成才釋放名額，逾時放棄等待的影像仍在子行程中辨識，仍計入
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers=2, timeout=10):
+    """取得本行程共用的辨識行程池，第一次呼叫 (或設定改變) 時建立。"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or (_pool.workers, _pool.timeout) != (workers, timeout):
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ScanPool(workers, timeout=timeout)
+        return _pool
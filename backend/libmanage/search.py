@@ -0,0 +1,142 @@
+"""
+書籍全文檢索。
+
+預設的 SQLite 後端使用 FTS5 虛擬表 (trigram 分詞器) 建立書名、作者、ISBN 的
+倒排索引，任意三個字元以上的子字串 (含中文) 都能命中，並以 bm25 排序。
+少於三個字元的查詢詞 trigram 無法比對，改以索引表上的 LIKE 篩選。
+其他資料庫後端則退回 icontains 查詢。
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Book, normalize_isbn
+
+FTS_TABLE = 'libmanage_book_fts'
+TRIGRAM_LENGTH = 3
+
+CREATE_INDEX_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    "USING fts5(title, author, isbn, tokenize='trigram')"
+)
+
+_ISBN_TERM = re.compile(r'^[0-9Xx][0-9Xx\- ]*$')
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def _row(book):
+    return (book.id, book.title, book.author, normalize_isbn(book.isbn))
+
+
+def index_books(books):
+    """寫入 (或覆蓋) 多本書的索引資料。"""
+    if not is_available():
+        return
+    rows = [_row(book) for book in books]
+    if not rows:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, author, isbn) VALUES (%s, %s, %s, %s)", rows
+        )
+
+
+def index_book(book):
+    index_books([book])
+
+
+def remove_book(book_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [book_id])
+
+
+def rebuild_index(batch_size=2000):
+    """清空並以 Book 資料表重建整個索引，回傳索引的書籍數量。"""
+    if not is_available():
+        return 0
+    total = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_INDEX_SQL)
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        batch = []
+        for book in Book.objects.only('id', 'title', 'author', 'isbn').order_by('id').iterator(chunk_size=batch_size):
+            batch.append(_row(book))
+            if len(batch) >= batch_size:
+                total += _insert_rows(batch)
+                batch = []
+        total += _insert_rows(batch)
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _insert_rows(rows):
+    if rows:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, author, isbn) VALUES (%s, %s, %s, %s)", rows
+            )
+    return len(rows)
+
+
+def _split_terms(query):
+    terms = []
+    for term in query.split():
+        if _ISBN_TERM.match(term) and any(ch.isdigit() for ch in term):
+            term = normalize_isbn(term)
+        terms.append(term)
+    return terms
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_book_ids(query, limit, offset=0):
+    """
+    回傳 (book_ids, has_more)，book_ids 依相關度排序。
+    所有查詢詞皆須命中 (AND)；三字元以上的詞以 FTS5 MATCH 比對並計分。
+    """
+    terms = _split_terms(query)
+    if not terms:
+        return [], False
+
+    if not is_available():
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(author__icontains=term) | Q(isbn__icontains=term)
+        ids = list(Book.objects.filter(condition).order_by('id').values_list('id', flat=True)[offset:offset + limit + 1])
+        return ids[:limit], len(ids) > limit
+
+    match_terms = [t for t in terms if len(t) >= TRIGRAM_LENGTH]
+    like_terms = [t for t in terms if len(t) < TRIGRAM_LENGTH]
+
+    where = []
+    params = []
+    if match_terms:
+        where.append(f"{FTS_TABLE} MATCH %s")
+        params.append(' AND '.join('"{}"'.format(t.replace('"', '""')) for t in match_terms))
+    for term in like_terms:
+        pattern = f"%{_escape_like(term)}%"
+        where.append("(title LIKE %s ESCAPE '\\' OR author LIKE %s ESCAPE '\\' OR isbn LIKE %s ESCAPE '\\')")
+        params.extend([pattern, pattern, pattern])
+
+    # bm25 權重：書名 > 作者 > ISBN
+    order_by = f"bm25({FTS_TABLE}, 10.0, 5.0, 1.0), rowid" if match_terms else "rowid"
+    sql = (
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {' AND '.join(where)} "
+        f"ORDER BY {order_by} LIMIT %s OFFSET %s"
+    )
+    params.extend([limit + 1, offset])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+    return ids[:limit], len(ids) > limit
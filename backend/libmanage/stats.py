@@ -0,0 +1,139 @@
+"""
+借閱統計。
+
+報表不直接掃描 BorrowRecord，而是讀取預先彙總的資料表：
+
+- DailyCirculation：每日、每個分類的借出與歸還次數
+- BookCirculation：每本書的累計借出次數與最後借出日期
+
+借還流程 (libmanage.loans) 在同一個交易中呼叫 record_loans / record_returns，
+以 ``INSERT ... ON CONFLICT DO UPDATE`` 累加計數 (SQLite 3.24+ 與 PostgreSQL 皆支援)。
+分類一律取借閱紀錄上借出當時的分類 (BorrowRecord.category)，累加與 backfill 重建的結果相同，
+修改書籍分類不會改寫歷史統計。
+以 bulk_create 等方式直接寫入的借閱紀錄不會經過這裡，需以 ``manage.py backfill_stats`` 重建。
+逾期清單則直接查詢未歸還借閱的部分索引 (borrow_open_due_idx)。
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q, Sum
+
+from .models import BookCirculation, BorrowRecord, DailyCirculation
+
+DAILY_TABLE = DailyCirculation._meta.db_table
+BOOK_TABLE = BookCirculation._meta.db_table
+
+UPSERT_DAILY_SQL = (
+    f"INSERT INTO {DAILY_TABLE} (day, category, loans, returns) VALUES (%s, %s, %s, %s) "
+    f"ON CONFLICT (day, category) DO UPDATE SET "
+    f"loans = {DAILY_TABLE}.loans + excluded.loans, returns = {DAILY_TABLE}.returns + excluded.returns"
+)
+UPSERT_BOOK_SQL = (
+    f"INSERT INTO {BOOK_TABLE} (book_id, loans, last_borrowed) VALUES (%s, %s, %s) "
+    f"ON CONFLICT (book_id) DO UPDATE SET "
+    f"loans = {BOOK_TABLE}.loans + excluded.loans, last_borrowed = excluded.last_borrowed"
+)
+
+
+def _upsert_daily(counts, column):
+    """counts 為 {(日期, 分類): 次數}，累加到 loans 或 returns 欄位。"""
+    if not counts:
+        return
+    adapt = connection.ops.adapt_datefield_value
+    rows = [
+        (adapt(day), category, n if column == 'loans' else 0, n if column == 'returns' else 0)
+        for (day, category), n in counts.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(UPSERT_DAILY_SQL, rows)
+
+
+def record_loans(records):
+    """累加新借閱紀錄的統計，分類取紀錄的 category。"""
+    if not records:
+        return
+    _upsert_daily(Counter((record.borrow_date, record.category) for record in records), 'loans')
+    adapt = connection.ops.adapt_datefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(UPSERT_BOOK_SQL, [(record.book_id, 1, adapt(record.borrow_date)) for record in records])
+
+
+def record_returns(records):
+    """累加已歸還借閱紀錄的統計，歸還日期取紀錄的 return_date，分類同 record_loans。"""
+    if not records:
+        return
+    _upsert_daily(Counter((record.return_date, record.category) for record in records), 'returns')
+
+
+def backfill(batch_size=5000):
+    """以 BorrowRecord 重建所有彙總資料，回傳 (每日彙總筆數, 書籍彙總筆數)。"""
+    with transaction.atomic():
+        counts = {}
+        loans = BorrowRecord.objects.values('borrow_date', 'category').annotate(n=Count('id')).order_by()
+        for row in loans.iterator(chunk_size=batch_size):
+            counts.setdefault((row['borrow_date'], row['category']), [0, 0])[0] = row['n']
+        returns = (BorrowRecord.objects.filter(returned=True, return_date__isnull=False)
+                   .values('return_date', 'category').annotate(n=Count('id')).order_by())
+        for row in returns.iterator(chunk_size=batch_size):
+            counts.setdefault((row['return_date'], row['category']), [0, 0])[1] = row['n']
+
+        DailyCirculation.objects.all().delete()
+        DailyCirculation.objects.bulk_create(
+            [DailyCirculation(day=day, category=category, loans=n_loans, returns=n_returns)
+             for (day, category), (n_loans, n_returns) in counts.items()],
+            batch_size=batch_size,
+        )
+
+        BookCirculation.objects.all().delete()
+        per_book = (BorrowRecord.objects.values('book_id')
+                    .annotate(loans=Count('id'), last_borrowed=Max('borrow_date')).order_by())
+        books, total = [], 0
+        for row in per_book.iterator(chunk_size=batch_size):
+            books.append(BookCirculation(**row))
+            if len(books) >= batch_size:
+                total += len(BookCirculation.objects.bulk_create(books))
+                books = []
+        total += len(BookCirculation.objects.bulk_create(books))
+    return len(counts), total
+
+
+# 報表查詢：皆只讀取彙總資料表，成本與日期範圍 (或回傳筆數) 成正比
+def daily_series(start, end):
+    return list(
+        DailyCirculation.objects.filter(day__range=(start, end)).values('day')
+        .annotate(total_loans=Sum('loans'), total_returns=Sum('returns')).order_by('day')
+    )
+
+
+def by_category(start, end):
+    return list(
+        DailyCirculation.objects.filter(day__range=(start, end)).values('category')
+        .annotate(total_loans=Sum('loans'), total_returns=Sum('returns')).order_by('-total_loans', 'category')
+    )
+
+
+def busiest_days(start, end, limit=10):
+    return list(
+        DailyCirculation.objects.filter(day__range=(start, end)).values('day')
+        .annotate(total_loans=Sum('loans'), total_returns=Sum('returns'), total=Sum(F('loans') + F('returns')))
+        .order_by('-total', 'day')[:limit]
+    )
+
+
+def top_books(limit=20):
+    return list(
+        BookCirculation.objects.order_by('-loans', 'book_id')
+        .values('book_id', 'loans', 'last_borrowed', title=F('book__title'), category=F('book__category'))[:limit]
+    )
+
+
+def overdue(today, limit, after=None):
+    """未歸還且已過到期日的借閱，依 (到期日, id) 排序；after 為上一頁最後一筆的 (到期日, id)。"""
+    records = BorrowRecord.objects.filter(returned=False, due_date__lt=today)
+    if after is not None:
+        last_due, last_id = after
+        records = records.filter(Q(due_date__gt=last_due) | Q(due_date=last_due, id__gt=last_id), due_date__gte=last_due)
+    return list(records.order_by('due_date', 'id').values(
+        'id', 'user_id', 'book_id', 'due_date', 'borrow_date',
+        username=F('user__username'), book_title=F('book__title'),
+    )[:limit])
@@ -1,7 +1,1163 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import StreamingHttpResponse
 from django.urls import reverse
+from django.utils import timezone
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from . import caching, holds, inventory, loans, metrics, overdue, passwords, ratelimit, stats, tokens
+from .models import (
+    AuthToken, Book, BookCirculation, BorrowRecord, CatalogVersion, Copy, DailyCirculation, Hold, OverdueNotice,
+)
+
+
+def create_book(copies=1, **fields):
+    """建立書籍與館藏複本 (預設一冊)。"""
+    book = Book.objects.create(**fields)
+    inventory.add_copies(book.id, copies)
+    book.refresh_from_db()
+    return book
+
+
+def create_loan(user, book, **fields):
+    """不經借閱流程直接建立借閱紀錄，使用書籍的第一本複本。"""
+    copy = book.copies.order_by('id').first() or inventory.add_copies(book.id)[0]
+    return BorrowRecord.objects.create(user=user, book=book, copy=copy, category=book.category, **fields)
+
+
+def auth(user):
+    """以新簽發的登入權杖作為請求標頭。"""
+    return {'Authorization': f'Bearer {tokens.issue(user)[0]}'}
+
 
 class SimpleTest(TestCase):
     def test_homepage(self):
         response = self.client.get(reverse('home'))
         self.assertEqual(response.status_code, 200)
+
+
+class BookListApiTest(TestCase):
+    def setUp(self):
+        for i in range(5):
+            create_book(title=f'書{i}', author='作者', isbn=f'97800000000{i:02d}',
+                        category='SCIENCE' if i % 2 else 'HISTORY')
+        Book.objects.filter(title='書1').update(available_count=0)
+
+    def test_keyset_pagination(self):
+        response = self.client.get(reverse('api_book_list'), {'limit': 2})
+        data = response.json()
+        self.assertEqual([b['title'] for b in data['books']], ['書0', '書1'])
+        seen = [b['id'] for b in data['books']]
+        while data['next_cursor']:
+            data = self.client.get(reverse('api_book_list'), {'limit': 2, 'cursor': data['next_cursor']}).json()
+            seen += [b['id'] for b in data['books']]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_filters_and_fields(self):
+        response = self.client.get(reverse('api_book_list'),
+                                   {'category': 'SCIENCE', 'is_borrowed': 'false', 'fields': 'title'})
+        self.assertEqual(response.json()['books'], [{'id': response.json()['books'][0]['id'], 'title': '書3'}])
+        response = self.client.get(reverse('api_book_list'), {'available': 'false', 'fields': 'title,available_count'})
+        self.assertEqual([(b['title'], b['available_count']) for b in response.json()['books']], [('書1', 0)])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(reverse('api_book_list'), {'category': 'NOPE'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_book_list'), {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_book_list'), {'cursor': '!!'}).status_code, 400)
+
+
+class BookSearchApiTest(TestCase):
+    def create_book(self, **fields):
+        response = self.client.post(reverse('api_book_create'), fields, content_type='application/json')
+        return response.json()['book_id']
+
+    def test_search_tracks_create_update_delete(self):
+        santi = self.create_book(title='三體 地球往事', author='劉慈欣', isbn='978-7-5366-9293-0')
+        self.create_book(title='Python 程式設計', author='Guido', isbn='9789860000001')
+
+        def search(q):
+            return [b['id'] for b in self.client.get(reverse('api_book_search'), {'q': q}).json()['books']]
+
+        self.assertEqual(search('地球往'), [santi])
+        self.assertEqual(search('三體'), [santi])
+        self.assertEqual(search('9787536692930'), [santi])
+        self.assertEqual(search('pyth'), [santi + 1])
+
+        self.client.put(reverse('api_book_update', args=[santi]),
+                        {'title': '黑暗森林', 'author': '劉慈欣', 'isbn': '9787536692930',
+                         'category': 'FICTION', 'status': 'AVAILABLE'}, content_type='application/json')
+        self.assertEqual(search('地球往'), [])
+        self.assertEqual(search('黑暗森林'), [santi])
+
+        self.client.delete(reverse('api_book_delete', args=[santi]))
+        self.assertEqual(search('黑暗森林'), [])
+
+    def test_ranking_and_pagination(self):
+        self.create_book(title='Other', author='Django Reinhardt', isbn='1')
+        title_hit = self.create_book(title='Django 入門', author='someone', isbn='2')
+        first = self.client.get(reverse('api_book_search'), {'q': 'django', 'limit': 1}).json()
+        self.assertEqual([b['id'] for b in first['books']], [title_hit])
+        second = self.client.get(reverse('api_book_search'), {'q': 'django', 'limit': 1, 'offset': first['next_offset']}).json()
+        self.assertEqual(len(second['books']), 1)
+        self.assertIsNone(second['next_offset'])
+
+    def test_rebuild_command_indexes_existing_books(self):
+        book = Book.objects.create(title='未索引的書', author='作者', isbn='9780000000999')
+        self.assertEqual(self.client.get(reverse('api_book_search'), {'q': '未索引'}).json()['books'], [])
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        books = self.client.get(reverse('api_book_search'), {'q': '未索引'}).json()['books']
+        self.assertEqual([b['id'] for b in books], [book.id])
+
+
+class ExportApiTest(TestCase):
+    def read_ndjson(self, response):
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_books_export_streams_one_row_per_line(self):
+        for i in range(3):
+            Book.objects.create(title=f'書{i}', author='作者', isbn=str(i))
+        rows = self.read_ndjson(self.client.get(reverse('api_export_books')))
+        self.assertEqual([row['title'] for row in rows], ['書0', '書1', '書2'])
+        self.assertIn('updated_at', rows[0])
+
+    def test_updated_since_filter(self):
+        old = Book.objects.create(title='舊書', author='作者', isbn='1')
+        Book.objects.filter(id=old.id).update(updated_at=timezone.now() - timedelta(days=3))
+        Book.objects.create(title='新書', author='作者', isbn='2')
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        rows = self.read_ndjson(self.client.get(reverse('api_export_books'), {'updated_since': since}))
+        self.assertEqual([row['title'] for row in rows], ['新書'])
+        self.assertEqual(self.client.get(reverse('api_export_books'), {'updated_since': 'yesterday'}).status_code, 400)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        await Book.objects.acreate(title='書', author='作者', isbn='1')
+        response = await self.async_client.get(reverse('api_export_books'))
+        # 同步產生器在 ASGI 下會被整個讀入記憶體後才傳送
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual([json.loads(line)['title'] for line in body.splitlines()], ['書'])
+
+    def test_borrow_records_export(self):
+        user = User.objects.create(username='reader')
+        book = create_book(title='書', author='作者', isbn='1')
+        record = create_loan(user, book, due_date=timezone.now().date())
+        rows = self.read_ndjson(self.client.get(reverse('api_export_borrow_records')))
+        self.assertEqual([(row['user_id'], row['book_id'], row['copy_id'], row['returned']) for row in rows],
+                         [(user.id, book.id, record.copy_id, False)])
+
+
+class BookImportTest(TestCase):
+    def test_bulk_create_csv_reports_row_errors_and_duplicates(self):
+        Book.objects.create(title='已存在', author='作者', isbn='9780000000001')
+        body = (
+            'title,author,isbn,category,status\n'
+            '新書一,作者,9780000000002,科學,\n'
+            '新書二,作者,9780000000003,COMPUTER,AVAILABLE\n'
+            '新書三,作者,9780000000004,,\n'
+            '重複,作者,978-0-00-000000-1,,\n'
+            '批內重複,作者,978-0000000004,,\n'
+            '缺作者,,9780000000005,,\n'
+            '錯分類,作者,9780000000006,COOKING,\n'
+        )
+        response = self.client.post(reverse('api_book_bulk_create') + '?batch_size=2', body, content_type='text/csv')
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((data['created'], data['duplicates'], data['error_count']), (3, 2, 2))
+        self.assertEqual([e['line'] for e in data['errors']], [7, 8])
+        self.assertEqual(Book.objects.get(isbn='9780000000002').category, 'SCIENCE')
+        self.assertEqual(self.client.get(reverse('api_book_search'), {'q': '新書二'}).json()['books'][0]['isbn'],
+                         '9780000000003')
+
+    def test_bulk_create_ndjson_and_marc(self):
+        ndjson = '{"title": "A", "author": "B", "isbn": "1"}\nnot json\n'
+        data = self.client.post(reverse('api_book_bulk_create'), ndjson, content_type='application/x-ndjson').json()
+        self.assertEqual((data['created'], data['error_count']), (1, 1))
+
+        marc = '=245  10$a三體 /$c劉慈欣\n=100  1\\$a劉慈欣,\n=020  \\\\$a9787536692930 (平裝)\n\n245 球狀閃電\n100 劉慈欣\n020 9787536692931\n900 小說\n'
+        data = self.client.post(reverse('api_book_bulk_create') + '?format=marc', marc, content_type='text/plain').json()
+        self.assertEqual(data['created'], 2)
+        santi = Book.objects.get(isbn='9787536692930')
+        self.assertEqual((santi.title, santi.author), ('三體', '劉慈欣'))
+        self.assertEqual(Book.objects.get(isbn='9787536692931').category, 'FICTION')
+
+    def test_import_books_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as f:
+            f.write('title,author,isbn\n書一,作者,1\n書二,作者,2\n書二,作者,2\n')
+        out = io.StringIO()
+        call_command('import_books', f.name, '--batch-size', '1', stdout=out)
+        os.unlink(f.name)
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertIn('新增 2 本，重複 1 本', out.getvalue())
+
+    def test_unknown_format(self):
+        response = self.client.post(reverse('api_book_bulk_create'), 'x', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+
+
+class IsbnLookupTest(TestCase):
+    def test_isbn_is_normalized_and_unique(self):
+        book = Book.objects.create(title='書', author='作者', isbn='978-7-5366-9293-0')
+        self.assertEqual(book.isbn_normalized, '9787536692930')
+        response = self.client.post(reverse('api_book_create'),
+                                    {'title': '另一本', 'author': '作者', 'isbn': '9787536692930'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Book.objects.create(title='另一本', author='作者', isbn='978 7536692930')
+        # 空白 ISBN 不受唯一限制
+        Book.objects.create(title='無 ISBN 一', author='作者', isbn='')
+        Book.objects.create(title='無 ISBN 二', author='作者', isbn='')
+
+    def test_lookup_by_any_isbn_form(self):
+        book = Book.objects.create(title='書', author='作者', isbn='9787536692930')
+        response = self.client.get('/api/books/isbn/978-7-5366-9293-0/')
+        self.assertEqual(response.json()['book']['id'], book.id)
+        response = self.client.get(reverse('api_book_detail', args=['978-7536692930']))
+        self.assertEqual(response.json()['book']['id'], book.id)
+
+    def test_resolve_batch_in_input_order(self):
+        isbn13 = Book.objects.create(title='三體', author='劉慈欣', isbn='978-7-5366-9293-0')
+        isbn10 = Book.objects.create(title='Data', author='Author', isbn='0-306-40615-2')
+        items = ['9780306406157', 'missing', isbn13.id, '7536692935', 999999]
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('api_book_resolve'), {'items': items},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([r['input'] for r in data['results']], items)
+        self.assertEqual([r['book']['id'] if r['found'] else None for r in data['results']],
+                         [isbn10.id, None, isbn13.id, isbn13.id, None])
+        self.assertEqual((data['found'], data['missing']), (3, 2))
+        response = self.client.post(reverse('api_book_resolve'), {'items': 'x'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class LoanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        self.book = create_book(title='書', author='作者', isbn='1')
+
+    def borrow(self, user=None):
+        return self.client.post(reverse('api_borrow_book', args=[self.book.id]), headers=auth(user or self.user))
+
+    def test_borrow_and_return(self):
+        self.assertEqual(self.borrow().status_code, 200)
+        self.assertEqual(self.borrow().json()['message'], '此書已被借出')
+        record = BorrowRecord.objects.get(book=self.book, returned=False)
+        self.assertEqual(self.client.post(reverse('api_return_book', args=[record.id])).status_code, 200)
+        self.assertEqual(self.client.post(reverse('api_return_book', args=[record.id])).status_code, 409)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_count, 1)
+        self.assertFalse(Copy.objects.get(book=self.book).is_borrowed)
+
+    def test_return_by_book_and_user_restores_availability(self):
+        Book.objects.filter(id=self.book.id).update(status='UNDER_REPAIR')
+        self.assertEqual(self.borrow().status_code, 409)
+        Book.objects.filter(id=self.book.id).update(status='AVAILABLE')
+        self.borrow()
+        response = self.client.post(reverse('api_return_book_by_book_and_user'), {'book_id': self.book.id},
+                                    content_type='application/json', headers=auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_count, 1)
+        self.assertEqual(self.borrow().status_code, 200)
+
+    def test_one_open_loan_per_copy_constraint(self):
+        create_loan(self.user, self.book, due_date=timezone.now().date())
+        other = User.objects.create(username='other')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            create_loan(other, self.book, due_date=timezone.now().date())
+        # 可借冊數與紀錄不一致時，仍由限制擋下
+        self.assertEqual(self.borrow(other).json()['message'], '此書已被借出')
+        self.assertEqual(Book.objects.get(id=self.book.id).available_count, 1)
+
+
+class InventoryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'reader{i}') for i in range(3)]
+        self.book = create_book(copies=2, title='書', author='作者', isbn='1')
+
+    def counts(self):
+        self.book.refresh_from_db()
+        return self.book.total_count, self.book.available_count
+
+    def test_copies_are_borrowed_until_none_available(self):
+        first = loans.borrow_book(self.users[0].id, self.book.id)
+        with self.assertRaises(loans.LoanError) as raised:
+            loans.borrow_book(self.users[0].id, self.book.id)
+        self.assertEqual(raised.exception.message, '您已借閱此書且尚未歸還')
+        second = loans.borrow_book(self.users[1].id, self.book.id)
+        self.assertNotEqual(first.copy_id, second.copy_id)
+        self.assertEqual(self.counts(), (2, 0))
+        with self.assertRaises(loans.LoanError) as raised:
+            loans.borrow_book(self.users[2].id, self.book.id)
+        self.assertEqual(raised.exception.message, '此書已被借出')
+        loans.return_record(first)
+        self.assertEqual(self.counts(), (2, 1))
+        self.assertEqual(loans.borrow_book(self.users[2].id, self.book.id).copy_id, first.copy_id)
+
+    def test_damaged_copy_stays_unavailable_after_return(self):
+        record = loans.borrow_book(self.users[0].id, self.book.id)
+        barcode = Copy.objects.get(id=record.copy_id).barcode
+        response = self.client.put(reverse('api_update_copy_status', args=[barcode]), {'status': 'DAMAGED'},
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(), (2, 1))
+        loans.return_books(record_ids=[record.id])
+        self.assertEqual(self.counts(), (2, 1))
+        self.client.put(reverse('api_update_copy_status', args=[barcode]), {'status': 'AVAILABLE'},
+                        content_type='application/json')
+        self.assertEqual(self.counts(), (2, 2))
+        self.assertEqual(self.client.put(reverse('api_update_copy_status', args=['nope']), {'status': 'LOST'},
+                                         content_type='application/json').status_code, 404)
+
+    def test_copies_api_and_create_with_barcodes(self):
+        url = reverse('api_book_copies', args=[self.book.id])
+        response = self.client.post(url, {'copies': 1}, content_type='application/json')
+        self.assertEqual(response.json()['barcodes'], [f'{self.book.id}-3'])
+        self.assertEqual(self.client.post(url, {'barcodes': ['1-1']}, content_type='application/json').status_code, 409)
+        data = self.client.get(url).json()
+        self.assertEqual((data['total_count'], data['available_count'], len(data['copies'])), (3, 3, 3))
+
+        response = self.client.post(reverse('api_book_create'), {
+            'title': '新書', 'author': '作者', 'isbn': '2', 'barcodes': ['A-1', 'A-2'],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        book = Book.objects.get(id=response.json()['book_id'])
+        self.assertEqual((book.total_count, book.available_count), (2, 2))
+        response = self.client.post(reverse('api_book_create'), {
+            'title': '重複條碼', 'author': '作者', 'isbn': '3', 'barcodes': ['A-1'],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Book.objects.filter(isbn='3').exists())
+
+    def test_import_copies_and_recount(self):
+        self.client.post(reverse('api_book_bulk_create'), 'title,author,isbn,copies\nA,B,2,3\nC,D,3,\n',
+                         content_type='text/csv')
+        counts = dict(Book.objects.filter(isbn__in=['2', '3']).values_list('isbn', 'total_count'))
+        self.assertEqual(counts, {'2': 3, '3': 1})
+        self.assertEqual(Copy.objects.filter(book__isbn='2').count(), 3)
+
+        Book.objects.filter(id=self.book.id).update(total_count=5, available_count=0)
+        out = io.StringIO()
+        call_command('recount_copies', stdout=out)
+        self.assertIn('修正 1 本書籍', out.getvalue())
+        self.assertEqual(self.counts(), (2, 2))
+
+
+class HoldTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(username=f'reader{i}') for i in range(4)]
+        self.book = create_book(title='熱門書', author='作者', isbn='1')
+        self.record = loans.borrow_book(self.users[0].id, self.book.id)
+
+    def place(self, user, **payload):
+        return self.client.post(reverse('api_book_holds', args=[self.book.id]), payload,
+                                content_type='application/json', headers=auth(user))
+
+    def test_queue_order_and_allocation_on_return(self):
+        self.assertEqual(self.place(self.users[0]).json()['message'], '您已借閱此書且尚未歸還')
+        first = self.place(self.users[1]).json()['hold_id']
+        self.place(self.users[2])
+        # 讀者不能指定優先順序插隊
+        last = self.place(self.users[3], priority=100).json()['hold_id']
+        self.assertEqual(Hold.objects.get(id=last).priority, 0)
+        self.assertEqual(self.place(self.users[1]).json()['message'], '您已預約此書')
+        url = reverse('api_book_holds', args=[self.book.id])
+        self.assertEqual(self.client.get(url).status_code, 401)
+        queue = self.client.get(url, headers=auth(self.users[3])).json()
+        self.assertEqual((queue['hold_count'], queue['hold']['position']), (3, 3))
+        self.assertNotIn('user_id', queue['hold'])
+        self.assertIsNone(self.client.get(url, headers=auth(self.users[0])).json()['hold'])
+
+        self.client.post(reverse('api_return_book', args=[self.record.id]))
+        hold = Hold.objects.get(id=first)
+        self.assertEqual(hold.status, 'READY')
+        self.assertEqual(self.client.get(url, headers=auth(self.users[1])).json()['hold']['barcode'], hold.copy.barcode)
+        self.assertEqual(self.client.get(url, headers=auth(self.users[3])).json()['hold']['position'], 2)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_count, self.book.hold_count), (0, 2))
+        # 保留的複本只有預約者可以借出
+        with self.assertRaises(loans.LoanError):
+            loans.borrow_book(self.users[3].id, self.book.id)
+        record = loans.borrow_book(self.users[1].id, self.book.id)
+        self.assertEqual(record.copy_id, hold.copy_id)
+        self.assertEqual(Hold.objects.get(id=first).status, 'FULFILLED')
+        self.assertFalse(Copy.objects.get(id=hold.copy_id).is_held)
+
+    def test_cancel_and_sweep_pass_the_copy_down_the_queue(self):
+        first = holds.place_hold(self.users[1].id, self.book.id)
+        second = holds.place_hold(self.users[2].id, self.book.id)
+        loans.return_record(self.record)
+        cancel = reverse('api_cancel_hold', args=[first.id])
+        self.assertEqual(self.client.delete(cancel, headers=auth(self.users[2])).status_code, 403)
+        self.assertEqual(self.client.delete(cancel, headers=auth(self.users[1])).status_code, 200)
+        self.assertEqual(Hold.objects.get(id=second.id).status, 'READY')
+        self.assertEqual(self.client.delete(cancel, headers=auth(self.users[1])).status_code, 409)
+
+        result = holds.sweep(now=timezone.now() + holds.PICKUP_PERIOD + timedelta(days=1), batch_size=1)
+        self.assertEqual((result.expired, result.finished), (1, True))
+        self.assertEqual(Hold.objects.get(id=second.id).status, 'EXPIRED')
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.available_count, self.book.hold_count), (1, 0))
+        self.assertEqual(inventory.recount(), 0)
+
+    def test_allocation_cost_does_not_grow_with_queue(self):
+        other = create_book(title='冷門書', author='作者', isbn='2')
+        quiet = loans.borrow_book(self.users[0].id, other.id)
+        holds.place_hold(self.users[1].id, other.id)
+        for i in range(50):
+            holds.place_hold(User.objects.create(username=f'waiting{i}').id, self.book.id)
+        with CaptureQueriesContext(connection) as short_queue:
+            loans.return_record(quiet)
+        with CaptureQueriesContext(connection) as long_queue:
+            loans.return_record(self.record)
+        self.assertEqual(len(long_queue), len(short_queue))
+        self.assertEqual(Book.objects.get(id=self.book.id).hold_count, 49)
+
+    def test_damaged_held_copy_requeues_the_hold(self):
+        hold = holds.place_hold(self.users[1].id, self.book.id)
+        loans.return_record(self.record)
+        barcode = Copy.objects.get(id=Hold.objects.get(id=hold.id).copy_id).barcode
+        inventory.set_copy_status(barcode, 'DAMAGED')
+        self.assertEqual(Hold.objects.get(id=hold.id).status, 'WAITING')
+        inventory.add_copies(self.book.id)
+        hold.refresh_from_db()
+        self.assertEqual((hold.status, hold.copy.barcode), ('READY', f'{self.book.id}-2'))
+        self.assertEqual(inventory.recount(), 0)
+
+
+class BulkLoanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        self.books = [create_book(title=f'書{i}', author='作者', isbn=str(i)) for i in range(5)]
+        self.ids = [book.id for book in self.books]
+        self.headers = auth(self.user)
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), payload, content_type='application/json', headers=self.headers)
+
+    def test_bulk_borrow_is_all_or_nothing(self):
+        Book.objects.filter(id=self.ids[2]).update(status='UNDER_REPAIR')
+        response = self.post('api_bulk_borrow', {'book_ids': self.ids + [999999]})
+        self.assertEqual(response.status_code, 409)
+        data = response.json()
+        self.assertFalse(data['committed'])
+        self.assertEqual([item['ok'] for item in data['results']], [True, True, False, True, True, False])
+        self.assertEqual(data['results'][5]['status'], 404)
+        self.assertFalse(BorrowRecord.objects.exists())
+        self.assertFalse(Book.objects.filter(available_count=0).exists())
+
+        response = self.post('api_bulk_borrow', {'book_ids': self.ids, 'partial': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['succeeded'], 4)
+        self.assertEqual(BorrowRecord.objects.filter(user=self.user, returned=False).count(), 4)
+
+    def test_bulk_borrow_reports_books_already_borrowed(self):
+        loans.borrow_book(self.user.id, self.ids[1])
+        response = self.post('api_bulk_borrow', {'book_ids': self.ids[:3]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([item['ok'] for item in response.json()['results']], [True, False, True])
+        self.assertEqual(response.json()['results'][1]['error'], '您已借閱此書且尚未歸還')
+
+        response = self.post('api_bulk_borrow', {'book_ids': self.ids[:3], 'partial': True})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['succeeded'], 2)
+        self.assertEqual(BorrowRecord.objects.filter(user=self.user, returned=False).count(), 3)
+
+    def test_bulk_borrow_and_return_use_constant_queries(self):
+        with self.assertNumQueries(15):
+            response = self.post('api_bulk_borrow', {'book_ids': self.ids})
+        self.assertEqual(response.json()['succeeded'], 5)
+        self.assertEqual(Book.objects.filter(available_count=0).count(), 5)
+        Copy.objects.filter(book_id=self.ids[0]).update(status='DAMAGED')
+
+        with self.assertNumQueries(12):
+            response = self.post('api_bulk_return', {'book_ids': self.ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(item['ok'] for item in response.json()['results']))
+        self.assertFalse(BorrowRecord.objects.filter(returned=False).exists())
+        self.assertEqual(Copy.objects.get(book_id=self.ids[0]).status, 'DAMAGED')
+        self.assertEqual(Book.objects.get(id=self.ids[0]).available_count, 0)
+        self.assertEqual(Book.objects.filter(available_count=1).count(), 4)
+        self.assertFalse(Copy.objects.filter(is_borrowed=True).exists())
+
+        record = BorrowRecord.objects.first()
+        response = self.post('api_bulk_return', {'record_ids': [record.id]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['results'][0]['error'], '此書已歸還')
+
+    def test_non_object_body_is_rejected(self):
+        for name in ('api_bulk_borrow', 'api_bulk_return'):
+            self.assertEqual(self.post(name, [self.ids[0]]).status_code, 400)
+            self.assertEqual(self.post(name, '"book_ids"').status_code, 400)
+        self.assertFalse(BorrowRecord.objects.exists())
+
+    def test_desk_return_of_multi_copy_title_needs_barcode(self):
+        book = create_book(copies=2, title='多冊', author='作者', isbn='multi')
+        other = User.objects.create(username='other')
+        first = loans.borrow_book(self.user.id, book.id)
+        second = loans.borrow_book(other.id, book.id)
+        self.headers = {}
+        response = self.post('api_bulk_return', {'book_ids': [book.id]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['results'][0]['status'], 409)
+        self.assertEqual(BorrowRecord.objects.filter(returned=False).count(), 2)
+
+        response = self.post('api_bulk_return', {'barcodes': [first.copy.barcode]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['record_id'], first.id)
+        self.assertEqual(list(BorrowRecord.objects.filter(returned=False)), [second])
+        # 無效或已過期的權杖不會被當成櫃台還書
+        for header in ('Bearer invalid', auth(other)['Authorization'] + 'x'):
+            self.headers = {'Authorization': header}
+            response = self.post('api_bulk_return', {'record_ids': [second.id]})
+            self.assertEqual(response.status_code, 401)
+        self.assertFalse(BorrowRecord.objects.get(id=second.id).returned)
+        # 只剩一筆時可以書籍指定；帶權杖時只歸還自己的借閱
+        self.headers = auth(self.user)
+        self.assertEqual(self.post('api_bulk_return', {'book_ids': [book.id]}).status_code, 409)
+        self.headers = auth(other)
+        self.assertEqual(self.post('api_bulk_return', {'book_ids': [book.id]}).status_code, 200)
+
+
+class StatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='reader')
+        self.novel = create_book(title='小說', author='作者', isbn='1', category='FICTION')
+        self.science = create_book(title='科普', author='作者', isbn='2', category='SCIENCE')
+        self.history = create_book(title='歷史', author='作者', isbn='3', category='HISTORY')
+
+    def snapshot(self):
+        daily = sorted(DailyCirculation.objects.values_list('day', 'category', 'loans', 'returns'))
+        books = sorted(BookCirculation.objects.values_list('book_id', 'loans', 'last_borrowed'))
+        return daily, books
+
+    def test_rollups_follow_loans_and_match_backfill(self):
+        record = loans.borrow_book(self.user.id, self.novel.id)
+        loans.return_record(record)
+        loans.borrow_book(self.user.id, self.novel.id)
+        loans.borrow_books(self.user.id, [self.science.id, self.history.id])
+        loans.return_books(book_ids=[self.science.id])
+
+        today = timezone.now().date()
+        self.assertEqual(
+            dict(DailyCirculation.objects.filter(day=today).values_list('category', 'loans')),
+            {'FICTION': 2, 'SCIENCE': 1, 'HISTORY': 1},
+        )
+        self.assertEqual(BookCirculation.objects.get(book=self.novel).loans, 2)
+        incremental = self.snapshot()
+        self.assertEqual(stats.backfill(), (3, 3))
+        self.assertEqual(self.snapshot(), incremental)
+
+        data = self.client.get(reverse('api_stats_summary')).json()
+        self.assertEqual(data['totals'], {'loans': 4, 'returns': 2})
+        self.assertEqual(data['categories'][0]['category'], 'FICTION')
+        self.assertEqual(data['busiest_days'], [{'day': today.isoformat(), 'loans': 4, 'returns': 2}])
+        books = self.client.get(reverse('api_stats_top_books'), {'limit': 1}).json()['books']
+        self.assertEqual([(b['book_id'], b['loans']) for b in books], [(self.novel.id, 2)])
+        response = self.client.get(reverse('api_stats_daily'), {'start': '2020-01-02', 'end': '2020-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_category_edit_does_not_rewrite_history(self):
+        record = loans.borrow_book(self.user.id, self.novel.id)
+        Book.objects.filter(id=self.novel.id).update(category='HISTORY')
+        loans.return_books(record_ids=[record.id])
+        today = timezone.now().date()
+        self.assertEqual(
+            list(DailyCirculation.objects.filter(day=today).values_list('category', 'loans', 'returns')),
+            [('FICTION', 1, 1)],
+        )
+        incremental = self.snapshot()
+        stats.backfill()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_overdue_list_pages_by_due_date(self):
+        today = timezone.now().date()
+        for days, book in ((3, self.science), (10, self.novel), (1, self.history)):
+            create_loan(self.user, book, due_date=today - timedelta(days=days))
+        url = reverse('api_stats_overdue')
+        first = self.client.get(url, {'limit': 2}).json()
+        self.assertEqual([r['days_overdue'] for r in first['records']], [10, 3])
+        second = self.client.get(url, {'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([r['book_id'] for r in second['records']], [self.history.id])
+        self.assertIsNone(second['next_cursor'])
+
+
+class OverdueSweepTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='reader', email='reader@example.com')
+        today = timezone.now().date()
+        for i, days in enumerate([5, -3, 1, 30, 2]):
+            book = create_book(title=f'書{i}', author='作者', isbn=str(i))
+            create_loan(self.user, book, due_date=today - timedelta(days=days))
+        # 已歸還的逾期借閱不需要通知
+        BorrowRecord.objects.filter(book__isbn='4').update(returned=True)
+
+    def test_sweep_is_chunked_idempotent_and_writes_outbox(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'outbox.ndjson')
+            out = io.StringIO()
+            call_command('sweep_overdue', '--batch-size', '2', '--outbox', path, stdout=out)
+            self.assertIn('已建立 3 筆逾期通知 (2 批)', out.getvalue())
+            with open(path, encoding='utf-8') as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual([line['days_overdue'] for line in lines], [30, 5, 1])
+        self.assertEqual(lines[0]['email'], 'reader@example.com')
+        self.assertFalse(OverdueNotice.objects.filter(sent_at__isnull=True).exists())
+
+        result = overdue.sweep(batch_size=2)
+        self.assertEqual((result.created, result.finished), (0, True))
+        self.assertEqual(OverdueNotice.objects.count(), 3)
+
+    def test_time_budget_stops_between_batches(self):
+        result = overdue.sweep(batch_size=1, max_seconds=0)
+        self.assertEqual((result.created, result.finished), (0, False))
+        result = overdue.sweep(batch_size=1)
+        self.assertEqual((result.created, result.batches, result.finished), (3, 3, True))
+        self.assertTrue(OverdueNotice.objects.filter(sent_at__isnull=True).exists())
+
+
+class ConcurrentBorrowTest(TransactionTestCase):
+    THREADS = 16
+
+    def test_many_threads_borrowing_one_book(self):
+        book = create_book(title='熱門書', author='作者', isbn='1')
+        users = [User.objects.create(username=f'reader{i}') for i in range(self.THREADS)]
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+
+        def attempt(user):
+            try:
+                barrier.wait()
+                for _ in range(20):
+                    try:
+                        loans.borrow_book(user.id, book.id)
+                        results.append('ok')
+                    except loans.LoanError:
+                        results.append('conflict')
+                    except OperationalError:
+                        # SQLite 寫入鎖競爭，視為失敗的嘗試
+                        results.append('locked')
+                        continue
+                    break
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('ok'), 1)
+        self.assertEqual(BorrowRecord.objects.filter(book=book, returned=False).count(), 1)
+
+
+class UserHomeApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader')
+        today = timezone.now().date()
+        for i in range(5):
+            book = create_book(title=f'書{i}', author='作者', isbn=str(i))
+            create_loan(self.user, book, due_date=today + timedelta(days=30))
+        records = list(BorrowRecord.objects.order_by('id'))
+        # 書0 已歸還且逾期、書1 已準時歸還、書2 未歸還且逾期
+        BorrowRecord.objects.filter(id=records[0].id).update(
+            borrow_date=today - timedelta(days=90), due_date=today - timedelta(days=30),
+            returned=True, return_date=today - timedelta(days=10))
+        BorrowRecord.objects.filter(id=records[1].id).update(
+            borrow_date=today - timedelta(days=80), returned=True, return_date=today - timedelta(days=70))
+        BorrowRecord.objects.filter(id=records[2].id).update(
+            borrow_date=today - timedelta(days=70), due_date=today - timedelta(days=1))
+        self.headers = auth(self.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('api_user_home'), params, headers=self.headers).json()
+
+    def test_summary_and_paginated_history(self):
+        data = self.get(limit=2)
+        self.assertEqual(data['counts'], {'total_loans': 5, 'open_loans': 3, 'overdue_loans': 1})
+        self.assertEqual([(b['book_title'], b['is_overdue']) for b in data['borrowed_books']][0], ('書2', True))
+        history = data['all_records']
+        while data['next_cursor']:
+            data = self.get(limit=2, cursor=data['next_cursor'])
+            history += data['all_records']
+        self.assertEqual([(r['book_title'], r['is_overdue']) for r in history],
+                         [('書4', False), ('書3', False), ('書2', True), ('書1', False), ('書0', True)])
+
+    def test_cached_summary_is_invalidated_on_borrow_and_return(self):
+        # 摘要 (統計與目前借閱) 一次查詢，借閱歷史一頁一次查詢
+        with self.assertNumQueries(2):
+            self.get()
+        with self.assertNumQueries(1):
+            self.get()
+        book = create_book(title='新書', author='作者', isbn='new')
+        with self.captureOnCommitCallbacks(execute=True):
+            record = loans.borrow_book(self.user.id, book.id)
+        self.assertEqual(self.get()['counts']['open_loans'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            loans.return_record(record)
+        self.assertEqual(self.get()['counts']['open_loans'], 3)
+
+    def test_requires_token(self):
+        response = self.client.get(reverse('api_user_home'), {'user_id': self.user.id})
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Bearer'))
+
+
+class AuthTokenTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ratelimit.local_buckets.reset()
+        self.user = User.objects.create(username='reader', password=make_password('secret'))
+
+    def login(self):
+        response = self.client.post(reverse('api_login'), {'username': 'reader', 'password': 'secret'},
+                                    content_type='application/json')
+        return {'Authorization': f'Bearer {response.json()["token"]}'}
+
+    def home(self, headers):
+        return self.client.get(reverse('api_user_home'), headers=headers)
+
+    def test_token_is_checked_without_user_query(self):
+        headers = self.login()
+        tokens.active_tokens.clear()
+        for expected in (1, 0):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.home(headers).json()['username'], 'reader')
+            tables = [query['sql'] for query in queries]
+            self.assertEqual(sum('libmanage_authtoken' in sql for sql in tables), expected)
+            self.assertFalse(any('auth_user' in sql for sql in tables))
+
+    def test_logout_and_password_change_revoke_tokens(self):
+        phone, laptop = self.login(), self.login()
+        response = self.client.post(reverse('api_update_profile'), {'new_password': 'changed'},
+                                    content_type='application/json', headers=phone)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.home(laptop).status_code, 401)
+        self.assertEqual(self.home(phone).status_code, 200)
+        self.client.post(reverse('api_logout'), headers=phone)
+        self.assertEqual(self.home(phone).status_code, 401)
+        # 其他工作行程沒有記錄時由資料表確認
+        tokens.active_tokens.clear()
+        self.assertEqual(self.home(phone).status_code, 401)
+        self.assertEqual(AuthToken.objects.filter(revoked_at__isnull=True).count(), 0)
+
+    def test_tampered_and_expired_tokens(self):
+        headers = self.login()
+        self.assertEqual(self.home({'Authorization': headers['Authorization'] + 'x'}).status_code, 401)
+        with override_settings(TOKEN_MAX_AGE=-1):
+            self.assertEqual(self.home(headers).status_code, 401)
+        AuthToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('clear_tokens', stdout=io.StringIO())
+        self.assertFalse(AuthToken.objects.exists())
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000, PASSWORD_WORKERS=2, PASSWORD_MAX_PENDING=2)
+class PasswordHashingTest(TestCase):
+    def setUp(self):
+        ratelimit.local_buckets.reset()
+
+    def login(self, password='secret'):
+        return self.client.post(reverse('api_login'), {'username': 'reader', 'password': password},
+                                content_type='application/json')
+
+    def stored(self):
+        return User.objects.get(username='reader').password
+
+    def test_register_and_rehash_on_login_after_cost_change(self):
+        response = self.client.post(reverse('api_register'), {'username': 'reader', 'password': 'secret'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.stored().startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(self.login('wrong').status_code, 401)
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(self.login().status_code, 200)
+            upgraded = self.stored()
+            self.assertTrue(upgraded.startswith('pbkdf2_sha256$2000$'))
+            self.login()
+            self.assertEqual(self.stored(), upgraded)
+
+    @override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10)
+    def test_other_algorithms_are_upgraded_to_the_default(self):
+        User.objects.create(username='reader', password=make_password('secret', hasher='scrypt'))
+        self.assertEqual(self.login().status_code, 200)
+        self.assertTrue(self.stored().startswith('pbkdf2_sha256$1000$'))
+
+    def test_full_pool_sheds_logins(self):
+        User.objects.create(username='reader', password=make_password('secret'))
+        release = threading.Event()
+        pool = passwords.get_pool()
+        blocked = [pool._submit(release.wait) for _ in range(2)]
+        try:
+            response = self.login()
+            self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        finally:
+            release.set()
+        for future in blocked:
+            future.result(timeout=5)
+        self.assertEqual(self.login().status_code, 200)
+
+
+@override_settings(
+    RATE_LIMITS={
+        'api_login': {'ip': '5/m', 'account': '2/m'},
+        'api_book_by_isbn': {'resource': '2/m'},
+        'api_user_home': {'user': '1/h'},
+    },
+    CONCURRENCY_LIMITS={'api_book_search': 1},
+)
+class RateLimitTest(TestCase):
+    def setUp(self):
+        ratelimit.local_buckets.reset()
+        self.user = User.objects.create(username='reader', password=make_password('secret'))
+
+    def login(self, username='reader', **extra):
+        return self.client.post(reverse('api_login'), {'username': username, 'password': 'wrong'},
+                                content_type='application/json', **extra)
+
+    def test_resource_limit_is_per_path(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/books/isbn/9787536692930/').status_code, 404)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/books/isbn/9787536692930/')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 30)
+        self.assertEqual(self.client.get('/api/books/isbn/9780000000001/').status_code, 404)
+
+    def test_throttled_response_is_readable_cross_origin(self):
+        origin = {'HTTP_ORIGIN': 'http://localhost:3000'}
+        for _ in range(2):
+            self.client.get('/api/books/isbn/9787536692930/', **origin)
+        response = self.client.get('/api/books/isbn/9787536692930/', **origin)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Access-Control-Allow-Origin'], 'http://localhost:3000')
+        self.assertIn('Retry-After', response['Access-Control-Expose-Headers'])
+
+    def test_login_limits_per_account_and_ip(self):
+        self.assertEqual([self.login().status_code for _ in range(5)], [401, 401, 429, 429, 429])
+        # 被帳號額度拒絕的請求不消耗 IP 的額度 (5/m)
+        self.assertEqual([self.login(name).status_code for name in 'abcd'], [401, 401, 401, 429])
+        # 經由信任的代理時以 X-Forwarded-For 區分用戶端
+        with override_settings(RATE_LIMIT_TRUSTED_PROXIES=['10.0.0.0/8']):
+            self.assertEqual(self.login('e').status_code, 429)
+            forwarded = {'REMOTE_ADDR': '10.0.0.2', 'HTTP_X_FORWARDED_FOR': '1.2.3.4, 192.0.2.1'}
+            self.assertEqual(self.login('e', **forwarded).status_code, 401)
+
+    def test_user_limit_uses_token(self):
+        self.assertEqual(self.client.get(reverse('api_user_home'), headers=auth(self.user)).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api_user_home'), headers=auth(self.user)).status_code, 429)
+        other = User.objects.create(username='other')
+        self.assertEqual(self.client.get(reverse('api_user_home'), headers=auth(other)).status_code, 200)
+
+    def test_concurrency_limit_sheds_requests(self):
+        from .middleware import RateLimitMiddleware
+
+        middleware = RateLimitMiddleware(lambda request: self.fail('view should not run'))
+        middleware.slots['api_book_search'].acquire()
+        request = self.client.get(reverse('api_book_list')).wsgi_request
+        request.path_info = reverse('api_book_search')
+        response = middleware(request)
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+        self.assertEqual(self.client.get(reverse('api_book_search'), {'q': '書'}).status_code, 200)
+
+    @override_settings(CONCURRENCY_LIMITS={'api_export_books': 1})
+    def test_streaming_response_holds_slot_until_closed(self):
+        from .middleware import RateLimitMiddleware
+
+        middleware = RateLimitMiddleware(lambda request: StreamingHttpResponse(iter(['a', 'b'])))
+        request = self.client.get(reverse('api_export_books')).wsgi_request
+        response = middleware(request)
+        self.assertEqual(middleware(request).status_code, 503)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        response.close()
+        response.close()
+        slot = middleware.slots['api_export_books']
+        self.assertTrue(slot.acquire(blocking=False))
+        self.assertFalse(slot.acquire(blocking=False))
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual([self.login().status_code for _ in range(3)], [401, 401, 401])
+
+
+class BookCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = create_book(title='書', author='作者', isbn='978-7-5366-9293-0')
+
+    def test_detail_and_isbn_lookups_are_read_through(self):
+        url = reverse('api_book_detail', args=[self.book.id])
+        self.client.get(url)
+        self.client.get('/api/books/isbn/9787536692930/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['book']['title'], '書')
+            self.assertEqual(self.client.get('/api/books/isbn/978-7536692930/').json()['book']['id'], self.book.id)
+
+    def test_late_write_of_a_read_from_before_the_commit_is_ignored(self):
+        # 讀取資料庫時取得的世代與資料 (寫入提交之前)
+        generation = cache.get(caching.generation_key(self.book.id))
+        stale = Book.objects.filter(id=self.book.id).values(*caching.BOOK_CACHE_FIELDS).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(id=self.book.id).update(status='DAMAGED')
+            caching.invalidate_book(self.book.id)
+        # 失效之後才寫回快取
+        cache.set(caching.book_key(self.book.id), (generation, stale))
+        book = async_to_sync(caching.aget_book)(book_id=self.book.id)
+        self.assertEqual(book['status'], 'DAMAGED')
+
+    def test_timeout_follows_settings(self):
+        url = reverse('api_book_detail', args=[self.book.id])
+        with override_settings(BOOK_CACHE_TIMEOUT=0):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+        self.assertTrue(queries.captured_queries)
+
+    def test_conditional_get_returns_304_without_queries(self):
+        url = reverse('api_book_detail', args=[self.book.id])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_writes_invalidate_cache(self):
+        url = reverse('api_book_detail', args=[self.book.id])
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('api_update_book_status', args=[self.book.id]), {'status': 'DAMAGED'},
+                            content_type='application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['book']['status'], 'DAMAGED')
+
+        user = User.objects.create(username='reader')
+        Book.objects.filter(id=self.book.id).update(status='AVAILABLE')
+        cache.clear()
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            record = loans.borrow_book(user.id, self.book.id)
+        self.assertEqual(self.client.get(url).json()['book']['available_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            loans.return_record(record)
+        self.assertEqual(self.client.get(url).json()['book']['available_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('api_book_delete', args=[self.book.id]))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class CatalogVersionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = create_book(title='書', author='作者', isbn='1')
+
+    def test_every_book_write_bumps_the_version(self):
+        version = CatalogVersion.current()
+        self.assertEqual(self.book.catalog_version, version)
+        self.client.put(reverse('api_update_book_status', args=[self.book.id]), {'status': 'DAMAGED'},
+                        content_type='application/json')
+        self.assertEqual(CatalogVersion.current(), version + 1)
+        Book.objects.filter(id=self.book.id).update(status='AVAILABLE')
+        record = loans.borrow_book(User.objects.create(username='reader').id, self.book.id)
+        loans.return_record(record)
+        self.client.post(reverse('api_book_bulk_create'), 'title,author,isbn\nA,B,2\nC,D,3\n', content_type='text/csv')
+        self.assertEqual(CatalogVersion.current(), version + 4)
+        self.assertEqual(set(Book.objects.filter(isbn__in=['2', '3']).values_list('catalog_version', flat=True)),
+                         {version + 4})
+
+    def test_book_list_honors_if_none_match(self):
+        url = reverse('api_book_list')
+        response = self.client.get(url, {'limit': 10})
+        etag = response['ETag']
+        self.assertEqual(etag, f'"catalog-{CatalogVersion.current()}"')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, {'limit': 10}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Book.objects.create(title='新書', author='作者', isbn='2')
+        response = self.client.get(url, {'limit': 10}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['books']), 2)
+
+    def test_book_detail_etag_follows_book_version(self):
+        url = reverse('api_book_detail', args=[self.book.id])
+        etag = self.client.get(url)['ETag']
+        Book.objects.create(title='其他書', author='作者', isbn='2')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class BookChangesApiTest(TestCase):
+    def sync(self, since, limit=2):
+        data = self.client.get(reverse('api_book_changes'), {'since': since, 'limit': limit}).json()
+        changes = data['changes']
+        while data['next_cursor']:
+            data = self.client.get(reverse('api_book_changes'), {'cursor': data['next_cursor'], 'limit': limit}).json()
+            changes += data['changes']
+        return changes, data['version']
+
+    def test_delta_sync_returns_upserts_and_tombstones(self):
+        first = Book.objects.create(title='書一', author='作者', isbn='1')
+        second = Book.objects.create(title='書二', author='作者', isbn='2')
+        changes, version = self.sync(0)
+        self.assertEqual([c['book']['id'] for c in changes], [first.id, second.id])
+
+        # 同一批匯入共用一個版本號，分頁時不可遺漏
+        self.client.post(reverse('api_book_bulk_create'), 'title,author,isbn\nA,B,3\nC,D,4\nE,F,5\n', content_type='text/csv')
+        second.title = '書二 (修訂)'
+        second.save()
+        first_id = first.id
+        first.delete()
+        changes, new_version = self.sync(version, limit=2)
+        self.assertEqual([c['op'] for c in changes], ['upsert'] * 4 + ['delete'])
+        self.assertEqual(changes[3]['book']['title'], '書二 (修訂)')
+        self.assertEqual(changes[4]['id'], first_id)
+        self.assertEqual(self.sync(new_version), ([], new_version))
+
+
+def scanner_available():
+    """OpenCV、pyzbar 與 libzbar 是否可載入 (同 scan_code_api 的判斷)。"""
+    try:
+        from . import scanning  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@skipUnless(scanner_available(), '未安裝 OpenCV 或 libzbar')
+@override_settings(SCAN_WORKERS=0)
+class ScanCodeApiTest(TestCase):
+    def qr_png(self, text, scale=8):
+        import cv2
+        qr = cv2.QRCodeEncoder.create().encode(text)
+        qr = cv2.resize(qr, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        qr = cv2.copyMakeBorder(qr, 40, 40, 40, 40, cv2.BORDER_CONSTANT, value=255)
+        return cv2.imencode('.png', qr)[1].tobytes()
+
+    def test_decodes_qr_code_from_base64(self):
+        image = base64.b64encode(self.qr_png('9787536692930')).decode()
+        response = self.client.post(reverse('api_scan_code'), {'image': f'data:image/png;base64,{image}'},
+                                    content_type='application/json')
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['decoded_text'], '9787536692930')
+        self.assertEqual([s['type'] for s in data['symbols']], ['QRCODE'])
+
+    def test_large_frames_are_downscaled_and_boxes_mapped_back(self):
+        from . import scanning
+        upload = SimpleUploadedFile('frame.png', self.qr_png('hello', scale=60), content_type='image/png')
+        data = self.client.post(reverse('api_scan_code'), {'image': upload}).json()
+        self.assertEqual(data['decoded_text'], 'hello')
+        self.assertGreater(data['bounding_box']['width'], scanning.SCAN_MAX_SIDE / 2)
+
+    def test_json_body_is_validated_before_decoding(self):
+        url = reverse('api_scan_code')
+        self.assertEqual(self.client.post(url, ['image'], content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, {'image': 1}, content_type='application/json').status_code, 400)
+        with override_settings(SCAN_MAX_IMAGE_BYTES=1024):
+            image = base64.b64encode(self.qr_png('9787536692930')).decode()
+            response = self.client.post(url, {'image': image}, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+
+    def test_timed_out_scans_keep_their_slot(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from . import scanning
+
+        release = threading.Event()
+        pool = scanning.ScanPool(1, max_pending=1, timeout=0.01)
+        pool._executor = ThreadPoolExecutor(max_workers=1)
+        with mock.patch.object(scanning, 'decode_image', lambda *args: release.wait()):
+            with self.assertRaises(TimeoutError):
+                pool.decode(b'frame')
+            # 逾時的影像仍在辨識中，不能再排入新的工作
+            with self.assertRaises(scanning.ScannerBusy):
+                pool.decode(b'frame')
+            release.set()
+            pool.shutdown()
+        self.assertTrue(pool._slots.acquire(blocking=False))
+
+    def test_invalid_image(self):
+        response = self.client.post(reverse('api_scan_code'), {'image': base64.b64encode(b'not an image').decode()},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTest(TestCase):
+    async def test_read_views_through_asgi_handler(self):
+        book = await Book.objects.acreate(title='非同步', author='作者', isbn='978-7-5366-9293-0')
+        user = await User.objects.acreate(username='reader')
+        response = await self.async_client.get(reverse('api_book_list'))
+        self.assertEqual([b['id'] for b in response.json()['books']], [book.id])
+        response = await self.async_client.get(reverse('api_book_detail', args=[book.id]))
+        self.assertEqual(response.json()['book']['isbn'], '978-7-5366-9293-0')
+        response = await self.async_client.get('/api/books/isbn/9787536692930/', headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        headers = await sync_to_async(auth)(user)
+        response = await self.async_client.get(reverse('api_user_home'), headers=headers)
+        self.assertEqual(response.json()['counts']['total_loans'], 0)
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.book = Book.objects.create(title='書', author='作者', isbn='1')
+
+    def test_server_timing_and_prometheus_output(self):
+        # async view 的查詢在 sync_to_async 執行緒中執行，仍應計入
+        response = self.client.get(reverse('api_book_detail', args=[self.book.id]))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries"$')
+        response = self.client.get(reverse('api_user_home'))
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+
+        body = self.client.get(reverse('api_metrics')).content.decode()
+        self.assertIn('libmanage_requests_total{endpoint="api_book_detail",method="GET",status="200"} 1', body)
+        self.assertIn('libmanage_request_queries_bucket{endpoint="api_book_detail",le="1"} 1', body)
+        self.assertIn('libmanage_requests_total{endpoint="api_user_home",method="GET",status="401"} 1', body)
+        self.assertEqual(self.client.get(reverse('api_metrics'), REMOTE_ADDR='10.0.0.8').status_code, 404)
+
+    @override_settings(METRICS_SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_endpoint(self):
+        with self.assertLogs('libmanage.metrics', level='WARNING') as logs:
+            self.client.get(reverse('api_book_list'))
+        self.assertIn('in api_book_list: SELECT', logs.output[0])
+
+
+class StartupImportTest(SimpleTestCase):
+    def test_urlconf_does_not_load_imaging_stack(self):
+        # 在全新的行程中載入 URLconf，JSON API 不應匯入 OpenCV / NumPy / pyzbar
+        code = (
+            "import sys, django; django.setup(); import libmanagesystem.urls; "
+            "print(','.join(m for m in ('cv2', 'numpy', 'pyzbar') if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='libmanagesystem.settings')
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), '')
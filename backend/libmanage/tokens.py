@@ -0,0 +1,157 @@
+"""
+登入權杖。
+
+login_api 以 issue 簽發 Bearer 權杖：內容為 {sid, uid, name}，以 django.core.signing
+(HMAC-SHA256，金鑰為 SECRET_KEY) 簽署並帶有簽發時間。驗證 (authenticate) 只檢查簽章與期限，
+用戶 id 與名稱直接取自權杖，不查詢 User。
+
+撤銷記錄在 AuthToken 資料表 (sid 即其 id)。每個工作行程以容量有限的 LRU 記住 sid 是否仍有效
+TOKEN_CHECK_SECONDS 秒，這段時間內同一權杖的請求不查詢資料庫，之後以一次主鍵查詢重新確認；
+已撤銷的 sid 不會恢復，一直記到被 LRU 淘汰為止。撤銷時清除的是執行撤銷的行程自己的記錄，
+其他工作行程最多延遲 TOKEN_CHECK_SECONDS 才會拒絕該權杖。
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import AuthToken
+
+SALT = 'libmanage.tokens'
+
+
+@dataclass(frozen=True)
+class TokenUser:
+    """由權杖取得的用戶，不對應資料庫查詢；sid 為權杖的 AuthToken id。"""
+    id: int
+    username: str
+    sid: int
+
+    is_authenticated = True
+
+
+class ActiveTokens:
+    """sid → (是否有效, 確認時間) 的 LRU，執行緒安全。"""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, sid, ttl):
+        """回傳 True / False，沒有記錄或有效的記錄已超過 ttl 秒時回傳 None。"""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            active, checked_at = entry
+            if active and time.monotonic() - checked_at >= ttl:
+                return None
+            self._entries.move_to_end(sid)
+            return active
+
+    def set(self, sid, active):
+        with self._lock:
+            self._entries[sid] = (active, time.monotonic())
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+active_tokens = ActiveTokens(settings.TOKEN_CACHE_SIZE)
+
+
+def _sign(record, user):
+    active_tokens.set(record.id, True)
+    return signing.dumps({'sid': record.id, 'uid': user.id, 'name': user.username}, salt=SALT)
+
+
+def issue(user):
+    """為用戶簽發權杖，回傳 (權杖, 到期時間)。"""
+    expires_at = timezone.now() + timedelta(seconds=settings.TOKEN_MAX_AGE)
+    record = AuthToken.objects.create(user_id=user.id, expires_at=expires_at)
+    return _sign(record, user), expires_at
+
+
+async def aissue(user):
+    """issue 的 async 版本。"""
+    expires_at = timezone.now() + timedelta(seconds=settings.TOKEN_MAX_AGE)
+    record = await AuthToken.objects.acreate(user_id=user.id, expires_at=expires_at)
+    return _sign(record, user), expires_at
+
+
+def _payload(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        # SignatureExpired 為 BadSignature 的子類別
+        return signing.loads(token.strip(), salt=SALT, max_age=settings.TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+def _user(payload):
+    return TokenUser(id=payload['uid'], username=payload['name'], sid=payload['sid'])
+
+
+def signed_user_id(request):
+    """權杖簽章有效時回傳用戶 id，不檢查是否已撤銷 (供限流等不需查詢資料庫的用途)。"""
+    payload = _payload(request)
+    return payload['uid'] if payload is not None else None
+
+
+def authenticate(request):
+    """驗證請求的 Authorization: Bearer 權杖，回傳 TokenUser；沒有權杖或權杖無效時回傳 None。"""
+    payload = _payload(request)
+    if payload is None:
+        return None
+    active = active_tokens.get(payload['sid'], settings.TOKEN_CHECK_SECONDS)
+    if active is None:
+        active = AuthToken.objects.filter(id=payload['sid'], revoked_at__isnull=True).exists()
+        active_tokens.set(payload['sid'], active)
+    return _user(payload) if active else None
+
+
+async def aauthenticate(request):
+    """authenticate 的 async 版本，供 async views 使用。"""
+    payload = _payload(request)
+    if payload is None:
+        return None
+    active = active_tokens.get(payload['sid'], settings.TOKEN_CHECK_SECONDS)
+    if active is None:
+        active = await AuthToken.objects.filter(id=payload['sid'], revoked_at__isnull=True).aexists()
+        active_tokens.set(payload['sid'], active)
+    return _user(payload) if active else None
+
+
+def revoke(sid):
+    """撤銷一個權杖 (登出)。"""
+    AuthToken.objects.filter(id=sid, revoked_at__isnull=True).update(revoked_at=timezone.now())
+    active_tokens.set(sid, False)
+
+
+def revoke_user(user_id, keep=None):
+    """撤銷用戶所有未過期的權杖 (例如變更密碼後)，keep 為保留的目前權杖 sid，回傳撤銷的數量。"""
+    now = timezone.now()
+    tokens = AuthToken.objects.filter(user_id=user_id, revoked_at__isnull=True, expires_at__gt=now).exclude(id=keep)
+    sids = list(tokens.values_list('id', flat=True))
+    AuthToken.objects.filter(id__in=sids).update(revoked_at=now)
+    for sid in sids:
+        active_tokens.set(sid, False)
+    return len(sids)
+
+
+def clear_expired(now=None):
+    """刪除已過期的權杖記錄 (過期的權杖簽章驗證即會失敗，不再需要撤銷記錄)，回傳刪除的數量。"""
+    deleted, _ = AuthToken.objects.filter(expires_at__lt=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,21 @@
+"""
+API views，依功能拆分為子模組。
+
+條碼辨識 (scan) 以外的模組只依賴 Django，匯入本套件不會載入 OpenCV、NumPy 或 pyzbar。
+"""
+from .accounts import login_api, logout_api, register_api, update_profile_api
+from .catalog import (
+    book_bulk_create_api, book_changes_api, book_create_api, book_delete_api, book_detail_api,
+    book_list_api, book_resolve_api, book_search_api, get_book_by_isbn, update_book_api,
+    update_book_status_api,
+)
+from .circulation import (
+    borrow_book_api, bulk_borrow_api, bulk_return_api, return_book_api,
+    return_book_by_book_and_user_api, user_home_api,
+)
+from .exports import export_books_api, export_borrow_records_api
+from .holds import book_holds_api, cancel_hold_api
+from .inventory import book_copies_api, update_copy_status_api
+from .metrics import metrics_api
+from .scan import scan_code_api
+from .stats import stats_daily_api, stats_overdue_api, stats_summary_api, stats_top_books_api
@@ -0,0 +1,131 @@
+"""
+帳號 API。密碼雜湊在 libmanage.passwords 的執行緒池中計算，
+登入、註冊與修改密碼為 async views，等待雜湊時不佔用事件迴圈或其他 sync views 的執行緒。
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .. import passwords, tokens
+from ..models import User
+from .common import error_response, token_required
+
+def busy_response(message):
+    response = error_response(message, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def login_api(request):
+    try:
+        data = json.loads(request.body)
+        account = data.get('username')
+        password = data.get('password')
+    except json.JSONDecodeError:
+        return error_response('Invalid JSON', status=400)
+
+    if not account or not password:
+        return error_response('請輸入帳號與密碼', status=400)
+
+    user = await User.objects.filter(username=account).only('id', 'username', 'password').afirst()
+    if not user:
+        return error_response('帳號或密碼錯誤', status=401)
+
+    try:
+        valid, upgraded = await passwords.averify(password, user.password)
+    except passwords.HasherBusy as e:
+        return busy_response(str(e))
+    except TimeoutError:
+        return busy_response('登入逾時，請稍後再試')
+    if not valid:
+        return error_response('帳號或密碼錯誤', status=401)
+    if upgraded:
+        # 雜湊的演算法或成本已調整：以新設定寫回，密碼在驗證後被修改時不覆寫
+        await User.objects.filter(id=user.id, password=user.password).aupdate(password=upgraded)
+
+    # 之後的請求以 Authorization: Bearer <token> 識別用戶
+    token, expires_at = await tokens.aissue(user)
+    return JsonResponse({
+        'message': f"歡迎：{user.username}",
+        'user_id': user.id,
+        'username': user.username,
+        'token': token,
+        'token_type': 'Bearer',
+        'expires_at': expires_at,
+    }, status=200)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def register_api(request):
+    try:
+        data = json.loads(request.body)
+        account = data.get('username')
+        password = data.get('password')
+    except json.JSONDecodeError:
+        return error_response('Invalid JSON', status=400)
+
+    if not account or not password:
+        return error_response('請輸入帳號與密碼', status=400)
+
+    if await User.objects.filter(username=account).aexists():
+        return error_response('帳號已存在', status=409)
+
+    try:
+        new_user = await User.objects.acreate(
+            username=account,
+            password=await passwords.ahash_password(password)
+        )
+        return JsonResponse({
+            'message': '註冊成功', 
+            'user_id': new_user.id, 
+            'username': new_user.username}, status=201)
+    except IntegrityError:
+        return error_response('帳號已存在', status=409)
+    except passwords.HasherBusy as e:
+        return busy_response(str(e))
+    except TimeoutError:
+        return busy_response('註冊逾時，請稍後再試')
+    except Exception as e:
+        return error_response(f'註冊失敗：{str(e)}', status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def logout_api(request):
+    user = tokens.authenticate(request)
+    if user is not None:
+        tokens.revoke(user.sid)
+    return JsonResponse({'message': '已登出'}, status=200)
+
+@csrf_exempt
+@require_http_methods(["POST"]) # 這裡可以使用 PUT
+@token_required
+async def update_profile_api(request):
+    try:
+        data = json.loads(request.body)
+        new_password = data.get('new_password')
+    except json.JSONDecodeError:
+        return error_response('Invalid JSON', status=400)
+
+    if not new_password:
+        return error_response('新密碼不可為空', status=400)
+
+    try:
+        user = request.token_user
+        encoded = await passwords.ahash_password(new_password)
+        if not await User.objects.filter(id=user.id).aupdate(password=encoded):
+            return error_response('用戶不存在', status=404)
+        # 其他裝置上的登入隨密碼變更失效，目前的權杖保留
+        await sync_to_async(tokens.revoke_user)(user.id, keep=user.sid)
+
+        return JsonResponse({'message': '密碼更新成功！'}, status=200)
+    except passwords.HasherBusy as e:
+        return busy_response(str(e))
+    except TimeoutError:
+        return busy_response('更新逾時，請稍後再試')
+    except Exception as e:
+        return error_response(f'更新個人資料失敗：{str(e)}', status=500)
@@ -0,0 +1,425 @@
+import codecs
+import csv
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .. import caching, importers, inventory, search
+from ..models import Book, BookTombstone, CatalogVersion, Copy, isbn_variants, normalize_isbn
+from .common import (
+    BOOK_LIST_FIELDS, BOOLEAN_PARAMS, book_etag, catalog_etag, decode_cursor, encode_cursor,
+    error_response, not_modified_response, parse_limit, set_validators,
+)
+
+# 單本書籍回應的欄位
+BOOK_DETAIL_FIELDS = ['id', 'title', 'author', 'isbn', 'total_count', 'available_count', 'category', 'status']
+BOOK_ISBN_FIELDS = ['id', 'title', 'author', 'isbn', 'category', 'status']
+
+# 批次解析 (POST /api/books/resolve/) 每次最多的項目數
+MAX_RESOLVE_ITEMS = 500
+
+# 匯入格式對應的 Content-Type
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/marc': 'marc',
+}
+
+@require_http_methods(["GET"]) # 使用 GET 請求 
+async def book_list_api(request):
+    """
+    分頁取得書籍列表，以 id 做 keyset cursor 分頁。
+    支援 category、status、available (是否有可借的複本) 篩選，以及 fields 欄位投影。
+    is_borrowed 為舊版參數，等同於 available 的相反值。
+    """
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        cursor = decode_cursor(request.GET.get('cursor'), int)
+    except ValueError:
+        return error_response('limit 或 cursor 參數無效', status=400)
+
+    fields = BOOK_LIST_FIELDS
+    if request.GET.get('fields'):
+        requested = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+        if not set(requested) <= set(BOOK_LIST_FIELDS):
+            return error_response('fields 參數包含無效欄位', status=400)
+        # id 為分頁游標所需，一律回傳
+        fields = ['id'] + [f for f in requested if f != 'id']
+
+    # 目錄版本未變時，同一網址的內容必然相同，直接回傳 304
+    etag = catalog_etag(await CatalogVersion.acurrent())
+    not_modified = not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    books = Book.objects.all()
+
+    category = request.GET.get('category')
+    if category:
+        if category not in dict(Book.CATEGORY_CHOICES):
+            return error_response('無效的書籍分類', status=400)
+        books = books.filter(category=category)
+
+    status = request.GET.get('status')
+    if status:
+        if status not in dict(Book.STATUS_CHOICES):
+            return error_response('無效的書籍狀態', status=400)
+        books = books.filter(status=status)
+
+    for param, negate in (('available', False), ('is_borrowed', True)):
+        value = request.GET.get(param)
+        if value:
+            if value.lower() not in BOOLEAN_PARAMS:
+                return error_response(f'{param} 參數無效', status=400)
+            if BOOLEAN_PARAMS[value.lower()] != negate:
+                books = books.filter(available_count__gt=0)
+            else:
+                books = books.filter(available_count=0)
+
+    if cursor is not None:
+        books = books.filter(id__gt=cursor[0])
+
+    # 多取一筆以判斷是否還有下一頁
+    page = [row async for row in books.order_by('id').values(*fields)[:limit + 1]]
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]['id'])
+
+    response = JsonResponse({'books': page, 'next_cursor': next_cursor, 'limit': limit}, status=200)
+    return set_validators(response, etag)
+
+@require_http_methods(["GET"])
+def book_changes_api(request):
+    """
+    回傳目錄版本 since 之後新增、修改與刪除的書籍，依 (版本, 書籍 id) 排序分頁。
+    用戶端在 next_cursor 為 null 前持續以 cursor 取下一頁，完成後保存回應中的 version，
+    下次同步時作為 since 傳入。
+    """
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        position = decode_cursor(request.GET.get('cursor'), int, int)
+        if position is None:
+            # 第一頁：版本大於 since 的所有異動
+            position = (int(request.GET.get('since') or 0), None)
+    except ValueError:
+        return error_response('since、limit 或 cursor 參數無效', status=400)
+
+    # 先讀版本再讀異動：版本遞增與提交順序一致，不大於此版本的異動都已提交
+    current_version = CatalogVersion.current()
+    version, last_id = position
+    updated_after = Q(catalog_version__gt=version)
+    deleted_after = Q(catalog_version__gt=version)
+    if last_id is not None:
+        updated_after |= Q(catalog_version=version, id__gt=last_id)
+        deleted_after |= Q(catalog_version=version, book_id__gt=last_id)
+    updated = Book.objects.filter(updated_after).order_by('catalog_version', 'id').values(
+        *BOOK_LIST_FIELDS, 'catalog_version')[:limit + 1]
+    deleted = BookTombstone.objects.filter(deleted_after).order_by('catalog_version', 'book_id').values(
+        'book_id', 'catalog_version')[:limit + 1]
+
+    changes = [(book['catalog_version'], book['id'], {'op': 'upsert', 'book': book}) for book in updated]
+    changes += [(tomb['catalog_version'], tomb['book_id'], {'op': 'delete', 'id': tomb['book_id']}) for tomb in deleted]
+    changes.sort(key=lambda change: change[:2])
+
+    next_cursor = None
+    if len(changes) > limit:
+        changes = changes[:limit]
+        next_cursor = encode_cursor(*changes[-1][:2])
+
+    return JsonResponse({
+        'changes': [change for _, _, change in changes],
+        'next_cursor': next_cursor,
+        'version': max([current_version, version] + [change[0] for change in changes]),
+    }, status=200)
+
+@require_http_methods(["GET"])
+def book_search_api(request):
+    """
+    全文檢索書名、作者、ISBN，依相關度排序並以 offset 分頁。
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return error_response('請輸入搜尋關鍵字', status=400)
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        offset = int(request.GET.get('offset') or 0)
+        if offset < 0:
+            raise ValueError('offset must not be negative')
+    except ValueError:
+        return error_response('limit 或 offset 參數無效', status=400)
+
+    book_ids, has_more = search.search_book_ids(query, limit, offset)
+    books_by_id = {book['id']: book for book in Book.objects.filter(id__in=book_ids).values(*BOOK_LIST_FIELDS)}
+    # 依檢索排序輸出；索引與資料表暫時不一致時略過不存在的書籍
+    books = [books_by_id[book_id] for book_id in book_ids if book_id in books_by_id]
+
+    return JsonResponse({
+        'books': books,
+        'next_offset': offset + limit if has_more else None,
+        'limit': limit,
+    }, status=200)
+
+@require_http_methods(["GET"]) # 獲取單本書籍資訊的API
+async def book_detail_api(request, identifier): # 修改：參數從 book_id 改為 identifier
+    try:
+        # 嘗試將 identifier 轉換為整數，如果成功則按 ID 查詢
+        try:
+            book = await caching.aget_book(book_id=int(identifier))
+        except ValueError:
+            # 如果不是整數，則按 ISBN 查詢
+            book = await caching.aget_book(isbn_normalized=normalize_isbn(identifier))
+        if book is None:
+            return error_response('書籍不存在', status=404)
+
+        etag = book_etag(book)
+        not_modified = not_modified_response(request, etag, book['updated_at'])
+        if not_modified is not None:
+            return not_modified
+        book_data = {field: book[field] for field in BOOK_DETAIL_FIELDS}
+        return set_validators(JsonResponse({'book': book_data}, status=200), etag, book['updated_at'])
+    except Exception as e:
+        return error_response(f'獲取書籍詳細信息失敗：{str(e)}', status=500)
+
+@require_http_methods(["GET"])
+async def get_book_by_isbn(request, isbn):
+    try:
+        book = await caching.aget_book(isbn_normalized=normalize_isbn(isbn))
+        if book is None:
+            return JsonResponse({'message': '查無此書籍'}, status=404)
+        etag = book_etag(book)
+        not_modified = not_modified_response(request, etag, book['updated_at'])
+        if not_modified is not None:
+            return not_modified
+        book_data = {field: book[field] for field in BOOK_ISBN_FIELDS}
+        return set_validators(JsonResponse({'book': book_data}), etag, book['updated_at'])
+    except Exception as e:
+        return JsonResponse({'message': f'伺服器錯誤: {str(e)}'}, status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def book_resolve_api(request):
+    """
+    一次解析多個掃描結果 (整個書架或借還書車)，以單一查詢取回所有書籍。
+    請求 {"items": [...]}：字串視為 ISBN (可含連字號，ISBN-10 / ISBN-13 互相比對)，整數視為書籍 ID。
+    結果依輸入順序回傳，找不到的項目 found 為 false。
+    """
+    try:
+        items = json.loads(request.body).get('items')
+    except (json.JSONDecodeError, AttributeError):
+        return error_response('無效的 JSON 數據', status=400)
+    if not isinstance(items, list):
+        return error_response('items 必須為陣列', status=400)
+    if len(items) > MAX_RESOLVE_ITEMS:
+        return error_response(f'一次最多解析 {MAX_RESOLVE_ITEMS} 個項目', status=400)
+
+    ids, isbns = set(), set()
+    for item in items:
+        if isinstance(item, int) and not isinstance(item, bool):
+            ids.add(item)
+        elif isinstance(item, str):
+            isbns.update(isbn_variants(item))
+
+    by_id, by_isbn = {}, {}
+    if ids or isbns:
+        books = Book.objects.filter(Q(id__in=ids) | Q(isbn_normalized__in=isbns)).values(
+            *BOOK_DETAIL_FIELDS, 'isbn_normalized'
+        )
+        for book in books:
+            by_id[book['id']] = book
+            if book['isbn_normalized']:
+                by_isbn[book['isbn_normalized']] = book
+
+    results = []
+    found = 0
+    for item in items:
+        book = None
+        if isinstance(item, int) and not isinstance(item, bool):
+            book = by_id.get(item)
+        elif isinstance(item, str):
+            book = next((by_isbn[key] for key in isbn_variants(item) if key in by_isbn), None)
+        if book is None:
+            results.append({'input': item, 'found': False})
+            continue
+        found += 1
+        results.append({
+            'input': item,
+            'found': True,
+            'book': {field: book[field] for field in BOOK_DETAIL_FIELDS},
+        })
+    return JsonResponse({'results': results, 'found': found, 'missing': len(items) - found}, status=200)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def book_create_api(request):
+    """
+    新增書籍與其館藏複本：copies 為冊數 (預設 1，產生預設條碼)，
+    或以 barcodes 指定每冊的條碼。
+    """
+    try:
+        data = json.loads(request.body)
+        title = data.get('title')
+        author = data.get('author')
+        isbn = data.get('isbn')
+        category = data.get('category', 'OTHER') 
+        status = data.get('status', 'AVAILABLE') 
+        barcodes = data.get('barcodes')
+        copies = len(barcodes) if isinstance(barcodes, list) else data.get('copies', 1)
+    except json.JSONDecodeError:
+        return error_response('Invalid JSON', status=400)
+
+    if not title or not author or not isbn:
+        return error_response('請填寫所有必填欄位 (書名、作者、ISBN)', status=400)
+    if barcodes is not None and not (isinstance(barcodes, list) and all(isinstance(b, str) and b for b in barcodes)):
+        return error_response('barcodes 必須為條碼字串陣列', status=400)
+    if not isinstance(copies, int) or isinstance(copies, bool) or not 0 <= copies <= inventory.MAX_NEW_COPIES:
+        return error_response(f'copies 必須為 0 到 {inventory.MAX_NEW_COPIES} 的整數', status=400)
+    
+    # 檢查 ISBN 是否重複 (以標準化 ISBN 比對，走唯一索引)
+    if Book.objects.filter(isbn_normalized=normalize_isbn(isbn)).exists():
+        return error_response('ISBN 已存在，請確認ISBN 是否有誤。', status=409)
+
+    try:
+        with transaction.atomic():
+            new_book = Book.objects.create(title=title, author=author, isbn=isbn, category=category, status=status)
+            new_copies = inventory.add_copies(new_book.id, copies, barcodes)
+        search.index_book(new_book)
+        return JsonResponse({
+            'message': '書籍新增成功',
+            'book_id': new_book.id,
+            'barcodes': [copy.barcode for copy in new_copies],
+        }, status=201)
+    except IntegrityError:
+        # 同時有其他請求新增相同 ISBN，或條碼已被使用
+        if barcodes and Copy.objects.filter(barcode__in=barcodes).exists():
+            return error_response('條碼已被其他複本使用', status=409)
+        return error_response('ISBN 已存在，請確認ISBN 是否有誤。', status=409)
+    except Exception as e:
+        return error_response(f'新增失敗：{str(e)}', status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def book_bulk_create_api(request):
+    """
+    批次匯入書籍。請求本文為 CSV、NDJSON 或 MARC 文字，逐行串流處理；
+    格式由 format 參數或 Content-Type 決定，batch_size 控制每個交易寫入的筆數。
+    """
+    import_format = request.GET.get('format') or IMPORT_CONTENT_TYPES.get(request.content_type)
+    if import_format not in importers.FORMATS:
+        return error_response(f'不支援的匯入格式，請使用 {"、".join(importers.FORMATS)}', status=400)
+    try:
+        batch_size = int(request.GET.get('batch_size') or importers.DEFAULT_BATCH_SIZE)
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+    except ValueError:
+        return error_response('batch_size 參數無效', status=400)
+
+    lines = codecs.iterdecode(request, 'utf-8-sig')
+    try:
+        result = importers.import_books(importers.READERS[import_format](lines), batch_size=batch_size)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return error_response(f'無法讀取匯入資料：{str(e)}', status=400)
+    return JsonResponse(result.as_dict(), status=200)
+
+@csrf_exempt
+@require_http_methods(["PUT", "POST"])
+def update_book_api(request, book_id):
+    """
+    更新單本書籍的所有資訊（書名、作者、ISBN、分類、狀態）。
+    """
+    try:
+        book = get_object_or_404(Book, id=book_id)
+        data = json.loads(request.body)
+
+        title = data.get('title')
+        author = data.get('author')
+        isbn = data.get('isbn')
+        category = data.get('category')
+        status = data.get('status')
+
+        if not all([title, author, isbn, category, status]): # 檢查所有必填欄位
+            return error_response('書名、作者、ISBN、分類、狀態均為必填', status=400)
+
+        # 檢查新的 ISBN 是否與其他書籍重複（除了當前正在編輯的書籍）
+        if Book.objects.filter(isbn_normalized=normalize_isbn(isbn)).exclude(id=book_id).exists():
+            return error_response('此 ISBN 已被其他書籍使用，請輸入獨特的 ISBN', status=409)
+
+        book.title = title
+        book.author = author
+        book.isbn = isbn
+        book.category = category
+        book.status = status
+        book.save()
+        search.index_book(book)
+        caching.invalidate_book(book.id)
+
+        return JsonResponse({'message': f'書籍 "{book.title}" 更新成功！'}, status=200)
+
+    except Book.DoesNotExist:
+        return error_response('書籍不存在', status=404)
+    except json.JSONDecodeError:
+        return error_response('無效的 JSON 數據', status=400)
+    except IntegrityError:
+        return error_response('此 ISBN 已被其他書籍使用，請輸入獨特的 ISBN', status=409)
+    except Exception as e:
+        return error_response(f'更新書籍過程中發生錯誤：{str(e)}', status=500)
+
+@csrf_exempt
+@require_http_methods(["PUT"]) # 專門用於更新書籍狀態的API
+def update_book_status_api(request, book_id):
+    """
+    僅更新單本書籍的狀態。使用 PUT 請求。
+    """
+    try:
+        book = get_object_or_404(Book, id=book_id)
+        data = json.loads(request.body)
+        new_status = data.get('status')
+
+        if not new_status:
+            return error_response('請提供要更新的書籍狀態', status=400)
+        
+        # 驗證狀態是否在 STATUS_CHOICES 中
+        valid_statuses = [choice[0] for choice in Book.STATUS_CHOICES]
+        if new_status not in valid_statuses:
+            return error_response('無效的書籍狀態', status=400)
+
+        book.status = new_status
+        book.save()
+        caching.invalidate_book(book.id)
+
+        return JsonResponse({'message': f'書籍 "{book.title}" 狀態已更新為 "{book.get_status_display()}"'}, status=200)
+
+    except Book.DoesNotExist:
+        return error_response('書籍不存在', status=404)
+    except json.JSONDecodeError:
+        return error_response('無效的 JSON 數據', status=400)
+    except Exception as e:
+        return error_response(f'更新書籍狀態時發生錯誤：{str(e)}', status=500)
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+def book_delete_api(request, book_id):
+    try:
+        book = get_object_or_404(Book, id=book_id)
+        # 檢查書籍是否被借出或有其他狀態，任一複本被借出則不能刪除
+        if book.copies.filter(is_borrowed=True).exists():
+            return error_response('此書已被借出，無法刪除。', status=409)
+        # 根據 status 判斷是否可刪除
+        if book.status == 'DAMAGED' or book.status == 'LOST':
+             # 允許刪除損壞或遺失的書籍
+             pass
+        elif book.status != 'AVAILABLE':
+            return error_response(f'此書狀態為 "{book.get_status_display()}"，無法刪除。', status=409)
+            
+        book_id = book.id
+        book.delete()
+        search.remove_book(book_id)
+        caching.invalidate_book(book_id)
+        return JsonResponse({'message': '書籍已成功刪除'}, status=200)
+    except Exception as e:
+        return error_response(f'刪除失敗：{str(e)}', status=500)
@@ -0,0 +1,281 @@
+import json
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, CharField, Count, DateField, F, IntegerField, Q, Value, When
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .. import caching, loans, tokens
+from ..models import Book, BorrowRecord
+from .common import (
+    decode_cursor, encode_cursor, error_response, parse_limit, token_required, unauthorized_response,
+)
+
+async def build_user_home_summary(user, current_date):
+    """
+    用戶首頁摘要：借閱統計與目前借閱中的書籍，以一次查詢 (UNION ALL) 取得，結果會被快取。user 可為 TokenUser。
+    第一部分為未歸還的借閱 (逾期狀態在 SQL 中計算)，第二部分為一列總借閱次數，其餘欄位為 NULL。
+    """
+    columns = ('record_id', 'book_title', 'borrow_date', 'due_date', 'is_overdue', 'total_loans')
+    open_loans = BorrowRecord.objects.filter(user_id=user.id, returned=False).annotate(
+        record_id=F('id'),
+        book_title=F('book__title'),
+        is_overdue=Case(When(due_date__lt=current_date, then=Value(True)), default=Value(False),
+                        output_field=BooleanField()),
+        total_loans=Value(None, output_field=IntegerField()),
+    ).values(*columns)
+    total = BorrowRecord.objects.filter(user_id=user.id).order_by().values('user_id').annotate(
+        record_id=Value(None, output_field=IntegerField()),
+        book_title=Value(None, output_field=CharField()),
+        borrow_date=Value(None, output_field=DateField()),
+        due_date=Value(None, output_field=DateField()),
+        is_overdue=Value(False, output_field=BooleanField()),
+        total_loans=Count('id'),
+    ).values(*columns)
+    rows = [row async for row in open_loans.order_by().union(total, all=True).order_by('due_date', 'record_id')]
+    borrowed_books = [{
+        'id': row['record_id'],
+        'book_title': row['book_title'],
+        'borrow_date': row['borrow_date'].isoformat(),
+        'due_date': row['due_date'].isoformat(),
+        'is_overdue': bool(row['is_overdue']),
+    } for row in rows if row['record_id'] is not None]
+    return {
+        'username': user.username,
+        'counts': {
+            'total_loans': sum(row['total_loans'] or 0 for row in rows),
+            'open_loans': len(borrowed_books),
+            'overdue_loans': sum(book['is_overdue'] for book in borrowed_books),
+        },
+        'borrowed_books': borrowed_books,
+    }
+
+@require_http_methods(["GET"]) # 使用 GET 請求 
+@token_required
+async def user_home_api(request):
+    """
+    登入用戶的首頁：快取的借閱摘要加上一頁借閱歷史。
+    歷史依借閱日期新到舊排序，以 (borrow_date, id) 做 keyset cursor 分頁。
+    """
+    user = request.token_user
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        cursor = decode_cursor(request.GET.get('cursor'), date.fromisoformat, int)
+    except ValueError:
+        return error_response('limit 或 cursor 參數無效', status=400)
+
+    current_date = timezone.now().date() # 獲取當前日期
+
+    summary_key = caching.user_home_key(user.id, current_date)
+    summary = await cache.aget(summary_key)
+    if summary is None:
+        summary = await build_user_home_summary(user, current_date)
+        await cache.aset(summary_key, summary, settings.USER_HOME_CACHE_TIMEOUT)
+
+    # 逾期：未歸還且已過到期日，或歸還日晚於到期日
+    history = BorrowRecord.objects.filter(user_id=user.id).annotate(
+        book_title=F('book__title'),
+        is_overdue=Case(
+            When(returned=False, due_date__lt=current_date, then=Value(True)),
+            When(returned=True, return_date__gt=F('due_date'), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+    if cursor is not None:
+        last_borrow_date, last_id = cursor
+        history = history.filter(Q(borrow_date__lt=last_borrow_date) | Q(borrow_date=last_borrow_date, id__lt=last_id))
+    page = [record async for record in history.order_by('-borrow_date', '-id').values(
+        'id', 'book_title', 'borrow_date', 'due_date', 'return_date', 'returned', 'is_overdue',
+    )[:limit + 1]]
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]['borrow_date'].isoformat(), page[-1]['id'])
+
+    all_records_data = [{
+        **record,
+        'borrow_date': record['borrow_date'].isoformat(),
+        'due_date': record['due_date'].isoformat(),
+        'return_date': record['return_date'].isoformat() if record['return_date'] else None,
+    } for record in page]
+
+    return JsonResponse({
+        'username': summary['username'],
+        'counts': summary['counts'],
+        'borrowed_books': summary['borrowed_books'],
+        'all_records': all_records_data,
+        'next_cursor': next_cursor,
+        'now': timezone.now().isoformat()
+    }, status=200)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@token_required
+def borrow_book_api(request, book_id):
+    book = get_object_or_404(Book, id=book_id)
+
+    try:
+        record = loans.borrow_book(request.token_user.id, book.id)
+    except loans.LoanError as e:
+        return error_response(e.message, status=e.status)
+
+    return JsonResponse({
+        'message': f"{book.title} 借閱成功，歸還日期：{record.due_date.strftime('%Y-%m-%d')}"
+    }, status=200)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def return_book_api(request, record_id):
+    try:
+        record = get_object_or_404(BorrowRecord.objects.select_related('book'), id=record_id)
+        loans.return_record(record)
+        return JsonResponse({'message': f"{record.book.title} 已成功歸還"}, status=200)
+    except Http404:
+        return error_response('借閱紀錄不存在', status=404)
+    except loans.LoanError as e:
+        return error_response(e.message, status=e.status)
+    except Exception as e:
+        return error_response(f'歸還失敗：{str(e)}', status=500)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@token_required
+def return_book_by_book_and_user_api(request): # 新增：根據書籍ID與登入用戶歸還
+    try:
+        data = json.loads(request.body)
+        book_id = data.get('book_id')
+
+        if not book_id:
+            return error_response('缺少書籍ID', status=400)
+
+        # 找到最近一條該用戶借閱該書籍且未歸還的記錄
+        borrow_record = BorrowRecord.objects.filter(
+            book__id=book_id,
+            user__id=request.token_user.id,
+            returned=False
+        ).order_by('-borrow_date').first() # 獲取最新一條未歸還記錄
+
+        if not borrow_record:
+            return error_response('未找到該用戶借閱此書籍的未歸還記錄', status=404)
+
+        # 同時清除書籍的借出狀態
+        loans.return_record(borrow_record)
+
+        return JsonResponse({'message': '書籍歸還成功'}, status=200)
+
+    except loans.LoanError as e:
+        return error_response(e.message, status=e.status)
+    except json.JSONDecodeError:
+        return error_response('無效的 JSON 格式', status=400)
+    except Exception as e:
+        return error_response(f'歸還書籍失敗：{str(e)}', status=500)
+
+def _parse_id_list(value, name):
+    if not isinstance(value, list) or not value:
+        raise ValueError(f'{name} 必須為非空陣列')
+    if len(value) > loans.MAX_BULK_ITEMS:
+        raise ValueError(f'一次最多處理 {loans.MAX_BULK_ITEMS} 本書')
+    if not all(isinstance(item, int) and not isinstance(item, bool) for item in value):
+        raise ValueError(f'{name} 必須為整數陣列')
+    return value
+
+def _parse_barcode_list(value):
+    if not isinstance(value, list) or not value:
+        raise ValueError('barcodes 必須為非空陣列')
+    if len(value) > loans.MAX_BULK_ITEMS:
+        raise ValueError(f'一次最多處理 {loans.MAX_BULK_ITEMS} 本書')
+    if not all(isinstance(item, str) and item for item in value):
+        raise ValueError('barcodes 必須為條碼字串陣列')
+    return value
+
+def _bulk_response(results, committed, key, serialize):
+    items = []
+    for item_key, result in results:
+        if isinstance(result, loans.LoanError):
+            items.append({key: item_key, 'ok': False, 'error': result.message, 'status': result.status})
+        else:
+            items.append({key: item_key, 'ok': True, **(serialize(result) if committed else {})})
+    succeeded = sum(item['ok'] for item in items) if committed else 0
+    return JsonResponse({
+        'committed': committed,
+        'succeeded': succeeded,
+        'failed': sum(not item['ok'] for item in items),
+        'results': items,
+    }, status=200 if committed else 409)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@token_required
+def bulk_borrow_api(request):
+    """
+    登入用戶一次借出多本書 {"book_ids": [...], "partial": false}。
+    預設全部可借才寫入 (否則回傳 409 與每本書的原因)；partial 為 true 時借出可借的部分。
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            return error_response('Invalid JSON', status=400)
+        book_ids = _parse_id_list(data.get('book_ids'), 'book_ids')
+    except json.JSONDecodeError:
+        return error_response('Invalid JSON', status=400)
+    except ValueError as e:
+        return error_response(str(e), status=400)
+
+    try:
+        results, committed = loans.borrow_books(request.token_user.id, book_ids, partial=bool(data.get('partial')))
+    except loans.LoanError as e:
+        return error_response(e.message, status=e.status)
+    return _bulk_response(results, committed, 'book_id', lambda record: {
+        'record_id': record.id,
+        'due_date': record.due_date.strftime('%Y-%m-%d'),
+    })
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_return_api(request):
+    """
+    一次歸還多筆借閱：{"record_ids": [...]}、以複本條碼指定 {"barcodes": [...]}，
+    或以書籍指定 {"book_ids": [...]}。帶有登入權杖時只歸還該用戶的借閱 (權杖無效時回傳 401)；
+    櫃台還書 (沒有 Authorization 標頭) 應使用條碼，以書籍指定時該書只能有一筆未歸還的借閱，有多冊借出的書回傳 409。
+    全部成功才寫入的規則與 bulk_borrow_api 相同。
+    """
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            return error_response('無效的 JSON 格式', status=400)
+        if 'record_ids' in data:
+            kwargs = {'record_ids': _parse_id_list(data.get('record_ids'), 'record_ids')}
+            key = 'record_id'
+        elif 'barcodes' in data:
+            kwargs = {'barcodes': _parse_barcode_list(data.get('barcodes'))}
+            key = 'barcode'
+        else:
+            kwargs = {'book_ids': _parse_id_list(data.get('book_ids'), 'book_ids')}
+            key = 'book_id'
+    except json.JSONDecodeError:
+        return error_response('無效的 JSON 格式', status=400)
+    except ValueError as e:
+        return error_response(str(e), status=400)
+
+    user = tokens.authenticate(request)
+    if user is None and 'Authorization' in request.headers:
+        # 權杖無效或已過期時不可退回櫃台模式 (可歸還任何讀者的借閱)
+        return unauthorized_response()
+    try:
+        results, committed = loans.return_books(
+            user_id=user.id if user else None, partial=bool(data.get('partial')), **kwargs
+        )
+    except loans.LoanError as e:
+        return error_response(e.message, status=e.status)
+    return _bulk_response(results, committed, key, lambda record: {
+        'record_id': record.id,
+        'book_id': record.book_id,
+        'barcode': record.copy.barcode,
+    })
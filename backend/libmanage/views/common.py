@@ -0,0 +1,97 @@
+"""
+各 API 共用的回應、分頁與條件式請求輔助函數。
+"""
+import base64
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .. import tokens
+
+# 列表分頁設定
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+BOOK_LIST_FIELDS = ['id', 'title', 'author', 'isbn', 'total_count', 'available_count', 'category', 'status']
+BOOLEAN_PARAMS = {'true': True, '1': True, 'false': False, '0': False}
+
+# 錯誤處理輔助函數
+def error_response(message, status=400):
+    return JsonResponse({'message': message}, status=status)
+
+# 登入權杖輔助函數
+def unauthorized_response():
+    response = error_response('請先登入', status=401)
+    response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+def token_required(view):
+    """
+    需要登入的 view：以 Authorization: Bearer 權杖驗證 (見 libmanage.tokens)，
+    通過後 request.token_user 為 TokenUser (只有 id 與 username，不查詢 User)，否則回傳 401。
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            request.token_user = await tokens.aauthenticate(request)
+            if request.token_user is None:
+                return unauthorized_response()
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.token_user = tokens.authenticate(request)
+        if request.token_user is None:
+            return unauthorized_response()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+# 分頁輔助函數
+def parse_limit(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(*values):
+    raw = ','.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, *types):
+    """還原 encode_cursor 的值並依 types 逐一轉型；沒有 cursor 時回傳 None。"""
+    if not cursor:
+        return None
+    padded = cursor + '=' * (-len(cursor) % 4)
+    # binascii.Error 與 UnicodeDecodeError 皆為 ValueError 子類別
+    parts = base64.urlsafe_b64decode(padded.encode()).decode().split(',')
+    if len(parts) != len(types):
+        raise ValueError('invalid cursor')
+    return tuple(convert(part) for convert, part in zip(types, parts))
+
+# 條件式請求輔助函數
+def book_etag(book):
+    return f'"book-{book["id"]}-v{book["catalog_version"]}"'
+
+def catalog_etag(version):
+    return f'"catalog-{version}"'
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(int(last_modified.timestamp()))
+    # 允許瀏覽器快取，但每次使用前都要以 If-None-Match 重新驗證
+    patch_cache_control(response, no_cache=True)
+    return response
+
+def not_modified_response(request, etag, last_modified=None):
+    """If-None-Match / If-Modified-Since 相符時回傳 304，否則回傳 None。"""
+    last_modified_ts = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
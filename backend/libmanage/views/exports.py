@@ -0,0 +1,80 @@
+"""
+串流匯出：逐批讀取資料並以 NDJSON 輸出，記憶體用量不隨資料量成長。
+
+ASGI 下 StreamingHttpResponse 遇到同步產生器會先以 sync_to_async(list) 讀完全部內容才開始傳送，
+因此在 ASGI 請求中改用 aiterator 的非同步產生器，WSGI 則維持同步產生器。
+"""
+from datetime import datetime
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_http_methods
+
+from ..models import Book, BorrowRecord
+from .common import BOOK_LIST_FIELDS, error_response
+
+# 匯出設定：每次自資料庫讀取的筆數
+EXPORT_CHUNK_SIZE = 2000
+BOOK_EXPORT_FIELDS = BOOK_LIST_FIELDS + ['updated_at']
+BORROW_RECORD_EXPORT_FIELDS = ['id', 'user_id', 'book_id', 'copy_id', 'borrow_date', 'due_date', 'return_date', 'returned', 'updated_at']
+
+def parse_since(value):
+    """解析 ISO 日期或日期時間，無時區時視為目前時區。"""
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('invalid datetime')
+        since = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+def ndjson_lines(queryset, fields):
+    """逐批讀取 queryset，每批輸出一段 NDJSON，不一次載入全部資料。"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lines = []
+    for row in queryset.order_by('id').values(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        lines.append(encoder.encode(row))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+async def andjson_lines(queryset, fields):
+    """ndjson_lines 的非同步版本，供 ASGI 串流回應使用。"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    lines = []
+    async for row in queryset.order_by('id').values(*fields).aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+        lines.append(encoder.encode(row))
+        if len(lines) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def ndjson_export_response(request, queryset, fields, filename):
+    since = request.GET.get('updated_since')
+    if since:
+        try:
+            queryset = queryset.filter(updated_at__gte=parse_since(since))
+        except ValueError:
+            return error_response('updated_since 參數無效', status=400)
+    lines = andjson_lines if isinstance(request, ASGIRequest) else ndjson_lines
+    response = StreamingHttpResponse(lines(queryset, fields), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@require_http_methods(["GET"])
+def export_books_api(request):
+    """以 NDJSON 串流匯出所有書籍，可用 updated_since 只匯出之後有變動的資料。"""
+    return ndjson_export_response(request, Book.objects.all(), BOOK_EXPORT_FIELDS, 'books.ndjson')
+
+@require_http_methods(["GET"])
+def export_borrow_records_api(request):
+    """以 NDJSON 串流匯出所有借閱紀錄，可用 updated_since 只匯出之後有變動的資料。"""
+    return ndjson_export_response(request, BorrowRecord.objects.all(), BORROW_RECORD_EXPORT_FIELDS, 'borrow_records.ndjson')
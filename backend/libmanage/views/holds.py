@@ -0,0 +1,59 @@
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .. import holds
+from ..models import Book, Hold
+from .common import error_response, token_required
+
+HOLD_FIELDS = ['id', 'status', 'created_at', 'ready_at', 'expires_at']
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+@token_required
+def book_holds_api(request, book_id):
+    """
+    GET：登入用戶查看此書的預約狀況：可借與預約人數，以及自己的預約 (等候中時附上隊列名次)。
+    不公開其他讀者的預約。
+    POST：登入用戶預約此書，依預約先後排隊。
+    """
+    if request.method == 'POST':
+        return _place_hold(request, book_id)
+    book = Book.objects.filter(id=book_id).values('id', 'available_count', 'hold_count').first()
+    if book is None:
+        return error_response('書籍不存在', status=404)
+
+    hold = Hold.objects.filter(
+        book_id=book_id, user_id=request.token_user.id, status__in=['WAITING', 'READY'],
+    ).select_related('copy').first()
+    mine = None
+    if hold is not None:
+        mine = {field: getattr(hold, field) for field in HOLD_FIELDS}
+        if hold.status == 'WAITING':
+            mine['position'] = holds.queue_position(hold)
+        else:
+            mine['barcode'] = hold.copy.barcode
+    return JsonResponse({**book, 'hold': mine}, status=200)
+
+def _place_hold(request, book_id):
+    # 預約一律依先後排隊；priority 保留給日後的館員功能，不接受讀者指定
+    try:
+        hold = holds.place_hold(request.token_user.id, book_id)
+    except holds.HoldError as e:
+        return error_response(e.message, status=e.status)
+    return JsonResponse({
+        'message': '預約成功，有書可取時將為您保留',
+        'hold_id': hold.id,
+        'expires_at': hold.expires_at,
+    }, status=201)
+
+@csrf_exempt
+@require_http_methods(["DELETE"])
+@token_required
+def cancel_hold_api(request, hold_id):
+    """登入用戶取消自己的預約；已保留的複本會分配給隊列中的下一位。"""
+    try:
+        holds.cancel_hold(hold_id, user_id=request.token_user.id)
+    except holds.HoldError as e:
+        return error_response(e.message, status=e.status)
+    return JsonResponse({'message': '預約已取消'}, status=200)
@@ -0,0 +1,67 @@
+import json
+
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .. import inventory
+from ..models import Book, Copy
+from .common import error_response
+
+COPY_FIELDS = ['id', 'barcode', 'status', 'is_borrowed', 'updated_at']
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def book_copies_api(request, book_id):
+    """
+    GET：列出書籍的所有複本與冊數。
+    POST：新增複本，請求 {"copies": n} 或 {"barcodes": [...]}。
+    """
+    if request.method == 'GET':
+        book = Book.objects.filter(id=book_id).values('id', 'total_count', 'available_count').first()
+        if book is None:
+            return error_response('書籍不存在', status=404)
+        copies = list(Copy.objects.filter(book_id=book_id).order_by('id').values(*COPY_FIELDS))
+        return JsonResponse({**book, 'copies': copies}, status=200)
+
+    try:
+        data = json.loads(request.body)
+        barcodes = data.get('barcodes')
+        count = data.get('copies', 1)
+    except (json.JSONDecodeError, AttributeError):
+        return error_response('無效的 JSON 數據', status=400)
+    if barcodes is not None and not (isinstance(barcodes, list) and all(isinstance(b, str) and b for b in barcodes)):
+        return error_response('barcodes 必須為條碼字串陣列', status=400)
+    if not isinstance(count, int) or isinstance(count, bool):
+        return error_response('copies 必須為整數', status=400)
+
+    try:
+        copies = inventory.add_copies(book_id, count, barcodes)
+    except inventory.InventoryError as e:
+        return error_response(e.message, status=e.status)
+    except IntegrityError:
+        return error_response('條碼已被其他複本使用', status=409)
+    return JsonResponse({
+        'message': f'已新增 {len(copies)} 冊',
+        'barcodes': [copy.barcode for copy in copies],
+    }, status=201)
+
+@csrf_exempt
+@require_http_methods(["PUT"])
+def update_copy_status_api(request, barcode):
+    """更新單一複本的狀態 (例如損壞、維修、遺失)，書籍的可借冊數隨之調整。"""
+    try:
+        new_status = json.loads(request.body).get('status')
+    except (json.JSONDecodeError, AttributeError):
+        return error_response('無效的 JSON 數據', status=400)
+    if new_status not in dict(Book.STATUS_CHOICES):
+        return error_response('無效的複本狀態', status=400)
+
+    try:
+        copy = inventory.set_copy_status(barcode, new_status)
+    except inventory.InventoryError as e:
+        return error_response(e.message, status=e.status)
+    return JsonResponse({
+        'message': f'複本 {copy.barcode} 狀態已更新為 "{copy.get_status_display()}"',
+    }, status=200)
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_http_methods
+
+from .. import metrics
+
+
+@require_http_methods(["GET"])
+def metrics_api(request):
+    """以 Prometheus 文字格式輸出本工作行程的請求統計，只接受本機 (METRICS_ALLOWED_IPS) 的請求。"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,73 @@
+"""
+條碼辨識 API。OpenCV、NumPy 與 pyzbar 只在第一次呼叫辨識 API 時才載入，
+其他 API 與 manage.py 指令不需付出匯入成本。
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .common import error_response
+
+@csrf_exempt
+@require_http_methods(["POST"]) 
+def scan_code_api(request):
+    """
+    辨識上傳影像中的所有書籍條碼 (EAN-13 / ISBN) 與 QR 碼。
+    接受 JSON {"image": base64} 或 multipart 的 image 檔案，辨識工作在行程池中執行。
+    """
+    try:
+        # 延遲載入影像處理套件，只有第一次辨識請求需要付出匯入成本
+        from .. import scanning
+    except ImportError as e:
+        return error_response(f'條碼辨識服務無法使用：{str(e)}', status=503)
+
+    try:
+        if request.content_type == 'multipart/form-data':
+            upload = request.FILES.get('image')
+            if upload is None:
+                return error_response('未提供圖像數據', status=400)
+            if upload.size > settings.SCAN_MAX_IMAGE_BYTES:
+                return error_response('圖像檔案過大', status=413)
+            img_bytes = upload.read()
+        else:
+            data = json.loads(request.body)
+            if not isinstance(data, dict):
+                return error_response('無效的 JSON 數據', status=400)
+            image_b64 = data.get('image')
+            if not image_b64 or not isinstance(image_b64, str):
+                return error_response('未提供圖像數據', status=400)
+            # 接受 data URL (data:image/png;base64,...)
+            encoded = image_b64.split(',', 1)[-1]
+            # 解碼前先以 base64 長度估計影像大小 (每 4 個字元 3 個位元組)
+            if len(encoded) // 4 * 3 > settings.SCAN_MAX_IMAGE_BYTES:
+                return error_response('圖像檔案過大', status=413)
+            img_bytes = base64.b64decode(encoded)
+            if len(img_bytes) > settings.SCAN_MAX_IMAGE_BYTES:
+                return error_response('圖像檔案過大', status=413)
+
+        pool = scanning.get_pool(workers=settings.SCAN_WORKERS, timeout=settings.SCAN_TIMEOUT)
+        symbols = pool.decode(img_bytes)
+    except json.JSONDecodeError:
+        return error_response('無效的 JSON 數據', status=400)
+    except (ValueError, scanning.ScanError) as e:
+        # base64 格式錯誤 (binascii.Error) 或影像無法解碼
+        return error_response(f'無法解碼圖像：{str(e)}', status=400)
+    except scanning.ScannerBusy as e:
+        return error_response(str(e), status=503)
+    except TimeoutError:
+        return error_response('辨識逾時，請重新拍攝', status=504)
+    except Exception as e:
+        return error_response(f'掃描過程中發生錯誤：{str(e)}', status=500)
+
+    if not symbols:
+        return JsonResponse({'message': '未找到條碼或QR碼', 'symbols': []}, status=200)
+    return JsonResponse({
+        'message': '成功辨識',
+        'decoded_text': symbols[0]['data'],
+        'bounding_box': symbols[0]['bounding_box'],
+        'symbols': symbols,
+    }, status=200)
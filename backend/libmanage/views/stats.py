@@ -0,0 +1,108 @@
+"""
+借閱統計 API，資料來自 libmanage.stats 的每日彙總表，不掃描借閱紀錄。
+日期範圍以 start / end (YYYY-MM-DD，含首尾) 指定，預設為最近 365 天。
+"""
+from datetime import date, timedelta
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from .. import stats
+from ..models import Book
+from .common import decode_cursor, encode_cursor, error_response, parse_limit
+
+DEFAULT_STATS_DAYS = 365
+BUSIEST_DAYS_LIMIT = 10
+CATEGORY_LABELS = dict(Book.CATEGORY_CHOICES)
+
+
+def parse_range(request):
+    end = request.GET.get('end')
+    end = date.fromisoformat(end) if end else timezone.now().date()
+    start = request.GET.get('start')
+    start = date.fromisoformat(start) if start else end - timedelta(days=DEFAULT_STATS_DAYS - 1)
+    if start > end:
+        raise ValueError('start must not be after end')
+    return start, end
+
+
+def _counts(row):
+    return {'loans': row['total_loans'] or 0, 'returns': row['total_returns'] or 0}
+
+
+@require_http_methods(["GET"])
+def stats_summary_api(request):
+    """區間內的借還總數、各分類借閱數與最繁忙的日期。"""
+    try:
+        start, end = parse_range(request)
+    except ValueError:
+        return error_response('start 或 end 參數無效', status=400)
+
+    categories = [{
+        'category': row['category'],
+        'category_display': CATEGORY_LABELS.get(row['category'], row['category']),
+        **_counts(row),
+    } for row in stats.by_category(start, end)]
+    busiest = [{'day': row['day'].isoformat(), **_counts(row)}
+               for row in stats.busiest_days(start, end, BUSIEST_DAYS_LIMIT)]
+    return JsonResponse({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': {
+            'loans': sum(row['loans'] for row in categories),
+            'returns': sum(row['returns'] for row in categories),
+        },
+        'categories': categories,
+        'busiest_days': busiest,
+    }, status=200)
+
+
+@require_http_methods(["GET"])
+def stats_daily_api(request):
+    """每日借還次數序列 (沒有借還的日期不列出)。"""
+    try:
+        start, end = parse_range(request)
+    except ValueError:
+        return error_response('start 或 end 參數無效', status=400)
+    days = [{'day': row['day'].isoformat(), **_counts(row)} for row in stats.daily_series(start, end)]
+    return JsonResponse({'start': start.isoformat(), 'end': end.isoformat(), 'days': days}, status=200)
+
+
+@require_http_methods(["GET"])
+def stats_top_books_api(request):
+    """借出次數最多的書籍 (週轉率)。"""
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+    except ValueError:
+        return error_response('limit 參數無效', status=400)
+    books = [{
+        **row,
+        'last_borrowed': row['last_borrowed'].isoformat() if row['last_borrowed'] else None,
+    } for row in stats.top_books(limit)]
+    return JsonResponse({'books': books}, status=200)
+
+
+@require_http_methods(["GET"])
+def stats_overdue_api(request):
+    """全館逾期清單，依到期日由舊到新排序，以 (due_date, id) 做 keyset cursor 分頁。"""
+    try:
+        limit = parse_limit(request.GET.get('limit'))
+        cursor = decode_cursor(request.GET.get('cursor'), date.fromisoformat, int)
+    except ValueError:
+        return error_response('limit 或 cursor 參數無效', status=400)
+
+    today = timezone.now().date()
+    page = stats.overdue(today, limit + 1, after=cursor)
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1]['due_date'].isoformat(), page[-1]['id'])
+
+    records = [{
+        **record,
+        'due_date': record['due_date'].isoformat(),
+        'borrow_date': record['borrow_date'].isoformat(),
+        'days_overdue': (today - record['due_date']).days,
+    } for record in page]
+    return JsonResponse({'records': records, 'next_cursor': next_cursor}, status=200)
@@ -45,8 +45,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'libmanage.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # 在 CorsMiddleware 之後，429 / 503 回應才會帶有 CORS 標頭，瀏覽器才能讀取 Retry-After
+    'libmanage.middleware.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,14 +82,179 @@ WSGI_APPLICATION = 'libmanagesystem.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# LIBMANAGE_DB=sqlite (預設) 或 postgres。
+#
+# SQLite：每條連線建立時套用 WAL、synchronous=NORMAL 與 mmap，busy_timeout 讓寫入者排隊等待，
+# 交易以 BEGIN IMMEDIATE 開始，避免讀取後升級為寫入時直接得到 "database is locked"。
+# LIBMANAGE_SQLITE_TUNING=0 可關閉以上設定 (用於比較)。
+#
+# PostgreSQL (需安裝 psycopg[binary,pool])：LIBMANAGE_DB_NAME / HOST / PORT / USER / PASSWORD 指定連線；
+# LIBMANAGE_DB_POOL_SIZE > 0 時使用 psycopg 連線池 (此時不能同時使用持久連線)，
+# 否則以 LIBMANAGE_DB_CONN_MAX_AGE 秒的持久連線搭配健康檢查。
+
+SQLITE_BUSY_TIMEOUT = float(os.environ.get('LIBMANAGE_SQLITE_BUSY_TIMEOUT', 20))
+SQLITE_MMAP_SIZE = int(os.environ.get('LIBMANAGE_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}',
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def _database_config(profile):
+    if profile == 'postgres':
+        pool_size = int(os.environ.get('LIBMANAGE_DB_POOL_SIZE', 0))
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('LIBMANAGE_DB_NAME', 'libmanage'),
+            'HOST': os.environ.get('LIBMANAGE_DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('LIBMANAGE_DB_PORT', '5432'),
+            'USER': os.environ.get('LIBMANAGE_DB_USER', 'libmanage'),
+            'PASSWORD': os.environ.get('LIBMANAGE_DB_PASSWORD', ''),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        if pool_size > 0:
+            config['CONN_MAX_AGE'] = 0
+            config['OPTIONS']['pool'] = {
+                'min_size': min(2, pool_size),
+                'max_size': pool_size,
+                'timeout': float(os.environ.get('LIBMANAGE_DB_POOL_TIMEOUT', 10)),
+            }
+        else:
+            config['CONN_MAX_AGE'] = int(os.environ.get('LIBMANAGE_DB_CONN_MAX_AGE', 60))
+        return config
+
+    if profile != 'sqlite':
+        raise ValueError(f'Unknown LIBMANAGE_DB: {profile!r}')
+    config = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('LIBMANAGE_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': {},
+    }
+    if os.environ.get('LIBMANAGE_SQLITE_TUNING', '1') != '0':
+        config['OPTIONS'] = {
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': '; '.join(SQLITE_PRAGMAS),
+        }
+    return config
+
 
 DATABASES = {
+    'default': _database_config(os.environ.get('LIBMANAGE_DB', 'sqlite')),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 預設為行程內記憶體；LIBMANAGE_CACHE=file 或 redis 可切換為跨行程共用的快取，
+# LIBMANAGE_CACHE_LOCATION 指定目錄或 Redis URL (redis 需另外安裝 redis 套件)
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'libmanage'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/tmp/libmanage_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379'),
+}
+_cache_name = os.environ.get('LIBMANAGE_CACHE', 'locmem')
+_cache_backend, _cache_location = CACHE_BACKENDS[_cache_name]
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': _cache_backend,
+        'LOCATION': os.environ.get('LIBMANAGE_CACHE_LOCATION', _cache_location),
     }
 }
 
+# 寫入後的快取失效 (libmanage.caching) 只作用在共用的快取上；locmem 每個工作行程各有一份，
+# 其他行程在快取到期前會繼續回傳舊的可借冊數與 ETag，因此只快取幾秒。
+# 以多個工作行程執行 (gunicorn) 時請改用 LIBMANAGE_CACHE=redis 才能長時間快取
+CACHE_SHARED = _cache_name != 'locmem'
+BOOK_CACHE_TIMEOUT = 3600 if CACHE_SHARED else 5
+USER_HOME_CACHE_TIMEOUT = 300 if CACHE_SHARED else 5
+
+
+# 條碼辨識行程池：每個 Web 工作行程各有一個行程池，總辨識行程數為 LIBMANAGE_WORKERS × LIBMANAGE_SCAN_WORKERS，
+# 因此預設只開 2 個，避免多個工作行程時超出 CPU 核心數；0 表示在請求執行緒中直接辨識
+
+SCAN_WORKERS = int(os.environ.get('LIBMANAGE_SCAN_WORKERS', 2))
+SCAN_TIMEOUT = float(os.environ.get('LIBMANAGE_SCAN_TIMEOUT', 10))
+SCAN_MAX_IMAGE_BYTES = 8 * 1024 * 1024
+
+
+# 請求效能統計 (libmanage.metrics)：/api/_metrics 只接受來自 METRICS_ALLOWED_IPS 的請求；
+# LIBMANAGE_SLOW_QUERY_MS 設定後，耗時超過此毫秒數的 SQL 會記錄到 libmanage.metrics logger
+
+METRICS_ALLOWED_IPS = os.environ.get('LIBMANAGE_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+METRICS_SLOW_QUERY_MS = float(os.environ['LIBMANAGE_SLOW_QUERY_MS']) if os.environ.get('LIBMANAGE_SLOW_QUERY_MS') else None
+
+
+# 登入權杖 (libmanage.tokens)：LIBMANAGE_TOKEN_MAX_AGE 為有效秒數；
+# 各工作行程快取權杖是否已撤銷 LIBMANAGE_TOKEN_CHECK_SECONDS 秒，登出在其他行程最多延遲這段時間生效
+
+TOKEN_MAX_AGE = int(os.environ.get('LIBMANAGE_TOKEN_MAX_AGE', 7 * 24 * 3600))
+TOKEN_CHECK_SECONDS = float(os.environ.get('LIBMANAGE_TOKEN_CHECK_SECONDS', 60))
+TOKEN_CACHE_SIZE = 10_000
+
+
+# 限流 (libmanage.ratelimit)：RATE_LIMITS 以 URL 名稱設定各鍵 (ip、user、account、resource) 的額度，
+# 超過時回傳 429；CONCURRENCY_LIMITS 為每個工作行程同時處理的請求數上限，超過時回傳 503。
+# LIBMANAGE_RATE_LIMIT_CACHE 設為快取別名 (例如 default) 時各行程共用額度；LIBMANAGE_RATE_LIMIT=0 停用。
+# 經由反向代理 (nginx) 時，將代理的位址或網段 (逗號分隔) 設為 LIBMANAGE_TRUSTED_PROXIES 才能取得用戶端的 IP
+
+RATE_LIMIT_ENABLED = os.environ.get('LIBMANAGE_RATE_LIMIT', '1') != '0'
+RATE_LIMIT_CACHE = os.environ.get('LIBMANAGE_RATE_LIMIT_CACHE') or None
+RATE_LIMIT_CACHE_SIZE = 100_000
+RATE_LIMIT_TRUSTED_PROXIES = [ip.strip() for ip in os.environ.get('LIBMANAGE_TRUSTED_PROXIES', '').split(',') if ip.strip()]
+RATE_LIMITS = {
+    # 同一 IP 的大量登入與針對同一帳號的密碼嘗試
+    'api_login': {'ip': '30/m', 'account': '10/m'},
+    'api_register': {'ip': '10/m'},
+    # 同一台掃描機或瀏覽器反覆查詢同一本書；館內電腦可能共用同一個對外 IP，以 IP 計的額度較寬
+    'api_book_by_isbn': {'resource': '20/m', 'ip': '600/m'},
+    'api_book_detail': {'resource': '60/m', 'ip': '600/m'},
+    'api_scan_code': {'ip': '60/m'},
+}
+CONCURRENCY_LIMITS = {
+    'api_book_search': 8,
+    'api_book_resolve': 4,
+    'api_bulk_borrow': 4,
+    'api_bulk_return': 4,
+    'api_book_bulk_create': 1,
+    'api_export_books': 2,
+    'api_export_borrow_records': 2,
+}
+
+
+# 密碼雜湊 (libmanage.passwords)：LIBMANAGE_PASSWORD_HASHER 選擇新密碼使用的演算法 (pbkdf2、scrypt、argon2，
+# argon2 需另外安裝 argon2-cffi)，其他演算法仍可驗證舊密碼，並在登入成功時改以目前的演算法與成本重新雜湊。
+# 成本參數留空時沿用 Django 的預設值。每個工作行程以 LIBMANAGE_PASSWORD_WORKERS 條執行緒計算雜湊
+# (0 表示在請求執行緒中直接計算)，排隊超過 LIBMANAGE_PASSWORD_MAX_PENDING 時回傳 503
+
+PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'libmanage.passwords.PBKDF2PasswordHasher',
+    'scrypt': 'libmanage.passwords.ScryptPasswordHasher',
+    'argon2': 'libmanage.passwords.Argon2PasswordHasher',
+}
+_password_hasher = os.environ.get('LIBMANAGE_PASSWORD_HASHER', 'pbkdf2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[_password_hasher]] + [
+    path for name, path in PASSWORD_HASHER_CHOICES.items() if name != _password_hasher
+]
+
+
+def _optional_int(name):
+    return int(os.environ[name]) if os.environ.get(name) else None
+
+
+PASSWORD_PBKDF2_ITERATIONS = _optional_int('LIBMANAGE_PBKDF2_ITERATIONS')
+PASSWORD_SCRYPT_WORK_FACTOR = _optional_int('LIBMANAGE_SCRYPT_WORK_FACTOR')
+PASSWORD_ARGON2_TIME_COST = _optional_int('LIBMANAGE_ARGON2_TIME_COST')
+PASSWORD_ARGON2_MEMORY_COST = _optional_int('LIBMANAGE_ARGON2_MEMORY_COST')
+PASSWORD_WORKERS = int(os.environ.get('LIBMANAGE_PASSWORD_WORKERS', 1))
+PASSWORD_MAX_PENDING = int(os.environ.get('LIBMANAGE_PASSWORD_MAX_PENDING', max(PASSWORD_WORKERS, 1) * 8))
+PASSWORD_TIMEOUT = float(os.environ.get('LIBMANAGE_PASSWORD_TIMEOUT', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,3 +307,5 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+# 讓前端讀取 429 / 503 回應的等待秒數
+CORS_EXPOSE_HEADERS = ['Retry-After']
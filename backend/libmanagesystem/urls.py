@@ -33,16 +33,34 @@ urlpatterns = [
     path('api/user_home/', views.user_home_api, name='api_user_home'),
     path('api/books/', views.book_list_api, name='api_book_list'),
     path('api/books/create/', views.book_create_api, name='api_book_create'),
+    path('api/books/bulk_create/', views.book_bulk_create_api, name='api_book_bulk_create'),
+    path('api/books/search/', views.book_search_api, name='api_book_search'),
+    path('api/books/changes/', views.book_changes_api, name='api_book_changes'),
+    path('api/books/resolve/', views.book_resolve_api, name='api_book_resolve'),
     path('api/books/delete/<int:book_id>/', views.book_delete_api, name='api_book_delete'),
     path('api/books/update/<int:book_id>/', views.update_book_api, name='api_book_update'),
     path('api/books/update_status/<int:book_id>/', views.update_book_status_api, name='api_update_book_status'),
-    path('api/books/<str:identifier>/', views.book_detail_api, name='api_book_detail'), # 獲取單本書籍的API (支援ID或ISBN)
     path('api/books/borrow/<int:book_id>/', views.borrow_book_api, name='api_borrow_book'),
     path('api/books/return/<int:record_id>/', views.return_book_api, name='api_return_book'),
-    # path('api/scan_code/', views.scan_code_api, name='api_scan_code'), 
+    path('api/loans/bulk_borrow/', views.bulk_borrow_api, name='api_bulk_borrow'),
+    path('api/loans/bulk_return/', views.bulk_return_api, name='api_bulk_return'),
+    path('api/scan_code/', views.scan_code_api, name='api_scan_code'),
     path('api/user/update_profile/', views.update_profile_api, name='api_update_profile'), 
     path('api/books/return_by_book_and_user/', views.return_book_by_book_and_user_api, name='api_return_book_by_book_and_user'),
-    path('api/books/isbn/<str:isbn>/', views.get_book_by_isbn),
+    path('api/books/isbn/<str:isbn>/', views.get_book_by_isbn, name='api_book_by_isbn'),
+    path('api/books/<int:book_id>/copies/', views.book_copies_api, name='api_book_copies'),
+    path('api/copies/<str:barcode>/status/', views.update_copy_status_api, name='api_update_copy_status'),
+    path('api/books/<int:book_id>/holds/', views.book_holds_api, name='api_book_holds'),
+    path('api/holds/<int:hold_id>/', views.cancel_hold_api, name='api_cancel_hold'),
+    # 放在其他 api/books/ 路徑之後，避免攔截 return_by_book_and_user 等固定路徑
+    path('api/books/<str:identifier>/', views.book_detail_api, name='api_book_detail'), # 獲取單本書籍的API (支援ID或ISBN)
+    path('api/stats/', views.stats_summary_api, name='api_stats_summary'),
+    path('api/stats/daily/', views.stats_daily_api, name='api_stats_daily'),
+    path('api/stats/books/', views.stats_top_books_api, name='api_stats_top_books'),
+    path('api/stats/overdue/', views.stats_overdue_api, name='api_stats_overdue'),
+    path('api/_metrics', views.metrics_api, name='api_metrics'),
+    path('api/export/books.ndjson', views.export_books_api, name='api_export_books'),
+    path('api/export/borrow_records.ndjson', views.export_borrow_records_api, name='api_export_borrow_records'),
 
     # === 服務 React 應用的入口點 (index.html) ===
     re_path(r'^(?:.*)/?$', TemplateView.as_view(template_name='index.html')),
@@ -11,6 +11,12 @@ import { Html5QrcodeScanner, Html5Qrcode } from 'html5-qrcode'; // 引入 Html5Q
 // AuthContext: 用於管理全局使用者狀態
 export const AuthContext = createContext(null);
 
+// 登入權杖：登入後存放在 localStorage，需要登入的 API 以 Authorization 標頭傳送
+export const authHeaders = (headers = {}) => {
+  const token = localStorage.getItem('token');
+  return token ? { ...headers, Authorization: `Bearer ${token}` } : headers;
+};
+
 // 定義書籍分類選項 (與 Django models.py 中的 CATEGORY_CHOICES 保持一致)
 const CATEGORY_OPTIONS = [
   { value: 'SCIENCE', label: '科學' },
@@ -195,7 +201,7 @@ const Login = ({ setCurrentPage }) => {
       if (response.ok) {
         setMessage(data.message); // 設定訊息
         setMessageType('success'); // 設定訊息類型
-        loginUser(data.user_id, data.username); // 登入使用者
+        loginUser(data.user_id, data.username, data.token); // 登入使用者
         // 設定一個定時器在訊息顯示後跳轉頁面
         if (messageTimeoutRef.current) {
           clearTimeout(messageTimeoutRef.current);
@@ -376,7 +382,7 @@ const UserHome = ({ setCurrentPage }) => {
     }
     setLoading(true);
     try {
-      const response = await fetch(`/api/user_home/?user_id=${currentUser.id}`);
+      const response = await fetch('/api/user_home/', { headers: authHeaders() });
       const data = await response.json();
 
       if (response.ok) {
@@ -518,13 +524,22 @@ const BookList = ({ setCurrentPage }) => {
   const fetchBooks = useCallback(async () => {
     setLoading(true);
     try {
-      const response = await fetch('/api/books/');
-      const data = await response.json();
-      if (response.ok) {
-        setBooks(data.books);
-      } else {
-        sendMessage(data.message || '無法載入書籍列表', 'error');
-      }
+      // 書籍列表以 next_cursor 分頁，依序取回所有頁面
+      const allBooks = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ limit: '500' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/books/?${params}`);
+        const data = await response.json();
+        if (!response.ok) {
+          sendMessage(data.message || '無法載入書籍列表', 'error');
+          return;
+        }
+        allBooks.push(...data.books);
+        cursor = data.next_cursor;
+      } while (cursor);
+      setBooks(allBooks);
     } catch (error) {
       sendMessage('網路錯誤或伺服器無響應', 'error');
       console.error('獲取書籍列表失敗:', error);
@@ -551,8 +566,7 @@ const BookList = ({ setCurrentPage }) => {
      try {
     const response = await fetch(`/api/books/borrow/${books.id}/`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ user_id: currentUser.id }),
+      headers: authHeaders({ 'Content-Type': 'application/json' }),
     });
     if (!response.ok) {
       const text = await response.text();
@@ -1226,11 +1240,10 @@ const EditProfile = ({ setCurrentPage }) => {
       // 調用後端 API 更新使用者資訊 
       const response = await fetch('/api/user/update_profile/', {
         method: 'POST', // 或 PUT
-        headers: {
+        headers: authHeaders({
           'Content-Type': 'application/json',
-        },
+        }),
         body: JSON.stringify({
-          user_id: currentUser.id, // 傳遞使用者 ID
           username: currentUser.username, // 傳遞使用者名稱 
           new_password: newPassword,
         }),
@@ -1394,10 +1407,9 @@ const BookDetail = ({ setCurrentPage, identifier }) => {
       try {
         const response = await fetch(`/api/books/borrow/${book.id}/`, {
           method: 'POST',
-          headers: {
+          headers: authHeaders({
             'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ user_id: currentUser.id }),
+          }),
         });
         const data = await response.json();
         if (response.ok) {
@@ -1430,10 +1442,10 @@ const BookDetail = ({ setCurrentPage, identifier }) => {
         // 使用新增的根據書籍ID和使用者ID歸還的API
         const response = await fetch(`/api/books/return_by_book_and_user/`, {
           method: 'POST',
-          headers: {
+          headers: authHeaders({
             'Content-Type': 'application/json',
-          },
-          body: JSON.stringify({ book_id: book.id, user_id: currentUser.id }),
+          }),
+          body: JSON.stringify({ book_id: book.id }),
         });
         const data = await response.json();
         if (response.ok) {
@@ -1812,15 +1824,20 @@ function App() {
   useEffect(() => {
     const userId = localStorage.getItem('user_id');
     const username = localStorage.getItem('username');
-    if (userId && username) setCurrentUser({ id: userId, username: username });
+    // 舊版登入沒有權杖，需重新登入
+    if (userId && username && localStorage.getItem('token')) setCurrentUser({ id: userId, username: username });
   }, []);
 
-  const loginUser = (id, username) => {
+  const loginUser = (id, username, token) => {
     setCurrentUser({ id, username });
     localStorage.setItem('user_id', id);
     localStorage.setItem('username', username);
+    localStorage.setItem('token', token);
   };
   const logoutUser = () => {
+    // 通知後端撤銷權杖，不等待回應
+    fetch('/api/logout/', { method: 'POST', headers: authHeaders() }).catch(() => {});
+    localStorage.removeItem('token');
     localStorage.removeItem('user_id');
     localStorage.removeItem('username');
     setCurrentUser({ id: null, username: null });